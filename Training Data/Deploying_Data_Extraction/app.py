@@ -1,20 +1,54 @@
 import streamlit as st
+import os
 import subprocess
 import sys
 import pandas as pd
+import threading
 import time
-from extractors import EnsembleVotingExtractor
-import json
+from corpus import DEFAULT_CORPORA, STRUCTURED_FILE, LabelledCorpus, annotation_file, part_files
+from extractors import EnsembleVotingExtractor, load_bundle, warm_up
+from checkpoint import Checkpoint, input_fingerprint
+from jobs import COMPLETED, CANCELLED, FINISHED_STATES, JobManager, extraction_work
+from similarity import INDEX_DIR, SimilarityIndex
+from results_store import FILTER_COLUMNS, GROUP_COLUMNS, RESULT_FIELDS, RESULTS_DB, ResultsStore, bundle_version
 import io
 from datetime import datetime
 
 def download_spacy_model():
-    try:
-        import spacy
-        spacy.load("en_core_web_sm")
-    except OSError:
+    from importlib.util import find_spec
+    if find_spec("en_core_web_sm") is None:
         subprocess.check_call([sys.executable, "-m", "spacy", "download", "en_core_web_sm"])
 
+@st.cache_resource
+def start_background_warm_up():
+    # Once per server process: import spaCy/sklearn and preload the NER model
+    # so the first training run or extraction doesn't pay for it
+    def run():
+        try:
+            download_spacy_model()
+            warm_up(exclude_unused=True)
+        except Exception as e:
+            print(f"Background warm-up failed: {e}")
+
+    thread = threading.Thread(target=run, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource
+def get_job_manager():
+    # Shared by all sessions of this server process; outlives script reruns
+    return JobManager()
+
+@st.cache_resource
+def get_similarity_index(path):
+    # One open (memory-mapped) index per path, shared by all sessions
+    return SimilarityIndex(path)
+
+@st.cache_resource
+def get_results_store(path):
+    # Shared by all sessions and the job thread (each thread gets its own connection)
+    return ResultsStore(path)
+
 # Page configuration
 st.set_page_config(
     page_title="ML Entity Extraction Pipeline",
@@ -29,6 +63,14 @@ if 'is_trained' not in st.session_state:
     st.session_state.is_trained = False
 if 'results_df' not in st.session_state:
     st.session_state.results_df = None
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = None
+if 'results_job_id' not in st.session_state:
+    st.session_state.results_job_id = None
+if 'indexed_job_id' not in st.session_state:
+    st.session_state.indexed_job_id = None
+if 'model_version' not in st.session_state:
+    st.session_state.model_version = None
 
 st.title("🤖 Real-time ML Entity Extraction Pipeline")
 st.markdown("Multi-Model Ensemble with Voting for unstructured data classification")
@@ -38,11 +80,69 @@ st.sidebar.header("Configuration")
 batch_size = st.sidebar.slider("Batch Size", min_value=10, max_value=500, value=100)
 show_intermediate = st.sidebar.checkbox("Show Intermediate Results", value=True)
 show_model_breakdown = st.sidebar.checkbox("Show Model Breakdown", value=False)
+use_checkpoints = st.sidebar.checkbox("Checkpoint Progress", value=True,
+                                      help="Resume an interrupted run of the same file from its last completed batch")
+background_warm_up = st.sidebar.checkbox("Warm Up Models in Background", value=True)
+poll_interval = st.sidebar.slider("Progress Refresh (sec)", min_value=0.5, max_value=5.0, value=1.0)
+store_results = st.sidebar.checkbox("Store Results in Database", value=True,
+                                    help="Keep every run's results for the filtered views below")
+results_db = st.sidebar.text_input("Results Database", value=RESULTS_DB, disabled=not store_results)
+results_store = get_results_store(results_db) if store_results else None
 
 # Main content area
 col1, col2 = st.columns([2, 1])
 
 with col1:
+    st.header("Model")
+
+    # Models come from labelled data: a bundle saved by train.py (or distill.py), or
+    # out-of-core training here on a labelled corpus, which never holds more than one chunk
+    model_source = st.radio("Model Source", ["Load Model Bundle", "Train on Labelled Corpus"], horizontal=True)
+    if model_source == "Load Model Bundle":
+        bundle_path = st.text_input("Model Bundle Directory", help="Saved by train.py --output or distill.py")
+        if st.button("📂 Load Model Bundle", type="primary", disabled=not bundle_path):
+            if not os.path.isdir(bundle_path):
+                st.error(f"❌ No model bundle at {bundle_path}")
+            else:
+                with st.spinner("Loading model bundle..."):
+                    st.session_state.ensemble = load_bundle(bundle_path)
+                st.session_state.is_trained = True
+                st.session_state.model_version = bundle_version(bundle_path)
+                st.success(f"🎉 Loaded {st.session_state.model_version}")
+    else:
+        corpus_texts = st.text_input("Report Texts", value=DEFAULT_CORPORA["unstructured"],
+                                     help="CSV/Parquet file, or a directory of generator shards")
+        corpus_labels = st.text_input("Labels", value=STRUCTURED_FILE,
+                                      help="Row-aligned labels; leave empty if they are columns of the texts")
+        corpus_text_column = st.text_input("Text Column", value="full_text")
+        corpus_chunksize = st.number_input("Chunk Size", min_value=1000, max_value=100000, value=10000, step=1000)
+        bundle_output = st.text_input("Save Bundle To", help="Optional model bundle directory")
+
+        if st.button("🎯 Train Ensemble Models", type="primary", disabled=not corpus_texts):
+            if not os.path.exists(corpus_texts):
+                st.error(f"❌ No corpus at {corpus_texts}")
+            else:
+                with st.spinner("Training ensemble models... This may take a few minutes."):
+                    # The generator's entity offsets, when every part has them
+                    annotations = "auto" if all(os.path.exists(annotation_file(part))
+                                                for part in part_files(corpus_texts)) else None
+                    corpus = LabelledCorpus(corpus_texts, labels_path=corpus_labels or None,
+                                            text_column=corpus_text_column, chunksize=int(corpus_chunksize),
+                                            annotations_path=annotations)
+
+                    # Initialize ensemble (spaCy loads only the components NER needs)
+                    download_spacy_model()
+                    ensemble = EnsembleVotingExtractor(spacy_kwargs={"exclude_unused": True}, incremental=True)
+                    ensemble.train_streaming(corpus)
+                    if bundle_output:
+                        ensemble.save(bundle_output)
+
+                    st.session_state.ensemble = ensemble
+                    st.session_state.is_trained = True
+                    st.session_state.model_version = (bundle_version(bundle_output) if bundle_output else
+                                                      f"app ensemble ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})")
+                    st.success("🎉 Training completed!")
+
     st.header("Data Upload & Processing")
     
     # File upload
@@ -60,141 +160,99 @@ with col1:
         
         # Show data info
         st.info(f"📊 Loaded {len(df)} rows with {len(df.columns)} columns")
-        
-        # Training section
-        st.subheader("Model Training")
-        
-        if st.button("🎯 Train Ensemble Models", type="primary"):
-            if 'text' not in df.columns:
-                st.error("❌ CSV must contain a 'text' column")
-            else:
-                with st.spinner("Training ensemble models... This may take a few minutes."):
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    
-                    # Initialize ensemble
-                    st.session_state.ensemble = EnsembleVotingExtractor()
-                    
-                    # Simulate training progress (adapt to your actual training)
-                    training_steps = ["SpaCy NER", "Hybrid Extractor", "Template ML", "Advanced Ensemble"]
-                    
-                    for i, step in enumerate(training_steps):
-                        status_text.text(f"Training {step}...")
-                        progress_bar.progress((i + 1) / len(training_steps))
-                        
-                        # Your actual training would go here
-                        # For demo, we'll use a subset of data
-                        train_texts = df['text'].tolist()[:min(1000, len(df))]  # Limit for demo
-                        train_labels = [{}] * len(train_texts)  # Adapt to your labels
-                        
-                        if step == "SpaCy NER":
-                            st.session_state.ensemble.spacy_extractor.train(train_texts, train_labels)
-                        elif step == "Hybrid Extractor":
-                            st.session_state.ensemble.hybrid_extractor.train_ml_components(train_texts, train_labels)
-                        elif step == "Template ML":
-                            st.session_state.ensemble.template_extractor.train_classifiers(train_texts, train_labels)
-                        elif step == "Advanced Ensemble":
-                            st.session_state.ensemble.advanced_extractor.train(train_texts, train_labels)
-                    
-                    st.session_state.is_trained = True
-                    status_text.text("✅ All models trained successfully!")
-                    st.success("🎉 Training completed!")
+        if 'text' not in df.columns:
+            st.error("❌ CSV must contain a 'text' column")
         
         # Processing section
-        if st.session_state.is_trained and st.session_state.ensemble is not None:
+        if st.session_state.is_trained and st.session_state.ensemble is not None and 'text' in df.columns:
             st.subheader("Real-time Processing")
+
+            # Only the models that contribute to the picked fields run
+            available_fields = st.session_state.ensemble.available_fields()
+            selected_fields = st.multiselect("Fields to Extract", available_fields, default=available_fields,
+                                             help="Fewer fields skip the models only the others need")
+            fields = None if set(selected_fields) == set(available_fields) else selected_fields
+            if fields is not None:
+                st.caption("Models used: " + ", ".join(st.session_state.ensemble.field_sources(fields)))
+            
+            checkpoint = None
+            if use_checkpoints:
+                # The model is part of the key: after retraining, a file is processed afresh
+                # rather than resumed with the previous model's results
+                field_options = {'fields': sorted(fields)} if fields is not None else {}
+                checkpoint = Checkpoint(input_fingerprint(df['text'], model_breakdown=show_model_breakdown,
+                                                          model_version=st.session_state.model_version,
+                                                          **field_options))
+                if st.button("🗑️ Discard Checkpoint", help="Process this file from the start next time"):
+                    checkpoint.clear()
             
-            if st.button("🚀 Start Processing", type="primary"):
-                # Initialize results storage
-                results = []
-                total_rows = len(df)
-                
-                # Create containers for real-time updates
-                main_progress = st.progress(0)
-                status_container = st.empty()
-                metrics_container = st.container()
-                results_container = st.empty()
-                
-                # Metrics display
-                with metrics_container:
-                    col_metrics = st.columns(4)
-                    processed_metric = col_metrics[0].metric("Processed", "0")
-                    remaining_metric = col_metrics[1].metric("Remaining", str(total_rows))
-                    rate_metric = col_metrics[2].metric("Rate (rows/sec)", "0")
-                    eta_metric = col_metrics[3].metric("ETA", "Calculating...")
-                
-                start_time = time.time()
-                
-                # Process in batches
-                for i in range(0, total_rows, batch_size):
-                    batch_start = time.time()
-                    batch_end = min(i + batch_size, total_rows)
-                    batch_df = df.iloc[i:batch_end]
-                    
-                    # Process batch
-                    batch_results = []
-                    for idx, row in batch_df.iterrows():
-                        try:
-                            final_result, model_predictions = st.session_state.ensemble.extract_with_voting(row['text'])
-                            
-                            # Create result row
-                            result_row = {
-                                'original_index': idx,
-                                'text_preview': row['text'][:100] + '...' if len(row['text']) > 100 else row['text'],
-                                **final_result
-                            }
-                            
-                            if show_model_breakdown:
-                                result_row['model_breakdown'] = json.dumps(model_predictions)
-                            
-                            batch_results.append(result_row)
-                            
-                        except Exception as e:
-                            st.error(f"Error processing row {idx}: {str(e)}")
-                            batch_results.append({
-                                'original_index': idx,
-                                'text_preview': row['text'][:100] + '...',
-                                'error': str(e)
-                            })
-                    
-                    results.extend(batch_results)
-                    
-                    # Update progress and metrics
-                    progress = batch_end / total_rows
-                    main_progress.progress(progress)
-                    
-                    elapsed_time = time.time() - start_time
-                    processing_rate = batch_end / elapsed_time if elapsed_time > 0 else 0
-                    remaining_rows = total_rows - batch_end
-                    eta_seconds = remaining_rows / processing_rate if processing_rate > 0 else 0
-                    
-                    # Update metrics
-                    status_container.info(f"Processing batch {i//batch_size + 1}/{(total_rows-1)//batch_size + 1}")
-                    
-                    # Update metric displays (you'd need to recreate these)
-                    with metrics_container:
-                        col_metrics = st.columns(4)
-                        col_metrics[0].metric("Processed", f"{batch_end:,}")
-                        col_metrics[1].metric("Remaining", f"{remaining_rows:,}")
-                        col_metrics[2].metric("Rate (rows/sec)", f"{processing_rate:.1f}")
-                        col_metrics[3].metric("ETA", f"{eta_seconds/60:.1f} min" if eta_seconds > 60 else f"{eta_seconds:.0f} sec")
-                    
-                    # Show intermediate results
-                    if show_intermediate and results:
-                        current_results_df = pd.DataFrame(results)
-                        results_container.dataframe(current_results_df.tail(50), use_container_width=True)
-                    
-                    # Small delay to make progress visible
-                    time.sleep(0.1)
-                
-                # Final results
-                st.session_state.results_df = pd.DataFrame(results)
-                st.success(f"✅ Processing completed! Extracted data from {total_rows} rows in {elapsed_time:.1f} seconds")
+            if st.button("🚀 Start Processing", type="primary", disabled=not selected_fields):
+                # Runs in the background job manager, so reruns don't interrupt it
+                st.session_state.job_id = get_job_manager().submit(
+                    extraction_work(st.session_state.ensemble, df, batch_size, show_model_breakdown, checkpoint,
+                                    fields, results_store, st.session_state.model_version, uploaded_file.name),
+                    total=len(df),
+                    description=uploaded_file.name
+                )
+                st.session_state.results_job_id = None
+
+    # Progress of the current job, rendered on every rerun until it finishes
+    job = get_job_manager().get(st.session_state.job_id) if st.session_state.job_id else None
+    if job is not None:
+        snapshot = job.snapshot(tail=50 if show_intermediate else 0)
+
+        st.progress(snapshot['progress'])
+        col_metrics = st.columns(4)
+        col_metrics[0].metric("Processed", f"{snapshot['processed']:,}")
+        col_metrics[1].metric("Remaining", f"{snapshot['remaining']:,}")
+        col_metrics[2].metric("Rate (rows/sec)", f"{snapshot['rate']:.1f}")
+        eta_seconds = snapshot['eta'] or 0
+        col_metrics[3].metric("ETA", f"{eta_seconds/60:.1f} min" if eta_seconds > 60 else f"{eta_seconds:.0f} sec")
+
+        if snapshot['resumed_from']:
+            st.info(f"↩️ Resumed from checkpoint: skipped {snapshot['resumed_from']:,} already processed rows")
+
+        if snapshot['errors']:
+            st.warning(f"⚠️ {snapshot['errors']} rows failed; see the 'error' column")
+
+        if snapshot['status'] in FINISHED_STATES:
+            if st.session_state.results_job_id != job.job_id:
+                st.session_state.results_df = pd.DataFrame(job.results)
+                st.session_state.results_job_id = job.job_id
+            if snapshot['status'] == COMPLETED:
+                st.success(f"✅ Processing completed! Extracted data from {snapshot['total']} rows in {snapshot['elapsed']:.1f} seconds")
+            elif snapshot['status'] == CANCELLED:
+                st.warning(f"⏹️ Processing cancelled after {snapshot['processed']} rows")
+            else:
+                st.error(f"❌ Processing failed: {snapshot['error']}")
+        else:
+            st.info(f"Job {snapshot['job_id']}: processing {snapshot['description']} ({snapshot['status']})")
+            if st.button("⏹️ Cancel Processing"):
+                job.cancel()
+
+            # Show intermediate results
+            if snapshot['results_tail']:
+                st.dataframe(pd.DataFrame(snapshot['results_tail']), use_container_width=True)
 
 with col2:
     st.header("Real-time Stats")
-    
-    if st.session_state.results_df is not None:
+
+    # A stored run's totals are kept up to date per batch by the database, so they're
+    # read rather than recomputed over the whole results frame
+    # (a resumed job's run is the one it continued)
+    run_stats = None
+    job = get_job_manager().get(st.session_state.job_id) if st.session_state.job_id else None
+    if results_store is not None and job is not None:
+        run_stats = results_store.run_stats(job.run_id)
+    if run_stats is not None:
+        st.metric("Total Rows Processed", run_stats['rows'])
+        if run_stats['rows'] > 0:
+            st.subheader("Field Extraction Success")
+            for field in RESULT_FIELDS:
+                if field in run_stats['field_counts']:
+                    rate = run_stats['field_counts'][field] / run_stats['rows'] * 100
+                    st.metric(f"{field.title()} Success", f"{rate:.1f}%")
+    elif st.session_state.results_df is not None:
         df_results = st.session_state.results_df
         
         # Summary statistics
@@ -246,6 +304,91 @@ if st.session_state.results_df is not None:
             mime="application/json"
         )
 
+# Filtered counts over every stored run, answered from the database's indexes
+st.header("🗄️ Stored Results")
+if results_store is None:
+    st.info("Turn on 'Store Results in Database' in the sidebar to keep and query past runs")
+else:
+    runs = results_store.runs()
+    st.caption(f"{int(runs['rows'].sum()):,} rows from {len(runs)} runs in {results_db}")
+    if len(runs):
+        with st.expander("Runs"):
+            st.dataframe(runs.assign(started_at=pd.to_datetime(runs['started_at'], unit='s'),
+                                     finished_at=pd.to_datetime(runs['finished_at'], unit='s')),
+                         use_container_width=True)
+        run_labels = {run['run_id']: f"{run['run_id']} · {run['source']} · {run['model_version']}"
+                      for run in runs.to_dict('records')}
+        run_ids = st.multiselect("Runs", list(run_labels), format_func=run_labels.get,
+                                 help="Leave empty for all runs")
+
+        filter_columns = st.columns(len(FILTER_COLUMNS))
+        filters = {column: filter_columns[i].multiselect(column.replace('_', ' ').title(), results_store.values(column))
+                   for i, column in enumerate(FILTER_COLUMNS)}
+        col_from, col_to, col_group = st.columns(3)
+        date_from = col_from.date_input("Incident Date From", value=None)
+        date_to = col_to.date_input("Incident Date To", value=None)
+        group_by = col_group.selectbox("Group By", list(GROUP_COLUMNS), format_func=lambda column: column.replace('_', ' ').title())
+        conditions = {'filters': filters, 'run_ids': run_ids, 'date_from': date_from, 'date_to': date_to}
+
+        start = time.perf_counter()
+        matching = results_store.count(**conditions)
+        counts = results_store.aggregate(group_by, **conditions)
+        latency_ms = (time.perf_counter() - start) * 1000
+        col_matching, col_latency = st.columns(2)
+        col_matching.metric("Matching Rows", f"{matching:,}")
+        col_latency.metric("Query Latency", f"{latency_ms:.1f} ms")
+        if len(counts):
+            st.bar_chart(counts.fillna({group_by: "(none)"}).set_index(group_by))
+        if st.checkbox("Show Matching Rows"):
+            st.dataframe(results_store.query(limit=500, **conditions), use_container_width=True)
+
+# Similar incident search over everything indexed so far
+st.header("🔎 Similar Incidents")
+index_path = st.text_input("Similarity Index Directory", value=INDEX_DIR)
+similarity_index = get_similarity_index(index_path)
+# Reports added from the command line since the last rerun
+similarity_index.refresh()
+st.caption(f"{len(similarity_index):,} reports indexed in {len(similarity_index.segments)} segments")
+
+if (st.session_state.results_df is not None and uploaded_file is not None and 'text' in df.columns
+        and st.session_state.indexed_job_id != st.session_state.results_job_id):
+    if st.button("➕ Add Processed Reports to Index"):
+        records = []
+        for row in st.session_state.results_df.to_dict('records'):
+            if 'error' in row and pd.notna(row['error']):
+                continue
+            record = {k: v for k, v in row.items() if k != 'model_breakdown' and pd.notna(v)}
+            record['source'] = uploaded_file.name
+            record['text'] = str(df['text'].loc[row['original_index']])
+            records.append(record)
+        similarity_index.add([record['text'] for record in records], records)
+        st.session_state.indexed_job_id = st.session_state.results_job_id
+        st.success(f"Indexed {len(records)} reports")
+
+query_text = st.text_area("New report", placeholder="Paste an incident report to find the most similar past ones")
+col_k, col_fast = st.columns(2)
+top_k = col_k.slider("Results", min_value=1, max_value=50, value=5)
+approximate = col_fast.checkbox("Skip very common terms (faster, approximate)", value=False)
+if st.button("Find Similar Incidents") and query_text.strip():
+    start = time.perf_counter()
+    hits = similarity_index.search(query_text, k=top_k, max_df=0.5 if approximate else None)
+    latency_ms = (time.perf_counter() - start) * 1000
+    st.metric("Query Latency", f"{latency_ms:.1f} ms")
+    if hits:
+        st.dataframe(pd.DataFrame([{'similarity': round(score, 3), **record} for score, record in hits]),
+                     use_container_width=True)
+    else:
+        st.info("No similar reports found")
+
 # Footer
 st.markdown("---")
-st.markdown("Built with Streamlit 🎈 | Multi-Model Ensemble Entity Extraction")
\ No newline at end of file
+st.markdown("Built with Streamlit 🎈 | Multi-Model Ensemble Entity Extraction")
+
+# Started last so the page has rendered before any heavy imports happen
+if background_warm_up:
+    start_background_warm_up()
+
+# Poll the running job: rerun shortly to redraw its progress
+if job is not None and job.status not in FINISHED_STATES:
+    time.sleep(poll_interval)
+    st.rerun()
\ No newline at end of file
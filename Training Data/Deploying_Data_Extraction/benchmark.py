@@ -0,0 +1,568 @@
+# benchmark.py
+import argparse
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from corpus import (DATA_DIR, DEFAULT_CORPORA, STRUCTURED_FILE, LabelledCorpus, annotation_file, load_annotations,
+                    load_labels, load_texts, part_files, read_chunks)
+
+# SpacyNERExtractor configurations compared by the spacy-pipeline benchmark
+SPACY_MODES = {
+    "full": {},
+    "inference_only": {"inference_only": True},
+    "exclude_unused": {"exclude_unused": True},
+}
+
+def rss_mb():
+    # Current resident set size; falls back to the peak where /proc isn't available
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+def run_child(args):
+    # Each configuration is measured in a fresh interpreter so RSS numbers don't leak between runs
+    cmd = [sys.executable, os.path.abspath(__file__)] + args
+    output = subprocess.check_output(cmd, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+def spacy_pipeline_child(args):
+    import spacy  # imported up front so the RSS delta covers only the model
+    from extractors import SpacyNERExtractor
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    extractor = SpacyNERExtractor(model=args.model, **SPACY_MODES[args.child])
+    extractor.nlp  # models load lazily
+    load_seconds = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    result = {
+        "mode": args.child,
+        "pipes": extractor.nlp.pipe_names,
+        "load_s": load_seconds,
+        "model_rss_mb": rss_loaded - rss_before,
+        "corpora": {},
+    }
+    for name, path in DEFAULT_CORPORA.items():
+        texts = load_texts(path, limit=args.limit)
+        extractor.extract(texts[0])  # warm up
+        latencies = []
+        for text in texts:
+            start = time.perf_counter()
+            extractor.extract(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+        result["corpora"][name] = {
+            "docs": len(texts),
+            "mean_ms": sum(latencies) / len(latencies),
+            "p95_ms": percentile(latencies, 95),
+        }
+    result["peak_rss_mb"] = rss_mb()
+    print(json.dumps(result))
+
+def spacy_pipeline(args):
+    if args.child:
+        return spacy_pipeline_child(args)
+
+    results = []
+    for mode in SPACY_MODES:
+        results.append(run_child(["spacy-pipeline", "--child", mode,
+                                  "--model", args.model, "--limit", str(args.limit)]))
+
+    baseline = results[0]
+    print(f"{'mode':<16}{'load s':>8}{'model MB':>10}{'RSS MB':>9}  per-doc mean ms (p95) by corpus")
+    for result in results:
+        timings = "  ".join(
+            f"{name}: {stats['mean_ms']:.2f} ({stats['p95_ms']:.2f})"
+            for name, stats in result["corpora"].items()
+        )
+        print(f"{result['mode']:<16}{result['load_s']:>8.2f}{result['model_rss_mb']:>10.1f}"
+              f"{result['peak_rss_mb']:>9.1f}  {timings}")
+        print(f"{'':<16}pipes: {', '.join(result['pipes'])}")
+
+    for result in results[1:]:
+        for name, stats in result["corpora"].items():
+            speedup = baseline["corpora"][name]["mean_ms"] / stats["mean_ms"]
+            print(f"{result['mode']} vs full on {name}: {speedup:.2f}x faster per doc, "
+                  f"{baseline['peak_rss_mb'] - result['peak_rss_mb']:.1f} MB less RSS")
+
+def startup_child(args):
+    start = time.perf_counter()
+    import extractors
+    import_seconds = time.perf_counter() - start
+    heavy_modules = [m for m in ["spacy", "sklearn", "dateutil"] if m in sys.modules]
+
+    text = load_texts(DEFAULT_CORPORA["unstructured"], limit=1)[0]
+    ensemble = extractors.EnsembleVotingExtractor(
+        spacy_kwargs={"model": args.model, "exclude_unused": True}
+    )
+
+    warm_up_seconds = 0.0
+    if args.child == "warm":
+        start = time.perf_counter()
+        ensemble.warm_up()
+        warm_up_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ensemble.extract_with_voting(text)
+    first_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ensemble.extract_with_voting(text)
+    second_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "mode": args.child,
+        "import_s": import_seconds,
+        "warm_up_s": warm_up_seconds,
+        "first_extraction_s": first_seconds,
+        "second_extraction_s": second_seconds,
+        "heavy_modules_at_import": heavy_modules,
+    }))
+
+def startup(args):
+    if args.child:
+        return startup_child(args)
+
+    print(f"{'mode':<6}{'import s':>10}{'warm-up s':>11}{'1st extract s':>15}{'2nd extract s':>15}")
+    for mode in ["cold", "warm"]:
+        runs = [run_child(["startup", "--child", mode, "--model", args.model]) for _ in range(args.repeat)]
+        mean = lambda key: sum(r[key] for r in runs) / len(runs)
+        print(f"{mode:<6}{mean('import_s'):>10.3f}{mean('warm_up_s'):>11.3f}"
+              f"{mean('first_extraction_s'):>15.3f}{mean('second_extraction_s'):>15.3f}")
+    heavy = runs[-1]["heavy_modules_at_import"]
+    print(f"Heavy modules loaded by 'import extractors': {', '.join(heavy) if heavy else 'none'}")
+
+def stress_corpus(args):
+    # Repeatable stress corpora: same profile + seed + rows + shards -> same files
+    sys.path.insert(0, DATA_DIR)
+    import combined_3_training_data_structures as generator
+
+    output = args.output or os.path.join("bench_corpora", f"{args.profile}-{args.rows}-seed{args.seed}")
+    start = time.perf_counter()
+    generator.write_sharded_dataset(output, args.rows, args.shards, args.seed, fmt=args.format,
+                                    workers=args.workers, profile=args.profile)
+    print(f"Generated {args.rows} rows in {time.perf_counter() - start:.1f}s -> {output}")
+
+    for view in ["unstructured", "slight_structure"]:
+        corpus = LabelledCorpus(os.path.join(output, generator.VIEWS[view]), labels_path=None)
+        lengths = sorted(len(text) for texts, _, _ in corpus for text in texts)
+        print(f"{view}: {len(lengths)} texts, length p50 {percentile(lengths, 50):,} "
+              f"p99 {percentile(lengths, 99):,} max {lengths[-1]:,} chars")
+
+def post_json(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return json.loads(response.read())
+
+def start_server(args, max_batch):
+    # serve.py on a free port; returns the process and its base URL once it's listening
+    cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py"),
+           "--model", args.model, "--port", "0",
+           "--max-batch", str(max_batch), "--max-wait-ms", str(args.max_wait_ms)]
+    if args.budget_ms:
+        cmd += ["--budget-ms", str(args.budget_ms)]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    match = re.search(r"http://[^ ]+", line)
+    if not match:
+        process.kill()
+        raise RuntimeError(f"serve.py didn't start: {line!r}")
+    return process, match.group(0)
+
+def load_level(url, texts, concurrency, n_requests):
+    # n_requests single-text requests from `concurrency` clients, each sending its next
+    # request as soon as the previous one is answered
+    counter = itertools.count()
+    latencies = []
+    errors = []
+    degraded = []
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            i = next(counter)
+            if i >= n_requests:
+                return
+            start = time.perf_counter()
+            try:
+                response = post_json(url + "/extract", {"text": texts[i % len(texts)]})
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+                degraded.append(bool(response["result"].get("degraded")))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "degraded": sum(degraded) / len(degraded) if degraded else 0.0,
+        "throughput": len(latencies) / wall,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+def serve_load(args):
+    texts = load_texts(DEFAULT_CORPORA["unstructured"], limit=args.requests)
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    configs = [("batched", args.max_batch)] + ([("unbatched", 1)] if args.compare_unbatched else [])
+    for name, max_batch in configs:
+        process = None
+        url = args.url
+        if url is None:
+            process, url = start_server(args, max_batch)
+        try:
+            post_json(url + "/extract", {"text": texts[0]})  # warm up
+            budget = f", budget {args.budget_ms} ms" if args.budget_ms else ""
+            print(f"{name} (max batch {max_batch}, max wait {args.max_wait_ms} ms{budget}) at {url}")
+            print(f"{'clients':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+                  f"{'degraded':>10}{'mean batch':>12}")
+            for concurrency in levels:
+                before = json.loads(urllib.request.urlopen(url + "/stats").read())
+                result = load_level(url, texts, concurrency, args.requests)
+                after = json.loads(urllib.request.urlopen(url + "/stats").read())
+                batches = after["batches"] - before["batches"]
+                mean_batch = (after["items"] - before["items"]) / batches if batches else 0.0
+                print(f"{concurrency:>8}{result['throughput']:>9.1f}{result['p50_ms']:>9.1f}"
+                      f"{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['errors']:>8}"
+                      f"{result['degraded']:>10.1%}{mean_batch:>12.1f}")
+            if args.budget_ms:
+                print(f"overruns by extractor: {after['extractors']['overruns']}")
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+        if args.url is not None:
+            break
+
+def load_gold(path, limit):
+    # Texts plus their gold {field: value}, from the generator's entity offsets sidecar
+    from evaluation import gold_fields
+
+    annotations_path = annotation_file(path)
+    if not os.path.exists(annotations_path):
+        sys.exit(f"{annotations_path} not found: regenerate the corpus with the generator to get entity offsets")
+    texts = load_texts(path, limit=limit)
+    gold = [gold_fields(text, spans) for text, spans in zip(texts, load_annotations(annotations_path, limit))]
+    return texts, gold
+
+def time_batches(extractor, texts, batch_size):
+    extractor.extract_batch(texts[:batch_size])  # warm up
+    predictions = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        predictions.extend(extractor.extract_batch(texts[i:i + batch_size]))
+    return predictions, len(texts) / (time.perf_counter() - start)
+
+def ner_compare(args):
+    from evaluation import field_scores
+    from extractors import NER_FIELDS, SpacyNERExtractor
+    from transformer_extractor import TransformerNERExtractor
+
+    texts, gold = load_gold(args.texts, args.limit)
+    extractors = {"spacy": SpacyNERExtractor(model=args.spacy_model, exclude_unused=True)}
+    for quantize in ([False, True] if args.quantize == "both" else [args.quantize == "on"]):
+        name = "transformer-int8" if quantize else "transformer"
+        extractors[name] = TransformerNERExtractor(args.transformer_model, quantize=quantize,
+                                                   num_threads=args.threads, batch_size=args.batch_size)
+
+    results = {}
+    for name, extractor in extractors.items():
+        predictions, rows_per_sec = time_batches(extractor, texts, args.batch_size)
+        results[name] = (field_scores(predictions, gold, NER_FIELDS), rows_per_sec)
+
+    print(f"{len(texts)} texts from {args.texts}, batch size {args.batch_size}, "
+          f"torch threads {args.threads or 'default'}")
+    names = list(results)
+    print(f"{'field':<22}" + "".join(f"{name + ' F1':>20}" for name in names))
+    for field in NER_FIELDS + ["micro"]:
+        print(f"{field:<22}" + "".join(f"{results[name][0].get(field, {}).get('f1', 0):>20.3f}" for name in names))
+    print(f"{'rows/sec':<22}" + "".join(f"{results[name][1]:>20.1f}" for name in names))
+
+def gazetteer_compare(args):
+    # Dictionary matching against the ensemble's own sources for the closed-vocabulary fields
+    from evaluation import field_scores
+    from extractors import EnsembleVotingExtractor
+    from gazetteer import GazetteerExtractor
+
+    fields = ["location", "department", "reporter_name", "person_involved"]
+    texts, gold = load_gold(args.texts, args.limit)
+    ensemble = EnsembleVotingExtractor.load(args.model)
+    extractors = {
+        "gazetteer": GazetteerExtractor(args.dictionary),
+        "hybrid": ensemble.hybrid_extractor,
+        "template": ensemble.template_extractor,
+        "advanced": ensemble.advanced_extractor,
+    }
+
+    results = {}
+    for name, extractor in extractors.items():
+        predictions, rows_per_sec = time_batches(extractor, texts, args.batch_size)
+        results[name] = (field_scores(predictions, gold, fields), rows_per_sec)
+
+    print(f"{len(texts)} texts from {args.texts}, batch size {args.batch_size}")
+    names = list(results)
+    print(f"{'field':<22}" + "".join(f"{name + ' F1':>16}" for name in names))
+    for field in fields + ["micro"]:
+        print(f"{field:<22}" + "".join(f"{results[name][0].get(field, {}).get('f1', 0):>16.3f}" for name in names))
+    print(f"{'rows/sec':<22}" + "".join(f"{results[name][1]:>16.1f}" for name in names))
+
+def similarity_search(args):
+    # Query latency of the similarity index (exact, and with common terms skipped) against
+    # a brute-force sparse product over the same features
+    import numpy as np
+    from scipy.sparse import vstack
+
+    from similarity import SimilarityIndex
+
+    texts = []
+    for part in part_files(args.texts):
+        for chunk in read_chunks(part, 100000, columns=[args.text_column]):
+            texts.extend(chunk[args.text_column].fillna("").astype(str).tolist())
+        if len(texts) >= args.limit + args.queries:
+            break
+    corpus, queries = texts[:args.limit], texts[args.limit:args.limit + args.queries]
+
+    with tempfile.TemporaryDirectory() as path:
+        index = SimilarityIndex(path)
+        start = time.perf_counter()
+        for i in range(0, len(corpus), args.segment_rows):
+            index.add(corpus[i:i + args.segment_rows], [{"row": i + j} for j in range(len(corpus[i:i + args.segment_rows]))])
+        build = time.perf_counter() - start
+        index = SimilarityIndex(path)  # reopened, memory-mapped
+        print(f"Indexed {len(index)} reports from {args.texts} in {build:.1f}s "
+              f"({len(index.segments)} segments); {len(queries)} queries, k={args.k}")
+
+        def timed(search):
+            latencies, hits = [], []
+            for query in queries:
+                start = time.perf_counter()
+                hits.append(search(query))
+                latencies.append((time.perf_counter() - start) * 1000)
+            return latencies, hits
+
+        matrix = vstack([segment.matrix() for segment in index.segments]).tocsr()
+
+        def brute_force(query):
+            scores = (matrix @ index.features([query]).T).toarray().ravel()
+            return list(np.argsort(-scores, kind="stable")[:args.k])
+
+        modes = {"brute force": brute_force,
+                 "index": lambda query: [record["row"] for _, record in index.search(query, args.k)]}
+        for max_df in [float(value) for value in args.max_df.split(",") if value]:
+            modes[f"index max_df={max_df}"] = (
+                lambda query, max_df=max_df: [record["row"] for _, record in index.search(query, args.k, max_df)])
+
+        print(f"{'mode':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'recall@k':>10}")
+        exact = None
+        for name, search in modes.items():
+            latencies, hits = timed(search)
+            if exact is None:
+                exact = hits
+            # Ties at the k-th score can legitimately swap members, so compare as sets
+            recall = np.mean([len(set(hit) & set(truth)) / max(len(truth), 1) for hit, truth in zip(hits, exact)])
+            print(f"{name:<24}{percentile(latencies, 50):>9.2f}{percentile(latencies, 95):>9.2f}"
+                  f"{percentile(latencies, 99):>9.2f}{recall:>10.3f}")
+
+def run_ensemble(ensemble, texts, batch_size, fields=None):
+    predictions = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        predictions.extend(final for final, _ in ensemble.extract_batch_with_voting(texts[i:i + batch_size],
+                                                                                    fields=fields))
+    return predictions, time.perf_counter() - start
+
+def field_subsets(args):
+    # Field-selective extraction vs all fields: speed, and whether each requested field
+    # comes out the same
+    from extractors import EnsembleVotingExtractor
+
+    ensemble = EnsembleVotingExtractor.load(args.model)
+    texts = load_texts(args.texts, limit=args.limit)
+    ensemble.extract_batch_with_voting(texts[:args.batch_size])  # warm up
+
+    full_predictions, full_seconds = run_ensemble(ensemble, texts, args.batch_size)
+    print(f"{len(texts)} texts from {args.texts}, batch size {args.batch_size}")
+    print(f"{'fields':<40}{'rows/s':>9}{'speedup':>9}{'same':>7}  models")
+    print(f"{'all':<40}{len(texts) / full_seconds:>9.1f}{1:>9.2f}{'':>7}  {', '.join(ensemble.extractors())}")
+    for subset in args.subsets.split(";"):
+        fields = [field.strip() for field in subset.split(",") if field.strip()]
+        predictions, seconds = run_ensemble(ensemble, texts, args.batch_size, fields)
+        same = all({field: value for field, value in full.items() if field in fields} == predicted
+                   for full, predicted in zip(full_predictions, predictions))
+        print(f"{','.join(fields):<40}{len(texts) / seconds:>9.1f}{full_seconds / seconds:>9.2f}"
+              f"{'yes' if same else 'NO':>7}  {', '.join(ensemble.field_sources(fields))}")
+
+def cascade(args):
+    from evaluation import field_scores, gold_labels
+    from extractors import EnsembleVotingExtractor
+
+    ensemble = EnsembleVotingExtractor.load(args.model)
+    if args.gazetteer:
+        from gazetteer import GazetteerExtractor
+        ensemble.gazetteer_extractor = GazetteerExtractor(None if args.gazetteer == "default" else args.gazetteer)
+    texts = load_texts(args.texts, limit=args.limit)
+    gold = [gold_labels(label) for label in load_labels(args.labels, limit=args.limit)]
+    ensemble.cascade = None
+    ensemble.extract_batch_with_voting(texts[:args.batch_size])  # warm up
+
+    full_predictions, full_seconds = run_ensemble(ensemble, texts, args.batch_size)
+    full_scores = field_scores(full_predictions, gold)
+    print(f"{len(texts)} texts from {args.texts}, batch size {args.batch_size}")
+    print(f"{'mode':<16}{'rows/s':>9}{'speedup':>9}{'NER rows':>10}{'tmpl rows':>11}{'adv rows':>10}"
+          f"{'micro F1':>10}{'dF1':>8}  F1 changes by field")
+    print(f"{'full':<16}{len(texts) / full_seconds:>9.1f}{1:>9.2f}{1:>10.0%}{1:>11.0%}{1:>10.0%}"
+          f"{full_scores['micro']['f1']:>10.3f}{0:>8.3f}")
+
+    for threshold in [float(t) for t in args.thresholds.split(",")]:
+        ensemble.cascade = {"threshold": threshold, "field_thresholds": json.loads(args.field_thresholds)}
+        if args.rule_confidence is not None:
+            ensemble.cascade["rule_confidence"] = args.rule_confidence
+        ensemble.cascade_stats = {}
+        predictions, seconds = run_ensemble(ensemble, texts, args.batch_size)
+        scores = field_scores(predictions, gold)
+        stats = ensemble.cascade_stats
+        share = lambda key: stats.get(key, 0) / stats["texts"]
+        changes = ", ".join(f"{field} {scores[field]['f1'] - full_scores[field]['f1']:+.3f}"
+                            for field in sorted(full_scores) if field != "micro" and field in scores
+                            and abs(scores[field]['f1'] - full_scores[field]['f1']) >= 0.001)
+        print(f"{'cascade@' + str(threshold):<16}{len(texts) / seconds:>9.1f}{full_seconds / seconds:>9.2f}"
+              f"{share('ner_rows'):>10.0%}{share('template_rows'):>11.0%}{share('advanced_rows'):>10.0%}"
+              f"{scores['micro']['f1']:>10.3f}{scores['micro']['f1'] - full_scores['micro']['f1']:>+8.3f}  {changes}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the extraction pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    spacy_parser = subparsers.add_parser("spacy-pipeline", help="Full vs NER-only spaCy pipeline latency and RSS")
+    spacy_parser.add_argument("--model", default="en_core_web_sm")
+    spacy_parser.add_argument("--limit", type=int, default=1000, help="Documents per corpus")
+    spacy_parser.add_argument("--child", choices=list(SPACY_MODES), help=argparse.SUPPRESS)
+    spacy_parser.set_defaults(func=spacy_pipeline)
+
+    startup_parser = subparsers.add_parser("startup", help="Import time and first-extraction latency")
+    startup_parser.add_argument("--model", default="en_core_web_sm")
+    startup_parser.add_argument("--repeat", type=int, default=3)
+    startup_parser.add_argument("--child", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    startup_parser.set_defaults(func=startup)
+
+    corpus_parser = subparsers.add_parser("corpus", help="Generate a stress corpus from a load profile")
+    corpus_parser.add_argument("--profile", default="stress",
+                               help="Generator load profile name or JSON file of settings")
+    corpus_parser.add_argument("--rows", type=int, default=10000)
+    corpus_parser.add_argument("--shards", type=int, default=1)
+    corpus_parser.add_argument("--seed", type=int, default=0)
+    corpus_parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    corpus_parser.add_argument("--workers", type=int)
+    corpus_parser.add_argument("--output", help="Default: bench_corpora/<profile>-<rows>-seed<seed>")
+    corpus_parser.set_defaults(func=stress_corpus)
+
+    serve_parser = subparsers.add_parser("serve-load", help="Throughput and tail latency of serve.py under load")
+    serve_parser.add_argument("--model", help="Model bundle to serve (starts serve.py for the run)")
+    serve_parser.add_argument("--url", help="Load-test an already running service instead")
+    serve_parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated client counts")
+    serve_parser.add_argument("--requests", type=int, default=500, help="Requests per concurrency level")
+    serve_parser.add_argument("--max-batch", type=int, default=32)
+    serve_parser.add_argument("--max-wait-ms", type=float, default=10)
+    serve_parser.add_argument("--budget-ms", type=float, help="Per-request latency budget passed to serve.py")
+    serve_parser.add_argument("--compare-unbatched", action="store_true",
+                              help="Also run a server with micro-batching off (max batch 1)")
+    serve_parser.set_defaults(func=serve_load)
+
+    gazetteer_parser = subparsers.add_parser("gazetteer", help="Dictionary matching vs the ensemble's classifiers")
+    gazetteer_parser.add_argument("--model", required=True, help="Model bundle saved by train.py")
+    gazetteer_parser.add_argument("--dictionary", help="Gazetteer JSON (default: gazetteer.json)")
+    gazetteer_parser.add_argument("--texts", default=DEFAULT_CORPORA["unstructured"],
+                                  help="Corpus with an entity offsets sidecar")
+    gazetteer_parser.add_argument("--limit", type=int, default=2000)
+    gazetteer_parser.add_argument("--batch-size", type=int, default=64)
+    gazetteer_parser.set_defaults(func=gazetteer_compare)
+
+    similarity_parser = subparsers.add_parser("similarity", help="Similar-incident index query latency")
+    similarity_parser.add_argument("--texts", default=DEFAULT_CORPORA["unstructured"],
+                                   help="CSV file or directory of generator shards")
+    similarity_parser.add_argument("--text-column", default="full_text")
+    similarity_parser.add_argument("--limit", type=int, default=100000, help="Reports to index")
+    similarity_parser.add_argument("--queries", type=int, default=200, help="Held-out reports used as queries")
+    similarity_parser.add_argument("--segment-rows", type=int, default=25000, help="Reports per insert")
+    similarity_parser.add_argument("-k", type=int, default=10)
+    similarity_parser.add_argument("--max-df", default="0.5,0.2", help="Comma-separated max_df values to try")
+    similarity_parser.set_defaults(func=similarity_search)
+
+    ner_parser = subparsers.add_parser("ner-compare", help="Transformer vs spaCy NER accuracy and rows/sec")
+    ner_parser.add_argument("--transformer-model", required=True, help="Token-classification checkpoint directory")
+    ner_parser.add_argument("--spacy-model", required=True, help="Trained spaCy NER pipeline, e.g. <bundle>/spacy")
+    ner_parser.add_argument("--texts", default=DEFAULT_CORPORA["unstructured"],
+                            help="Corpus with a generator entity-offsets sidecar")
+    ner_parser.add_argument("--limit", type=int, default=1000)
+    ner_parser.add_argument("--batch-size", type=int, default=16)
+    ner_parser.add_argument("--threads", type=int, help="torch intra-op threads")
+    ner_parser.add_argument("--quantize", choices=["off", "on", "both"], default="both",
+                            help="Run the transformer with int8 dynamic quantization")
+    ner_parser.set_defaults(func=ner_compare)
+
+    cascade_parser = subparsers.add_parser("cascade", help="Cascade mode vs full voting: compute saved and accuracy")
+    cascade_parser.add_argument("--model", required=True, help="Model bundle directory saved by train.py")
+    cascade_parser.add_argument("--texts", default=DEFAULT_CORPORA["unstructured"])
+    cascade_parser.add_argument("--labels", default=STRUCTURED_FILE, help="Row-aligned structured labels (the gold)")
+    cascade_parser.add_argument("--limit", type=int, default=1000)
+    cascade_parser.add_argument("--batch-size", type=int, default=64)
+    cascade_parser.add_argument("--thresholds", default="0.6,0.8,0.9,0.99")
+    cascade_parser.add_argument("--rule-confidence", type=float,
+                                help="Confidence of regex matches for fields without a default")
+    cascade_parser.add_argument("--field-thresholds", default="{}",
+                                help='JSON overrides of the per-field thresholds, e.g. \'{"location": 0.4}\'')
+    cascade_parser.add_argument("--gazetteer", nargs="?", const="default",
+                                help="Add a gazetteer voter (optionally a dictionary path) to the loaded bundle")
+    cascade_parser.set_defaults(func=cascade)
+
+    fields_parser = subparsers.add_parser("fields", help="Field-selective extraction vs all fields")
+    fields_parser.add_argument("--model", required=True, help="Model bundle directory saved by train.py")
+    fields_parser.add_argument("--texts", default=DEFAULT_CORPORA["unstructured"])
+    fields_parser.add_argument("--limit", type=int, default=1000)
+    fields_parser.add_argument("--batch-size", type=int, default=64)
+    fields_parser.add_argument("--subsets", default="was_injured,department;incident_date,incident_time;location",
+                               help="Semicolon-separated field sets to time")
+    fields_parser.set_defaults(func=field_subsets)
+
+    args = parser.parse_args(argv)
+    if args.func is serve_load and not (args.model or args.url):
+        parser.error("serve-load needs --model or --url")
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# checkpoint.py
+# Durable progress for long extraction runs. Each processed batch is appended to a
+# JSONL file (and fsynced) before it counts as done, so a run that dies partway can
+# be restarted on the same input and pick up after the last committed batch.
+import hashlib
+import json
+import os
+
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoints")
+
+def input_fingerprint(texts, **options):
+    # Identifies a run by its input content (not the upload's file name) plus any
+    # options that change the result rows
+    digest = hashlib.sha256()
+    for text in texts:
+        encoded = str(text).encode("utf-8")
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:24]
+
+def to_json(value):
+    # numpy scalars (row indexes, predictions) aren't JSON serializable themselves
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+class Checkpoint:
+    def __init__(self, key, directory=CHECKPOINT_DIR):
+        self.key = key
+        self.path = os.path.join(directory, f"{key}.jsonl")
+
+    def load(self):
+        # Returns (rows processed, their results) from the committed batches. A
+        # partially written last line (the process died mid-write) is dropped.
+        processed, results = 0, []
+        if not os.path.exists(self.path):
+            return processed, results
+
+        good_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                processed = batch["end"]
+                results.extend(batch["rows"])
+                good_bytes += len(line)
+
+        if good_bytes < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good_bytes)
+        return processed, results
+
+    def commit(self, end, rows):
+        # end is the offset of the first row not yet processed
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        line = json.dumps({"end": end, "rows": rows}, default=to_json) + "\n"
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
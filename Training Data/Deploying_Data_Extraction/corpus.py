@@ -0,0 +1,148 @@
+# corpus.py
+import csv
+import glob
+import gzip
+import json
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The generated corpora, row-aligned with the structured labels file
+STRUCTURED_FILE = os.path.join(DATA_DIR, "shipyard_structured_dataset.csv")
+DEFAULT_CORPORA = {
+    "unstructured": os.path.join(DATA_DIR, "shipyard_unstructured_without_structure_dataset.csv"),
+    "slight_structure": os.path.join(DATA_DIR, "shipyard_unstructure_with_structure_dataset.csv"),
+}
+
+def load_texts(path, column="full_text", limit=None):
+    texts = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            texts.append(row[column])
+            if limit is not None and len(texts) >= limit:
+                break
+    return texts
+
+def load_labels(path=STRUCTURED_FILE, limit=None):
+    labels = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            labels.append(row)
+            if limit is not None and len(labels) >= limit:
+                break
+    return labels
+
+def open_text(path):
+    # Transparently reads the generator's gzip-compressed shards
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+def annotation_file(path):
+    # Sidecar written by the generator next to each unstructured corpus; shards
+    # (.csv.gz or .parquet) get a gzip-compressed one
+    compression = ".gz" if path.endswith((".gz", ".parquet")) else ""
+    if path.endswith(".gz"):
+        path = path[:-3]
+    return os.path.splitext(path)[0] + "_annotations.jsonl" + compression
+
+def load_annotations(path, limit=None):
+    # One [[start, end, field], ...] list per corpus row, in row order
+    annotations = []
+    with open_text(path) as f:
+        for line in f:
+            annotations.append([tuple(span) for span in json.loads(line)["entities"]])
+            if limit is not None and len(annotations) >= limit:
+                break
+    return annotations
+
+def part_files(path):
+    # A single CSV/Parquet file, or a directory of the generator's part-NNNNN shards
+    if os.path.isdir(path):
+        return sorted(p for p in glob.glob(os.path.join(path, "part-*")) if "_annotations" not in p)
+    return [path]
+
+def read_chunks(path, chunksize, columns=None):
+    import pandas as pd
+
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif path.endswith((".jsonl", ".jsonl.gz")):
+        for chunk in pd.read_json(path, lines=True, chunksize=chunksize, dtype=False):
+            yield chunk[columns] if columns is not None else chunk
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+class LabelledCorpus:
+    # Re-iterable stream of (texts, labels, annotations) chunks read from disk, so training
+    # never holds more than one chunk. Paths may be single files or shard directories.
+    # Labels come from labels_path (row-aligned with the texts, like the generator's
+    # structured view) or, if it's None, from the text file's own columns. annotations is
+    # None unless an annotations_path sidecar is given; "auto" uses the sidecar of each part.
+    # A single sidecar only fits a single-file corpus.
+    def __init__(self, text_path, labels_path=STRUCTURED_FILE, text_column="full_text",
+                 chunksize=10000, annotations_path=None):
+        self.text_path = text_path
+        self.labels_path = labels_path
+        self.text_column = text_column
+        self.chunksize = chunksize
+        self.annotations_path = annotations_path
+
+    def __iter__(self):
+        text_parts = part_files(self.text_path)
+        label_parts = part_files(self.labels_path) if self.labels_path is not None else [None] * len(text_parts)
+        if len(label_parts) != len(text_parts):
+            raise ValueError(f"{self.text_path} and {self.labels_path} have different numbers of parts")
+
+        if self.annotations_path not in (None, "auto") and len(text_parts) > 1:
+            raise ValueError(f"{self.annotations_path} is one annotations file but {self.text_path} has "
+                             f"{len(text_parts)} parts; use 'auto' for each part's own sidecar")
+
+        for text_part, label_part in zip(text_parts, label_parts):
+            annotations_path = self.annotations_path
+            if annotations_path == "auto":
+                annotations_path = annotation_file(text_part)
+                if not os.path.exists(annotations_path):
+                    raise FileNotFoundError(f"No annotations sidecar for {text_part} (expected {annotations_path})")
+            yield from self.iter_part(text_part, label_part, annotations_path)
+
+    def iter_part(self, text_path, labels_path, annotations_path):
+        label_chunks = read_chunks(labels_path, self.chunksize) if labels_path is not None else None
+        annotation_file = open_text(annotations_path) if annotations_path else None
+
+        try:
+            for text_chunk in read_chunks(text_path, self.chunksize):
+                texts = text_chunk[self.text_column].fillna("").astype(str).tolist()
+                label_chunk = next(label_chunks) if label_chunks is not None else text_chunk
+                labels = label_chunk.drop(columns=[self.text_column], errors="ignore").to_dict("records")
+                annotations = None
+                if annotation_file is not None:
+                    lines = [annotation_file.readline() for _ in texts]
+                    if not lines[-1]:
+                        raise ValueError(f"{annotations_path} has fewer rows than {text_path}")
+                    annotations = [[tuple(span) for span in json.loads(line)["entities"]] for line in lines]
+                yield texts, labels, annotations
+        finally:
+            if annotation_file is not None:
+                annotation_file.close()
+
+    def label_classes(self, fields):
+        # One pass over just the label columns, so streamed classifiers know every class up front
+        import pandas as pd
+
+        classes = {}
+        for path in part_files(self.labels_path or self.text_path):
+            if path.endswith(".parquet"):
+                import pyarrow.parquet as pq
+                columns = set(pq.read_schema(path).names)
+            else:
+                columns = set(pd.read_csv(path, nrows=0).columns)
+            present = [field for field in fields if field in columns]
+            for chunk in read_chunks(path, self.chunksize * 10, columns=present):
+                for field in present:
+                    values = classes.setdefault(field, set())
+                    values.update(str(value) for value in chunk[field].dropna().unique() if value != "N/A")
+        return {field: sorted(values) for field, values in classes.items()}
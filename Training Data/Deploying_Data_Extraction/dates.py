@@ -0,0 +1,109 @@
+# dates.py
+# Date normalization for the extractors. The corpora only use a few date shapes and the
+# same dates recur constantly, so the known shapes get dedicated parsers and results are
+# memoized; anything else falls back to dateutil. Results match dateutil.parser.parse
+# (month-first unless dayfirst=True, e.g. "12/03/2024" is 3 December) then strftime.
+import re
+import threading
+from collections import OrderedDict
+from datetime import date
+
+MONTHS = {name: i for i, name in enumerate(
+    ["january", "february", "march", "april", "may", "june", "july",
+     "august", "september", "october", "november", "december"], 1)}
+MONTH_NAMES = "|".join(MONTHS)
+
+# The shapes HybridExtractor's date patterns match
+NUMERIC_DATE = re.compile(r"(\d{1,2})([/-])(\d{1,2})\2(\d{4})")
+DAY_MONTH_YEAR = re.compile(rf"(\d{{1,2}})\s+({MONTH_NAMES})\s+(\d{{4}})", re.IGNORECASE)
+MONTH_DAY_YEAR = re.compile(rf"({MONTH_NAMES})\s+(\d{{1,2}}),?\s+(\d{{4}})", re.IGNORECASE)
+
+class DateNormalizer:
+    def __init__(self, output_format="%d/%m/%Y", dayfirst=False, cache_size=10000):
+        self.output_format = output_format
+        self.dayfirst = dayfirst
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['cache'] = OrderedDict()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def parse_known(self, value):
+        # (year, month, day) for the known shapes, None for anything else
+        match = NUMERIC_DATE.fullmatch(value)
+        if match:
+            first, second, year = int(match.group(1)), int(match.group(3)), int(match.group(4))
+            # dateutil's resolution for a numeric date with the year last
+            if first > 12 or (self.dayfirst and second <= 12):
+                return year, second, first
+            return year, first, second
+        match = DAY_MONTH_YEAR.fullmatch(value)
+        if match:
+            return int(match.group(3)), MONTHS[match.group(2).lower()], int(match.group(1))
+        match = MONTH_DAY_YEAR.fullmatch(value)
+        if match:
+            return int(match.group(3)), MONTHS[match.group(1).lower()], int(match.group(2))
+        return None
+
+    def parse(self, value):
+        # A date, or None if the value isn't one
+        parts = self.parse_known(value)
+        if parts is not None:
+            try:
+                return date(*parts)
+            except ValueError:
+                pass  # e.g. 31 February: let dateutil decide, as before
+
+        from dateutil import parser as date_parser
+
+        self.fallbacks += 1
+        try:
+            return date_parser.parse(value, dayfirst=self.dayfirst).date()
+        except (ValueError, OverflowError):
+            return None
+
+    def normalize(self, value):
+        # value formatted with output_format, or None if it can't be parsed
+        with self._lock:
+            if value in self.cache:
+                self.cache.move_to_end(value)
+                self.hits += 1
+                return self.cache[value]
+        parsed = self.parse(value)
+        normalized = parsed.strftime(self.output_format) if parsed is not None else None
+        with self._lock:
+            self.misses += 1
+            self.cache[value] = normalized
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return normalized
+
+    def normalize_batch(self, values):
+        # A whole column at once: each distinct value is normalized once. Missing values
+        # (None/NaN) stay None. Returns a list, or a Series for a pandas Series.
+        import pandas as pd
+
+        series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+        mapping = {value: self.normalize(str(value)) for value in series.dropna().unique()}
+        normalized = series.map(mapping).astype(object)
+        normalized = normalized.where(normalized.notna(), None)
+        return normalized if isinstance(values, pd.Series) else normalized.tolist()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'fallbacks': self.fallbacks,
+                    'cached': len(self.cache)}
+
+# Shared by the extractors, so the cache is warm across extractors and bundles
+default_normalizer = DateNormalizer()
@@ -0,0 +1,183 @@
+# deadlines.py
+# Latency budgets for ensemble extraction. Python can't interrupt an extractor mid-call, so
+# budgets are enforced between calls: each extractor's cost per character of input is
+# tracked as a moving average, and work is only started when its estimate fits in what's
+# left of the budget. Texts an extractor skips simply don't get its vote.
+# Budgets are either for a whole batch (a Deadline) or per text (RowBudgets), where one
+# long text can't use up the time of the others.
+# An estimate only changes when the extractor runs, so one slow call (a GC pause, a cold
+# cache) could otherwise keep it skipped for good: every PROBE_EVERY skipped texts, the
+# shortest text it's skipping is run anyway, and its measured cost updates the estimate.
+import threading
+import time
+from collections import Counter
+
+# Seconds per character assumed for an extractor that hasn't been measured yet (0.1 s per
+# 1,000 characters, above what any of the extractors costs on a single short text), so a
+# budgeted call doesn't run it without limit. EnsembleVotingExtractor.warm_up() measures
+# them all.
+UNMEASURED_PER_CHAR = 1e-4
+
+# Texts an extractor may be skipped for in a row before one is run to re-measure it
+PROBE_EVERY = 50
+
+class Deadline:
+    def __init__(self, seconds, start=None):
+        self.seconds = seconds
+        self.start = time.perf_counter() if start is None else start
+
+    def remaining(self):
+        return self.seconds - (time.perf_counter() - self.start)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+class ExtractorCosts:
+    # Exponentially weighted seconds per character for each extractor, plus per-extractor
+    # counts of budget overruns (a call that finished past the deadline) and skipped texts
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.per_char = {}
+        self.overruns = Counter()
+        self.skipped = Counter()
+        # Texts skipped since each extractor last ran
+        self.since_run = Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Costs pickled before probing
+        self.__dict__.setdefault('since_run', Counter())
+        self._lock = threading.Lock()
+
+    def estimate(self, name, chars):
+        return self.per_char.get(name, UNMEASURED_PER_CHAR) * max(chars, 1)
+
+    def measured(self, name):
+        return name in self.per_char
+
+    def record(self, name, seconds, chars):
+        cost = seconds / max(chars, 1)
+        with self._lock:
+            previous = self.per_char.get(name)
+            self.per_char[name] = cost if previous is None else previous + self.alpha * (cost - previous)
+            self.since_run[name] = 0
+
+    def count(self, name, overruns=0, skipped=0):
+        with self._lock:
+            self.overruns[name] += overruns
+            self.skipped[name] += skipped
+            self.since_run[name] += skipped
+
+    def probe_due(self, name):
+        with self._lock:
+            return self.since_run[name] >= PROBE_EVERY
+
+    def stats(self):
+        with self._lock:
+            return {
+                'overruns': dict(self.overruns),
+                'skipped': dict(self.skipped),
+                'ms_per_1k_chars': {name: cost * 1e6 for name, cost in self.per_char.items()},
+            }
+
+class RowBudgets:
+    # Seconds each text of a batch may still take, charged with the measured time of every
+    # extractor run on it
+    def __init__(self, seconds, n_texts):
+        self.remaining = [seconds] * n_texts
+
+    def admit(self, name, texts, rows, costs):
+        # Positions (in texts) of the texts name is expected to finish within what their
+        # rows have left; rows are the texts' positions in the batch
+        return [j for j, (text, row) in enumerate(zip(texts, rows))
+                if costs.estimate(name, text_chars(text)) <= self.remaining[row]]
+
+    def charge(self, texts, rows, seconds):
+        # The time a run over texts took, split between their rows by length
+        chars = [text_chars(text) for text in texts]
+        total = sum(chars)
+        for row, text_length in zip(rows, chars):
+            self.remaining[row] -= seconds * text_length / total
+
+def text_chars(text):
+    return len(text) if isinstance(text, str) else 1
+
+def run_within(name, run_batch, texts, deadline, costs, chunk_size=32, row_budgets=None, rows=None):
+    # run_batch over texts in chunks that are expected to fit in the deadline. Returns one
+    # result per text, None for the texts that were skipped. With no deadline it's a single
+    # run_batch call. With RowBudgets, only the texts whose own budget fits the extractor's
+    # estimate are run (rows: their positions in the batch, default 0..len(texts)-1).
+    if row_budgets is not None:
+        rows = range(len(texts)) if rows is None else rows
+        admitted = row_budgets.admit(name, texts, rows, costs)
+        results = [None] * len(texts)
+        if admitted:
+            began = time.perf_counter()
+            ran = run_within(name, run_batch, [texts[j] for j in admitted], deadline, costs, chunk_size)
+            elapsed = time.perf_counter() - began
+            for j, result in zip(admitted, ran):
+                results[j] = result
+            done = [j for j in admitted if results[j] is not None]
+            if done:
+                row_budgets.charge([texts[j] for j in done], [rows[j] for j in done], elapsed)
+        costs.count(name, skipped=len(texts) - len(admitted))
+        probed = probe(name, run_batch, texts, results, costs)
+        if probed is not None:
+            j, elapsed = probed
+            row_budgets.charge([texts[j]], [rows[j]], elapsed)
+        return results
+
+    if deadline is None:
+        began = time.perf_counter()
+        results = run_batch(texts)
+        costs.record(name, time.perf_counter() - began, sum(map(text_chars, texts)))
+        return results
+
+    results = [None] * len(texts)
+    i = 0
+    while i < len(texts) and not deadline.expired():
+        # As many texts as are expected to fit in the time left
+        remaining = deadline.remaining()
+        chunk, chars, j = [], 0, i
+        while j < len(texts) and len(chunk) < chunk_size:
+            if costs.estimate(name, chars + text_chars(texts[j])) > remaining:
+                break
+            chars += text_chars(texts[j])
+            chunk.append(texts[j])
+            j += 1
+        if not chunk:
+            # This text alone won't fit; shorter ones after it might
+            i += 1
+            continue
+
+        began = time.perf_counter()
+        results[i:j] = run_batch(chunk)
+        costs.record(name, time.perf_counter() - began, chars)
+        i = j
+        if deadline.expired():
+            costs.count(name, overruns=1)
+
+    costs.count(name, skipped=sum(1 for result in results if result is None))
+    probe(name, run_batch, texts, results, costs)
+    return results
+
+def probe(name, run_batch, texts, results, costs):
+    # Runs the shortest of the skipped texts when name is due to be re-measured. Returns
+    # its position and how long it took, or None.
+    skipped = [j for j, result in enumerate(results) if result is None]
+    if not skipped or not costs.probe_due(name):
+        return None
+    j = min(skipped, key=lambda j: text_chars(texts[j]))
+    # It runs after all
+    costs.count(name, skipped=-1)
+    began = time.perf_counter()
+    results[j] = run_batch([texts[j]])[0]
+    elapsed = time.perf_counter() - began
+    costs.record(name, elapsed, text_chars(texts[j]))
+    return j, elapsed
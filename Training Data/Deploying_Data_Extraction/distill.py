@@ -0,0 +1,442 @@
+# distill.py
+# Distills the voting ensemble into one compact student model:
+#   python distill.py label --model models/ensemble --input reports.csv --output teacher.jsonl
+#   python distill.py train --labels teacher.jsonl --output models/student
+# The ensemble labels an unlabelled corpus (its voted results are the targets) and the
+# student learns every field from them: a text classifier for the fields with a closed set
+# of values (was_injured, label, department, ...), a token tagger for the open fields whose
+# values are spans of the text (names, dates). Both are linear models over sparse
+# features, so a batch costs a couple of sparse matrix products instead of four models. A saved student loads with
+# extractors.load_bundle() wherever an ensemble bundle does.
+import argparse
+import json
+import os
+import pickle
+import random
+import re
+import time
+from collections import Counter
+
+import numpy as np
+
+from checkpoint import to_json
+from text_analysis import analyze_batch
+
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# Token features: (kind, window offsets). Id 0 is an unknown string, 1 the padding past
+# either end of the text.
+TOKEN_FEATURES = [("word", range(-4, 5)), ("suffix", range(-2, 3)), ("shape", range(-3, 4))]
+UNKNOWN, PADDING = 0, 1
+# Conjunctions of two neighbours' ids, hashed into PAIR_BUCKETS columns each: a linear
+# tagger can't combine "previous token is a number" with "this one is a month" on its own
+PAIR_FEATURES = [("word", -1, 0), ("word", 0, 1), ("shape", -1, 0), ("shape", 0, 1)]
+PAIR_BUCKETS = 2 ** 16
+
+# Tagger classes per span field
+OUTSIDE, BEGIN, INSIDE = 0, 1, 2
+
+def token_shape(token):
+    if token.isdigit():
+        return "d" * min(len(token), 4)
+    if not token[0].isalnum():
+        return token
+    shape = "X" if token[0].isupper() else "x"
+    if len(token) > 1:
+        shape += "X" if token.isupper() else "x"
+    return shape + ("+" if len(token) > 3 else "")
+
+def token_strings(token):
+    lower = token.lower()
+    return {"word": lower, "suffix": lower[-3:], "shape": token_shape(token)}
+
+def tokenize(texts):
+    # Every text's tokens, concatenated: (strings per feature kind, start/end offsets,
+    # index of each text's first token (plus the total))
+    strings = {kind: [] for kind, _ in TOKEN_FEATURES}
+    starts, ends, doc_starts = [], [], [0]
+    for text in texts:
+        for match in TOKEN.finditer(text):
+            for kind, value in token_strings(match.group()).items():
+                strings[kind].append(value)
+            starts.append(match.start())
+            ends.append(match.end())
+        doc_starts.append(len(starts))
+    return strings, np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64), np.array(doc_starts)
+
+def fit_linear(X, y, n_classes, epochs):
+    # A linear SVM over classes 0..n_classes-1 as float32 (coef, intercept) with a column
+    # per class, so several models stack into one matrix product. Classes missing from y
+    # can't win. Averaged SGD: the teacher's labels are noisy, and the last iterate
+    # follows whichever of them it saw last.
+    from sklearn.linear_model import SGDClassifier
+
+    coef = np.zeros((X.shape[1], n_classes), dtype=np.float32)
+    intercept = np.full(n_classes, -np.inf, dtype=np.float32)
+    classes = np.unique(y)
+    if len(classes) == 1:
+        intercept[classes[0]] = 0
+        return coef, intercept
+    classifier = SGDClassifier(loss="hinge", alpha=1e-5, max_iter=epochs, tol=None, average=True,
+                               random_state=42).fit(X, y)
+    if len(classes) == 2:
+        # Binary: one decision function, positive for classes[1]
+        coef[:, classes[1]] = classifier.coef_[0]
+        intercept[classes[1]] = classifier.intercept_[0]
+        intercept[classes[0]] = 0
+    else:
+        for row, label in enumerate(classes):
+            coef[:, label] = classifier.coef_[row]
+            intercept[label] = classifier.intercept_[row]
+    return coef, intercept
+
+class StudentExtractor:
+    # min_count: occurrences a token string (or n-gram) needs to get its own feature. A
+    # field with at most max_classes distinct values is classified; one with more is
+    # tagged as spans when its teacher value is found in the text for at least
+    # span_threshold of the rows that have one, and otherwise classified over its
+    # max_classes most common values.
+    def __init__(self, min_count=2, span_threshold=0.9, max_classes=200, epochs=5):
+        self.min_count = min_count
+        self.span_threshold = span_threshold
+        self.max_classes = max_classes
+        self.epochs = epochs
+        self.span_fields = []
+        self.class_fields = []
+        self.vocabularies = {}
+        self.block_offsets = {}
+        self.n_token_features = 0
+        self.tagger_coef = None
+        self.tagger_intercept = None
+        self.vectorizer = None
+        # Per class field, its values (index 0: no value) and columns of class_coef
+        self.class_values = {}
+        self.class_columns = {}
+        self.class_coef = None
+        self.class_intercept = None
+
+    # Features
+
+    def token_matrix(self, texts):
+        # One row per token: its own and its neighbours' feature ids, one-hot in
+        # (kind, offset) blocks, then the hashed pair blocks
+        from scipy.sparse import csr_matrix
+
+        strings, starts, ends, doc_starts = tokenize(texts)
+        n_tokens = len(starts)
+        doc_lengths = np.diff(doc_starts)
+        token_doc_start = np.repeat(doc_starts[:-1], doc_lengths)
+        token_doc_end = np.repeat(doc_starts[1:], doc_lengths)
+        positions = np.arange(n_tokens)
+
+        shifted_ids = {}
+        for kind, offsets in TOKEN_FEATURES:
+            vocabulary = self.vocabularies[kind]
+            ids = np.fromiter((vocabulary.get(value, UNKNOWN) for value in strings[kind]), dtype=np.int64,
+                              count=n_tokens)
+            for offset in offsets:
+                shifted = positions + offset
+                inside = (shifted >= token_doc_start) & (shifted < token_doc_end)
+                neighbour = ids[np.clip(shifted, 0, max(n_tokens - 1, 0))] if n_tokens else ids
+                shifted_ids[kind, offset] = np.where(inside, neighbour, PADDING)
+
+        columns = [self.block_offsets[key] + ids for key, ids in shifted_ids.items()]
+        for kind, first, second in PAIR_FEATURES:
+            pair = shifted_ids[kind, first] * (len(self.vocabularies[kind]) + 2) + shifted_ids[kind, second]
+            columns.append(self.block_offsets[kind, first, second] + pair % PAIR_BUCKETS)
+
+        n_columns = len(columns)
+        indices = np.stack(columns, axis=1).ravel() if n_tokens else np.zeros(0, dtype=np.int64)
+        matrix = csr_matrix((np.ones(len(indices), dtype=np.float32), indices,
+                             np.arange(0, n_tokens * n_columns + 1, n_columns)),
+                            shape=(n_tokens, self.n_token_features))
+        return matrix, starts, ends, doc_starts
+
+    def build_vocabularies(self, texts):
+        counts = {kind: Counter() for kind, _ in TOKEN_FEATURES}
+        for text in texts:
+            for match in TOKEN.finditer(text):
+                for kind, value in token_strings(match.group()).items():
+                    counts[kind][value] += 1
+        self.vocabularies = {}
+        for kind, _ in TOKEN_FEATURES:
+            frequent = sorted(value for value, count in counts[kind].items() if count >= self.min_count)
+            self.vocabularies[kind] = {value: i + 2 for i, value in enumerate(frequent)}
+        offset = 0
+        self.block_offsets = {}
+        for kind, offsets in TOKEN_FEATURES:
+            for window in offsets:
+                self.block_offsets[kind, window] = offset
+                offset += len(self.vocabularies[kind]) + 2
+        for pair in PAIR_FEATURES:
+            self.block_offsets[pair] = offset
+            offset += PAIR_BUCKETS
+        self.n_token_features = offset
+
+    def make_vectorizer(self):
+        from extractors import make_tfidf
+
+        return make_tfidf((1, 2), min_df=self.min_count, sublinear_tf=True, dtype=np.float32)
+
+    # Training
+
+    def split_fields(self, texts, results):
+        found, present = Counter(), Counter()
+        values = {}
+        for text, result in zip(texts, results):
+            for field, value in result.items():
+                present[field] += 1
+                found[field] += locate(text, value) is not None
+                values.setdefault(field, Counter())[value] += 1
+        self.span_fields = sorted(field for field in present if len(values[field]) > self.max_classes
+                                  and found[field] >= self.span_threshold * present[field])
+        self.class_fields = sorted(field for field in present if field not in self.span_fields)
+        # Values past the max_classes most common are learned as "no value"
+        self.class_values = {field: [""] + [value for value, _ in values[field].most_common(self.max_classes)]
+                             for field in self.class_fields}
+
+    def tags(self, texts, results, starts, ends, doc_starts):
+        # Per span field, the BIO class of every token for the teacher's value
+        tags = {field: np.full(len(starts), OUTSIDE, dtype=np.int64) for field in self.span_fields}
+        for i, (text, result) in enumerate(zip(texts, results)):
+            first, last = doc_starts[i], doc_starts[i + 1]
+            for field in self.span_fields:
+                span = locate(text, result.get(field))
+                if span is None:
+                    continue
+                inside = np.nonzero((starts[first:last] < span[1]) & (ends[first:last] > span[0]))[0] + first
+                if len(inside):
+                    tags[field][inside] = INSIDE
+                    tags[field][inside[0]] = BEGIN
+        return tags
+
+    def fit(self, texts, results):
+        # results: the ensemble's voted {field: value} for each text
+        texts = [text if isinstance(text, str) else "" for text in texts]
+        results = [{field: str(value) for field, value in result.items() if field != 'degraded' and value}
+                   for result in results]
+        self.split_fields(texts, results)
+        print(f"Span fields: {', '.join(self.span_fields)}")
+        print(f"Classification fields: {', '.join(self.class_fields)}")
+
+        self.build_vocabularies(texts)
+        X, starts, ends, doc_starts = self.token_matrix(texts)
+        print(f"Tagger: {X.shape[0]} tokens, {X.shape[1]} features")
+        weights = [fit_linear(X, y, 3, self.epochs) for y in self.tags(texts, results, starts, ends, doc_starts).values()]
+        if weights:
+            self.tagger_coef = np.hstack([coef for coef, _ in weights])
+            self.tagger_intercept = np.concatenate([intercept for _, intercept in weights])
+
+        self.vectorizer = self.make_vectorizer()
+        X = self.vectorizer.fit_transform(analyze_batch(texts))
+        print(f"Classifiers: {X.shape[1]} features")
+        weights, column = [], 0
+        for field in self.class_fields:
+            index = {value: i for i, value in enumerate(self.class_values[field])}
+            y = np.array([index.get(result.get(field, ""), 0) for result in results])
+            weights.append(fit_linear(X, y, len(index), self.epochs))
+            self.class_columns[field] = (column, column + len(index))
+            column += len(index)
+        if weights:
+            self.class_coef = np.hstack([coef for coef, _ in weights])
+            self.class_intercept = np.concatenate([intercept for _, intercept in weights])
+        return self
+
+    # Extraction (drop-in for an ensemble extractor)
+
+    def output_fields(self):
+        return set(self.span_fields) | set(self.class_fields)
+
+    def extract(self, text):
+        return self.extract_batch([text])[0]
+
+    def extract_batch(self, texts, fields=None):
+        texts = [text if isinstance(text, str) else "" for text in texts]
+        results = [{} for _ in texts]
+        span_fields = [(j, field) for j, field in enumerate(self.span_fields) if fields is None or field in fields]
+        if span_fields and self.tagger_coef is not None:
+            X, starts, ends, doc_starts = self.token_matrix(texts)
+            columns = np.concatenate([np.arange(3 * j, 3 * j + 3) for j, _ in span_fields])
+            scores = X @ self.tagger_coef[:, columns] + self.tagger_intercept[columns]
+            for k, (_, field) in enumerate(span_fields):
+                tags = scores[:, 3 * k:3 * k + 3].argmax(axis=1)
+                tagged = np.nonzero(tags != OUTSIDE)[0]
+                # First tagged token of each text, then as far as its I- tags go
+                for i, first in zip(*first_per_doc(tagged, doc_starts)):
+                    last = first
+                    while last + 1 < doc_starts[i + 1] and tags[last + 1] == INSIDE:
+                        last += 1
+                    results[i][field] = texts[i][starts[first]:ends[last]]
+
+        class_fields = [field for field in self.class_fields if fields is None or field in fields]
+        if class_fields:
+            X = self.vectorizer.transform(analyze_batch(texts))
+            columns = np.concatenate([np.arange(*self.class_columns[field]) for field in class_fields])
+            scores = X @ self.class_coef[:, columns] + self.class_intercept[columns]
+            column = 0
+            for field in class_fields:
+                values = self.class_values[field]
+                for extracted, best in zip(results, scores[:, column:column + len(values)].argmax(axis=1).tolist()):
+                    if best:
+                        extracted[field] = values[best]
+                column += len(values)
+        return results
+
+    # Ensemble-compatible interface, so extract.py, serve.py and the app can use a student
+    # in place of an ensemble
+
+    def extract_batch_with_voting(self, texts, budget=None, row_budget=None, deadline=None, fields=None):
+        # One model, so there is nothing to vote on or skip for a budget
+        return [(extracted, {'student': extracted}) for extracted in self.extract_batch(texts, fields)]
+
+    def extract_with_voting(self, text, budget=None, fields=None):
+        return self.extract_batch_with_voting([text], fields=fields)[0]
+
+    def field_sources(self, fields=None):
+        return {'student': None if fields is None else self.output_fields() & set(fields)}
+
+    def available_fields(self):
+        return sorted(self.output_fields())
+
+    def warm_up(self):
+        import scipy.sparse
+        import sklearn.linear_model
+
+    def deadline_stats(self):
+        return {}
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "student.pkl"), "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "student.pkl"), "rb") as f:
+            return pickle.load(f)
+
+def locate(text, value):
+    # (start, end) of the first occurrence of value in text, ignoring case if need be
+    if not value:
+        return None
+    start = text.find(value)
+    if start < 0:
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            return None
+        start = lowered.find(value.lower())
+        if start < 0:
+            return None
+    return start, start + len(value)
+
+def first_per_doc(tokens, doc_starts):
+    # For sorted token indexes: (text index, first token) of each text that has any
+    if not len(tokens):
+        return [], []
+    docs = np.searchsorted(doc_starts, tokens, side="right") - 1
+    keep = np.concatenate([[True], docs[1:] != docs[:-1]])
+    return docs[keep].tolist(), tokens[keep].tolist()
+
+def read_teacher_labels(path, limit=None):
+    texts, results = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            texts.append(row["text"])
+            results.append(row["result"])
+            if limit is not None and len(texts) >= limit:
+                break
+    return texts, results
+
+def label(args):
+    from corpus import part_files, read_chunks
+    from extractors import EnsembleVotingExtractor
+
+    ensemble = EnsembleVotingExtractor.load(args.model)
+    ensemble.warm_up()
+    labelled = 0
+    start = time.perf_counter()
+    with open(args.output, "w", encoding="utf-8") as f:
+        for path in args.input:
+            for part in part_files(path):
+                for chunk in read_chunks(part, args.chunksize, columns=[args.text_column]):
+                    texts = chunk[args.text_column].fillna("").astype(str).tolist()
+                    if args.limit is not None:
+                        texts = texts[:args.limit - labelled]
+                    for i in range(0, len(texts), args.batch_size):
+                        batch = texts[i:i + args.batch_size]
+                        for text, (result, _) in zip(batch, ensemble.extract_batch_with_voting(batch)):
+                            result.pop('degraded', None)
+                            f.write(json.dumps({"text": text, "result": result}, default=to_json) + "\n")
+                    labelled += len(texts)
+                    print(f"Labelled {labelled} reports ({labelled / (time.perf_counter() - start):.1f} rows/s)")
+                    if args.limit is not None and labelled >= args.limit:
+                        return
+
+def train(args):
+    # Imported by module name so the pickled student loads outside this script too
+    from distill import StudentExtractor
+    from evaluation import agreement
+
+    texts, results = read_teacher_labels(args.labels, args.limit)
+    # Held-out rows drawn at random: corpora are often ordered (by source, by time)
+    order = list(range(len(texts)))
+    random.Random(args.seed).shuffle(order)
+    n_held_out = int(len(texts) * args.holdout)
+    train_rows, held_out_rows = sorted(order[n_held_out:]), sorted(order[:n_held_out])
+    start = time.perf_counter()
+    student = StudentExtractor(min_count=args.min_count, span_threshold=args.span_threshold,
+                               max_classes=args.max_classes, epochs=args.epochs)
+    student.fit([texts[i] for i in train_rows], [results[i] for i in train_rows])
+    print(f"Trained on {len(train_rows)} reports in {time.perf_counter() - start:.1f}s")
+    student.save(args.output)
+
+    held_out, expected = [texts[i] for i in held_out_rows], [results[i] for i in held_out_rows]
+    if not held_out:
+        return
+    student.extract_batch(held_out[:args.batch_size])  # warm up
+    predictions = []
+    start = time.perf_counter()
+    for i in range(0, len(held_out), args.batch_size):
+        predictions.extend(student.extract_batch(held_out[i:i + args.batch_size]))
+    rows_per_sec = len(held_out) / (time.perf_counter() - start)
+
+    scores = agreement(predictions, expected)
+    print(f"Agreement with the ensemble on {len(held_out)} held-out reports:")
+    print(f"{'field':<24}{'agreement':>10}{'rows':>8}")
+    for field, score in sorted(scores.items(), key=lambda item: (item[0] == "micro", item[0])):
+        print(f"{field:<24}{score['agreement']:>10.3f}{score['rows']:>8}")
+    print(f"Student: {rows_per_sec:.1f} rows/s (batch size {args.batch_size})")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distill the extraction ensemble into a single student model")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    label_parser = subparsers.add_parser("label", help="Label a corpus with the ensemble's voted results")
+    label_parser.add_argument("--model", required=True, help="Model bundle directory saved by train.py")
+    label_parser.add_argument("--input", nargs="+", required=True, help="CSV/JSONL/Parquet files or shard directories")
+    label_parser.add_argument("--text-column", default="text")
+    label_parser.add_argument("--output", required=True, help="Teacher labels (JSONL)")
+    label_parser.add_argument("--limit", type=int, help="Most reports to label")
+    label_parser.add_argument("--batch-size", type=int, default=64)
+    label_parser.add_argument("--chunksize", type=int, default=10000)
+    label_parser.set_defaults(func=label)
+
+    train_parser = subparsers.add_parser("train", help="Train a student on teacher labels and report its agreement")
+    train_parser.add_argument("--labels", required=True, help="Teacher labels written by 'label'")
+    train_parser.add_argument("--output", required=True, help="Student bundle directory")
+    train_parser.add_argument("--limit", type=int)
+    train_parser.add_argument("--holdout", type=float, default=0.1, help="Share of the labels held out for agreement")
+    train_parser.add_argument("--seed", type=int, default=42)
+    train_parser.add_argument("--min-count", type=int, default=2)
+    train_parser.add_argument("--span-threshold", type=float, default=0.9)
+    train_parser.add_argument("--max-classes", type=int, default=200)
+    train_parser.add_argument("--epochs", type=int, default=5)
+    train_parser.add_argument("--batch-size", type=int, default=256)
+    train_parser.set_defaults(func=train)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
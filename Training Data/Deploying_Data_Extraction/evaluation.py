@@ -0,0 +1,78 @@
+# evaluation.py
+# Field-level accuracy of extractor output ({field: value} per text) against the
+# generator's entity offsets or the structured labels.
+from dates import DateNormalizer
+
+# The extractors write numeric dates day first (dd/mm/yyyy); spelled-out dates are unambiguous
+_gold_dates = DateNormalizer(output_format="%Y-%m-%d", dayfirst=True)
+
+def gold_fields(text, spans):
+    # First occurrence of each field, matching how the extractors report entities
+    gold = {}
+    for start, end, field in sorted(spans):
+        gold.setdefault(field.lower(), text[start:end])
+    return gold
+
+def gold_labels(label):
+    # A structured labels row as gold values, skipping missing ones
+    return {field: str(value) for field, value in label.items()
+            if value is not None and value == value and str(value) not in ("", "N/A")}
+
+def normalize(value, field=None):
+    value = " ".join(str(value).split())
+    if field == "incident_date":
+        value = _gold_dates.normalize(value) or value
+    return value.lower()
+
+def field_scores(predictions, gold, fields=None):
+    # Per field (and "micro" over all of them): a prediction counts as correct when it equals
+    # the gold value up to case and whitespace; wrong values count against both precision
+    # and recall
+    counts = {}
+    for predicted, expected in zip(predictions, gold):
+        for field in set(predicted) | set(expected):
+            if fields is not None and field not in fields:
+                continue
+            tp, fp, fn = counts.get(field, (0, 0, 0))
+            has_pred = bool(predicted.get(field))
+            has_gold = bool(expected.get(field))
+            if has_pred and has_gold and normalize(predicted[field], field) == normalize(expected[field], field):
+                tp += 1
+            else:
+                fp += has_pred
+                fn += has_gold
+            counts[field] = (tp, fp, fn)
+
+    counts["micro"] = tuple(sum(c[i] for c in counts.values()) for i in range(3))
+    scores = {}
+    for field, (tp, fp, fn) in counts.items():
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        scores[field] = {
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "support": tp + fn,
+        }
+    return scores
+
+def agreement(predictions, reference, fields=None):
+    # Per field (and "micro" over all of them): the share of rows where the predictions give
+    # the same value as the reference (e.g. a distilled student vs the ensemble), up to case
+    # and whitespace, out of the rows where either has one
+    counts = {}
+    for predicted, expected in zip(predictions, reference):
+        for field in set(predicted) | set(expected):
+            if fields is not None and field not in fields:
+                continue
+            has_pred = bool(predicted.get(field))
+            has_ref = bool(expected.get(field))
+            if not (has_pred or has_ref):
+                continue
+            same = has_pred and has_ref and normalize(predicted[field], field) == normalize(expected[field], field)
+            agreed, rows = counts.get(field, (0, 0))
+            counts[field] = (agreed + same, rows + 1)
+
+    counts["micro"] = tuple(sum(c[i] for c in counts.values()) for i in range(2))
+    return {field: {"agreement": agreed / rows if rows else 0.0, "rows": rows}
+            for field, (agreed, rows) in counts.items()}
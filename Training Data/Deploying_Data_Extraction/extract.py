@@ -0,0 +1,180 @@
+# extract.py
+# Headless batch extraction with a saved model bundle (see train.py), e.g. for nightly runs:
+#   python extract.py --model models/ensemble --input reports.csv more.jsonl --output results.parquet
+import argparse
+import collections
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+
+from checkpoint import to_json
+from corpus import read_chunks
+from extractors import NER_FIELDS
+from jobs import COMPLETED, FAILED, extract_rows
+
+# Columns of the csv and parquet outputs; jsonl rows keep every field that was extracted
+RESULT_FIELDS = NER_FIELDS + ['label', 'was_injured', 'department_mention']
+OUTPUT_COLUMNS = ['source', 'original_index', 'text_preview'] + RESULT_FIELDS + ['error']
+
+# Set in each worker process by init_worker
+_ensemble = None
+
+def init_worker(model_path):
+    global _ensemble
+    from extractors import load_bundle
+
+    _ensemble = load_bundle(model_path)
+    _ensemble.warm_up()
+
+def extract_batch(task):
+    source, batch_df, text_column, include_breakdown, fields = task
+    rows = extract_rows(_ensemble, batch_df, include_breakdown, text_column, fields)
+    for row in rows:
+        row['source'] = source
+    return rows
+
+def iter_tasks(paths, text_column, batch_size, chunksize, include_breakdown, fields=None):
+    for path in paths:
+        offset = 0
+        for chunk in read_chunks(path, chunksize, columns=[text_column]):
+            chunk.index = range(offset, offset + len(chunk))
+            chunk[text_column] = chunk[text_column].fillna("").astype(str)
+            offset += len(chunk)
+            for start in range(0, len(chunk), batch_size):
+                yield os.path.basename(path), chunk.iloc[start:start + batch_size], text_column, include_breakdown, fields
+
+def run_batches(tasks, model_path, workers):
+    # Yields each batch's result rows in input order. At most 2 batches per worker are in
+    # flight, so memory stays flat however large the inputs are.
+    if workers <= 1:
+        init_worker(model_path)
+        yield from map(extract_batch, tasks)
+        return
+
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(model_path,)) as pool:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(extract_batch, (task,)))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+class CsvOutput:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=columns, extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class JsonlOutput:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(row, default=to_json) + "\n")
+
+    def close(self):
+        self.file.close()
+
+class ParquetOutput:
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.columns = columns
+        self.schema = pa.schema([(column, pa.int64() if column == 'original_index' else pa.string())
+                                 for column in columns])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        import pyarrow as pa
+
+        data = {column: [row.get(column) for row in rows] for column in self.columns}
+        for column in self.columns:
+            if column != 'original_index':
+                data[column] = [None if value is None else str(value) for value in data[column]]
+        self.writer.write_table(pa.table(data, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+OUTPUT_FORMATS = {"csv": CsvOutput, "jsonl": JsonlOutput, "parquet": ParquetOutput}
+
+def output_format(path):
+    for name in OUTPUT_FORMATS:
+        if path.endswith("." + name):
+            return name
+    return "csv"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the extraction ensemble over CSV/JSONL/Parquet files")
+    parser.add_argument("--model", required=True, help="Model bundle directory saved by train.py or distill.py")
+    parser.add_argument("--input", nargs="+", required=True, help="Input files, processed in order")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), help="Default: from the output extension")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Extraction processes")
+    parser.add_argument("--batch-size", type=int, default=256, help="Texts per extraction batch")
+    parser.add_argument("--chunksize", type=int, default=10000, help="Rows read from the input at a time")
+    parser.add_argument("--include-breakdown", action="store_true", help="Add each model's predictions")
+    parser.add_argument("--fields", nargs="+", help="Only extract these fields (skips the models no field needs)")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument("--store", metavar="DB", help="Also insert the results into this results database "
+                                                      "(see results_store.py)")
+    args = parser.parse_args(argv)
+
+    columns = OUTPUT_COLUMNS + (['model_breakdown'] if args.include_breakdown else [])
+    if args.fields:
+        columns = [column for column in columns if column not in RESULT_FIELDS or column in args.fields]
+    output = OUTPUT_FORMATS[args.format or output_format(args.output)](args.output, columns)
+    tasks = iter_tasks(args.input, args.text_column, args.batch_size, args.chunksize, args.include_breakdown,
+                       args.fields)
+
+    store = run_id = None
+    if args.store:
+        from results_store import ResultsStore, bundle_version
+
+        store = ResultsStore(args.store)
+        run_id = uuid.uuid4().hex[:12]
+        store.start_run(run_id, bundle_version(args.model), ", ".join(map(os.path.basename, args.input)), args.fields)
+
+    start = last_report = time.time()
+    processed = errors = 0
+    status = FAILED
+    try:
+        for rows in run_batches(tasks, args.model, args.workers):
+            output.write(rows)
+            if store is not None:
+                store.add(run_id, rows)
+            processed += len(rows)
+            errors += sum(1 for row in rows if 'error' in row)
+            now = time.time()
+            if now - last_report >= args.progress_every:
+                print(f"{processed:,} rows, {processed / (now - start):.1f} rows/s", file=sys.stderr)
+                last_report = now
+        status = COMPLETED
+    finally:
+        output.close()
+        if store is not None:
+            store.finish_run(run_id, status)
+
+    elapsed = time.time() - start
+    print(f"Extracted {processed:,} rows ({errors} errors) in {elapsed:.1f}s, "
+          f"{processed / elapsed if elapsed else 0:.1f} rows/s with {args.workers} workers -> {args.output}",
+          file=sys.stderr)
+    if store is not None:
+        print(f"Stored as run {run_id} in {args.store}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
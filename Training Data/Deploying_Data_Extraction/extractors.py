@@ -1,20 +1,243 @@
 # extractors.py
-import spacy
+# spaCy, sklearn and dateutil are imported where they're first used so that importing this
+# module (and starting the app) stays cheap; warm_up() pays those costs ahead of time.
+import hashlib
+import json
+import multiprocessing
+import os
 import pandas as pd
+import pickle
 import random
 import re
+import threading
 import numpy as np
-from spacy.training.example import Example
-from dateutil import parser as date_parser
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.pipeline import Pipeline
+
+from dates import default_normalizer
+from deadlines import Deadline, ExtractorCosts, RowBudgets, run_within
+from text_analysis import SENTENCE_BOUNDARY, NgramAnalyzer, analyze, analyze_batch, plain_text
+
+# Fields spaCy learns as entity labels (upper-cased)
+NER_FIELDS = ['reporter_name', 'person_involved', 'incident_date', 'incident_time',
+              'department', 'incident_description', 'location', 'injury_description']
+
+# A typical report, for measuring extractor costs before the first real request
+CALIBRATION_TEXT = ("Incident Date: 21 October 2024 Incident Time: 18:43 Reporter Name: Logan Hughes "
+                    "Person Involved: Jordan Walker Department: Logistics Location: Warehouse A "
+                    "Incident Description: A grinder malfunction caused a steel beam to drop, injuring a "
+                    "contractor. Was Injured: Yes Injury Description: Back strain from improper lifting")
+
+# Components of the stock pipelines that NER output never depends on
+NON_NER_PIPES = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter", "morphologizer"]
+
+# spaCy models loaded by warm_up(), waiting to be claimed by the next SpacyNERExtractor
+_preload_lock = threading.Lock()
+_preloaded_models = {}
+
+# Location phrases for HybridExtractor's regex pass, in order of preference
+LOCATION_PATTERNS = [
+    r'(?:at|in|near)\s+([A-Z][a-z]*(?:\s+[A-Z]*[a-z]*)*\s*\d*)',
+    r'(Warehouse\s+[A-Z])',
+    r'(Dry Dock\s+\d+)',
+    r'(Building\s+\d+)'
+]
+
+def text_column(texts):
+    # A batch as a pandas Series for the .str methods. Non-strings are rejected like the
+    # per-text code rejects them, so the caller's per-text fallback still applies.
+    for text in texts:
+        if not isinstance(text, str):
+            raise TypeError(f"expected str, got {type(text).__name__}")
+    return pd.Series(list(texts), dtype=object)
+
+def first_matches(column, patterns, flags=0):
+    # Per row, group 1 of the first pattern that matches (re.search order), NaN if none does
+    found = pd.Series(np.nan, index=column.index, dtype=object)
+    for pattern in patterns:
+        pending = found.isna()
+        if not pending.any():
+            break
+        found[pending] = column[pending].str.extract(pattern, flags=flags, expand=False)
+    return found
+
+def ner_pipes(nlp):
+    # NER plus any shared embedding layer (tok2vec/transformer) it listens to
+    required = ["ner"]
+    for name, pipe in nlp.components:
+        if "ner" in getattr(pipe, "listening_components", []):
+            required.append(name)
+    return required
+
+def load_spacy_model(model="en_core_web_sm", exclude_unused=False):
+    import spacy
+
+    if not exclude_unused:
+        return spacy.load(model)
+
+    nlp = spacy.load(model, exclude=NON_NER_PIPES)
+    required = ner_pipes(nlp)
+    for name in list(nlp.pipe_names):
+        if name not in required:
+            nlp.remove_pipe(name)
+    return nlp
+
+def make_tfidf(ngram_range=(1, 1), **tfidf_params):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    # Same terms as the default word analyzer, reusing each row's TextAnalysis tokens
+    return TfidfVectorizer(analyzer=NgramAnalyzer(ngram_range), **tfidf_params)
+
+def make_text_pipeline(classifier, **tfidf_params):
+    from sklearn.pipeline import Pipeline
+
+    return Pipeline([
+        ('tfidf', make_tfidf(**tfidf_params)),
+        ('classifier', classifier)
+    ])
+
+def fit_forest(X, y, params):
+    from sklearn.ensemble import RandomForestClassifier
+
+    return RandomForestClassifier(**params).fit(X, y)
+
+def fit_forest_task(task):
+    # Worker body for fit_forests: the features are attached from the shared cache rather
+    # than sent with the task
+    from feature_cache import attach
+
+    directory, name, field, y, params = task
+    try:
+        return field, fit_forest(attach(directory, name), y, params), None
+    except Exception as e:
+        return field, None, e
+
+def fit_forests(X, targets, params, n_jobs=1):
+    # One RandomForestClassifier per field ({field: labels}) on the same features, as
+    # (field, classifier or None, error or None) in targets order. With n_jobs > 1 the fields
+    # are fitted in worker processes that memory-map X from a feature_cache.FeatureCache
+    # instead of each being sent a pickled copy.
+    if n_jobs <= 1 or len(targets) < 2:
+        results = []
+        for field, y in targets.items():
+            try:
+                results.append((field, fit_forest(X, y, params), None))
+            except Exception as e:
+                results.append((field, None, e))
+        return results
+
+    from feature_cache import FeatureCache
+
+    with FeatureCache() as cache:
+        # Stored as the forests take it (float32, CSC if sparse) so workers don't convert it
+        cache.put('X', X.tocsc() if hasattr(X, 'tocsc') else X, dtype=np.float32)
+        tasks = [(cache.directory, 'X', field, y, params) for field, y in targets.items()]
+        with multiprocessing.Pool(min(n_jobs, len(tasks))) as pool:
+            return pool.map(fit_forest_task, tasks)
+
+# Hashed feature space of the incremental classifiers. Being stateless it never needs refitting,
+# so new rows can be folded in without revisiting old ones.
+INCREMENTAL_N_FEATURES = 2 ** 18
+
+class IncrementalTextClassifier:
+    # Hashing featurizer + partial_fit estimator ("nb" for MultinomialNB, "sgd" for a
+    # logistic SGDClassifier); exposes fit/predict/predict_proba like the TF-IDF Pipelines
+    def __init__(self, estimator="nb", n_features=INCREMENTAL_N_FEATURES, ngram_range=(1, 2)):
+        self.estimator = estimator
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.reset()
+
+    def reset(self):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.vectorizer = HashingVectorizer(n_features=self.n_features, analyzer=NgramAnalyzer(self.ngram_range),
+                                            alternate_sign=False)
+        self.classifier = None
+        self.classes_ = None
+        # Labels seen after the class set was fixed; only a full rebuild can learn them
+        self.unseen_classes = set()
+
+    def make_classifier(self):
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.naive_bayes import MultinomialNB
+
+        if self.estimator == "nb":
+            return MultinomialNB()
+        return SGDClassifier(loss="log_loss", random_state=42)
+
+    def partial_fit(self, texts, y, classes=None):
+        y = np.asarray(y, dtype=object)
+        if self.classifier is None:
+            self.classes_ = np.array(sorted(set(y) | set(classes or [])), dtype=object)
+            self.classifier = self.make_classifier()
+            self.classifier.partial_fit(self.vectorizer.transform(texts), y, classes=self.classes_)
+            return self
+
+        known = np.isin(y, self.classes_)
+        if not known.all():
+            self.unseen_classes.update(y[~known])
+            texts = [text for text, keep in zip(texts, known) if keep]
+            y = y[known]
+        if len(y):
+            self.classifier.partial_fit(self.vectorizer.transform(texts), y)
+        return self
+
+    def fit(self, texts, y, classes=None, batch_size=10000):
+        self.reset()
+        classes = sorted(set(y) | set(classes or []))
+        for start in range(0, len(texts), batch_size):
+            self.partial_fit(texts[start:start + batch_size], y[start:start + batch_size], classes=classes)
+        return self
+
+    def predict(self, texts):
+        return self.classifier.predict(self.vectorizer.transform(texts))
+
+    def predict_proba(self, texts):
+        return self.classifier.predict_proba(self.vectorizer.transform(texts))
+
+def warm_up(spacy_model="en_core_web_sm", exclude_unused=False):
+    # Import the heavy libraries and preload a spaCy model, e.g. from a background thread.
+    # Pass spacy_model=None to only import.
+    import sklearn.ensemble
+    import sklearn.feature_extraction.text
+    import sklearn.linear_model
+    import sklearn.naive_bayes
+    import sklearn.pipeline
+    import spacy.training
+
+    if spacy_model is None:
+        return
+    key = (spacy_model, exclude_unused)
+    with _preload_lock:
+        if key not in _preloaded_models:
+            _preloaded_models[key] = load_spacy_model(spacy_model, exclude_unused)
 
 class SpacyNERExtractor:
-    def __init__(self):
-        self.nlp = spacy.load("en_core_web_sm")
-        self.ner = self.nlp.get_pipe("ner")
+    def __init__(self, model="en_core_web_sm", inference_only=False, exclude_unused=False):
+        # exclude_unused drops the non-NER components at load time (they can't be re-enabled),
+        # inference_only keeps them loaded but disabled. The model loads on first use.
+        self.model = model
+        self.inference_only = inference_only
+        self.exclude_unused = exclude_unused
+        self._nlp = None
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            with _preload_lock:
+                nlp = _preloaded_models.pop((self.model, self.exclude_unused), None)
+            if nlp is None:
+                nlp = load_spacy_model(self.model, self.exclude_unused)
+            if self.inference_only and not self.exclude_unused:
+                nlp.select_pipes(enable=ner_pipes(nlp))
+            self._nlp = nlp
+        return self._nlp
+
+    @property
+    def ner(self):
+        return self.nlp.get_pipe("ner")
+
+    def ner_pipes(self):
+        return ner_pipes(self.nlp)
     
     def filter_overlapping_entities(self, entities):
         entities = sorted(entities, key=lambda x: x[0])
@@ -26,13 +249,17 @@ class SpacyNERExtractor:
                 last_end = end
         return non_overlapping
     
-    def prepare_training_data(self, texts, labels):
+    def prepare_training_data(self, texts, labels, annotations=None):
+        # annotations, when given, holds exact [start, end, field] offsets per text
+        # (the generator's sidecar files) and replaces searching for the label values
+        if annotations is not None:
+            return self.prepare_annotated_data(texts, annotations)
+
         data = []
         for i, (text, label_dict) in enumerate(zip(texts, labels)):
             entities = []
 
-            for col in ['reporter_name', 'person_involved', 'incident_date', 'incident_time',
-                       'department', 'incident_description', 'location', 'injury_description']:
+            for col in NER_FIELDS:
 
                 if col in label_dict:
                     value = str(label_dict[col]).strip()
@@ -47,35 +274,132 @@ class SpacyNERExtractor:
                 data.append((text, {"entities": entities}))
 
         return data
+
+    def prepare_annotated_data(self, texts, annotations):
+        data = []
+        for text, spans in zip(texts, annotations):
+            entities = [(start, end, field.upper()) for start, end, field in spans if field in NER_FIELDS]
+            entities = self.filter_overlapping_entities(entities)
+            if entities:
+                data.append((text, {"entities": entities}))
+
+        return data
     
-    def train(self, train_texts, train_labels):
+    def corpus_cache_path(self, texts, labels, cache_dir, annotations=None):
+        # Keyed by the model (its tokenizer) and by the texts and NER field values or offsets
+        digest = hashlib.sha256(self.model.encode())
+        for i, text in enumerate(texts):
+            if annotations is not None:
+                values = [list(span) for span in annotations[i]]
+            else:
+                values = {col: str(labels[i][col]) for col in NER_FIELDS if col in labels[i]}
+            digest.update(text.encode())
+            digest.update(json.dumps(values, sort_keys=True).encode())
+        return os.path.join(cache_dir, f"ner_corpus_{digest.hexdigest()[:16]}.spacy")
+
+    def build_training_corpus(self, texts, labels, annotations=None):
+        from spacy.tokens import DocBin
+
+        doc_bin = DocBin(attrs=["ENT_IOB", "ENT_TYPE"])
+        for text, ents in self.prepare_training_data(texts, labels, annotations):
+            doc = self.nlp.make_doc(text)
+            entities, missing = [], []
+            for start, end, label in ents["entities"]:
+                span = doc.char_span(start, end, label=label)
+                if span is not None:
+                    entities.append(span)
+                else:
+                    # Not on token boundaries: leave those tokens unannotated rather than "O"
+                    missing.append(doc.char_span(start, end, alignment_mode="expand"))
+            doc.set_ents(entities, missing=[span for span in missing if span is not None])
+            doc_bin.add(doc)
+        return doc_bin
+
+    def load_training_corpus(self, texts, labels, cache_dir=None, annotations=None):
+        from spacy.tokens import DocBin
+
+        if cache_dir is None:
+            return self.build_training_corpus(texts, labels, annotations)
+
+        path = self.corpus_cache_path(texts, labels, cache_dir, annotations)
+        if os.path.exists(path):
+            print(f"Loading cached spaCy training corpus from {path}")
+            return DocBin().from_disk(path)
+
+        doc_bin = self.build_training_corpus(texts, labels, annotations)
+        os.makedirs(cache_dir, exist_ok=True)
+        doc_bin.to_disk(path)
+        print(f"Cached spaCy training corpus at {path}")
+        return doc_bin
+
+    def train(self, train_texts, train_labels, n_iter=30, drop=0.5, cache_dir=None, annotations=None):
+        # With cache_dir set the prepared corpus is built once and reused by later runs
+        # over the same data, whatever the hyperparameters. train_labels may be None
+        # when annotations are given.
         print("Preparing spaCy training data...")
-        training_data = self.prepare_training_data(train_texts, train_labels)
-        print(f"Prepared {len(training_data)} training samples for spaCy")
+        doc_bin = self.load_training_corpus(train_texts, train_labels, cache_dir, annotations)
+        print(f"Prepared {len(doc_bin)} training samples for spaCy")
+
+        training_data = self.examples_from_corpus(doc_bin)
 
         # Add custom labels
-        for _, annotations in training_data:
-            for ent in annotations.get("entities"):
-                self.ner.add_label(ent[2])
+        for example in training_data:
+            for ent in example.reference.ents:
+                self.ner.add_label(ent.label_)
 
         # Train model
-        other_pipes = [pipe for pipe in self.nlp.pipe_names if pipe != "ner"]
+        other_pipes = [pipe for pipe in self.nlp.pipe_names if pipe not in self.ner_pipes()]
         with self.nlp.disable_pipes(*other_pipes):
             optimizer = self.nlp.resume_training()
-            for itn in range(30):
+            for itn in range(n_iter):
                 random.shuffle(training_data)
                 losses = {}
-                for text, annotations in training_data:
-                    try:
-                        example = Example.from_dict(self.nlp.make_doc(text), annotations)
-                        self.nlp.update([example], drop=0.5, losses=losses)
-                    except:
-                        continue
+                self.update_examples(training_data, drop, losses)
+                if itn % 10 == 0:
+                    print(f"Iteration {itn+1}, Losses: {losses}")
+
+    def train_streaming(self, corpus, n_iter=30, drop=0.5, cache_dir=None):
+        # Out-of-core: corpus is re-iterated every epoch, yielding (texts, labels, annotations)
+        # chunks, so only one chunk's examples are in memory at a time. With cache_dir set,
+        # each chunk is tokenized once and later epochs read its DocBin.
+        for field in NER_FIELDS:
+            self.ner.add_label(field.upper())
+
+        other_pipes = [pipe for pipe in self.nlp.pipe_names if pipe not in self.ner_pipes()]
+        with self.nlp.disable_pipes(*other_pipes):
+            optimizer = self.nlp.resume_training()
+            for itn in range(n_iter):
+                losses = {}
+                for texts, labels, annotations in corpus:
+                    doc_bin = self.load_training_corpus(texts, labels, cache_dir, annotations)
+                    training_data = self.examples_from_corpus(doc_bin)
+                    random.shuffle(training_data)
+                    self.update_examples(training_data, drop, losses)
                 if itn % 10 == 0:
                     print(f"Iteration {itn+1}, Losses: {losses}")
+
+    def examples_from_corpus(self, doc_bin):
+        from spacy.tokens import Doc
+        from spacy.training.example import Example
+
+        # The reference docs are already tokenized, so the predicted side is rebuilt
+        # from their words instead of running the tokenizer again
+        examples = []
+        for reference in doc_bin.get_docs(self.nlp.vocab):
+            predicted = Doc(self.nlp.vocab, words=[t.text for t in reference],
+                            spaces=[bool(t.whitespace_) for t in reference])
+            examples.append(Example(predicted, reference))
+        return examples
+
+    def update_examples(self, examples, drop, losses):
+        for example in examples:
+            try:
+                self.nlp.update([example], drop=drop, losses=losses)
+            except:
+                continue
     
     def extract(self, text):
-        doc = self.nlp(text)
+        doc = self.nlp(plain_text(text))
         extracted = {}
 
         for ent in doc.ents:
@@ -85,8 +409,28 @@ class SpacyNERExtractor:
 
         return extracted
 
+    def extract_batch(self, texts, batch_size=64, fields=None):
+        # nlp.pipe batches the documents through the pipeline. fields: only report these (the
+        # model tags every label either way)
+        results = []
+        for doc in self.nlp.pipe((plain_text(text) for text in texts), batch_size=batch_size):
+            extracted = {}
+            for ent in doc.ents:
+                field_name = ent.label_.lower()
+                if fields is None or field_name in fields:
+                    extracted.setdefault(field_name, ent.text)
+            results.append(extracted)
+        return results
+
+    def output_fields(self):
+        # The entity labels of the NER component, as field names
+        if 'ner' not in self.nlp.pipe_names:
+            return set()
+        return {label.lower() for label in self.nlp.get_pipe('ner').labels}
+
 class HybridExtractor:
-    def __init__(self):
+    def __init__(self, incremental=False):
+        self.incremental = incremental
         self.date_patterns = [
             r'\b\d{1,2}[/-]\d{1,2}[/-]\d{4}\b',
             r'\b\d{1,2}\s+(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{4}\b',
@@ -101,30 +445,21 @@ class HybridExtractor:
             r'\b([A-Z][a-z]+\s+[A-Z][a-z]+)\s+(?:from|reported|involved)'
         ]
 
-        # ML components for contextual fields
-        self.vectorizer = TfidfVectorizer(max_features=1000, ngram_range=(1, 3))
-        self.department_classifier = Pipeline([
-            ('tfidf', TfidfVectorizer(max_features=500)),
-            ('classifier', MultinomialNB())
-        ])
-        self.injury_classifier = Pipeline([
-            ('tfidf', TfidfVectorizer(max_features=500)),
-            ('classifier', MultinomialNB())
-        ])
+        # ML components for contextual fields, built when first trained
+        self.department_classifier = None
+        self.injury_classifier = None
     
     def extract_with_regex(self, text):
         extracted = {}
 
-        # Extract dates
+        # Extract dates (memoized, with dateutil only for unusual shapes)
         for pattern in self.date_patterns:
             matches = re.findall(pattern, text, re.IGNORECASE)
             if matches:
-                try:
-                    parsed_date = date_parser.parse(matches[0])
-                    extracted['incident_date'] = parsed_date.strftime('%d/%m/%Y')
+                normalized = default_normalizer.normalize(matches[0])
+                if normalized is not None:
+                    extracted['incident_date'] = normalized
                     break
-                except:
-                    continue
 
         # Extract times
         for pattern in self.time_patterns:
@@ -141,24 +476,49 @@ class HybridExtractor:
                 break
 
         # Extract location patterns
-        location_patterns = [
-            r'(?:at|in|near)\s+([A-Z][a-z]*(?:\s+[A-Z]*[a-z]*)*\s*\d*)',
-            r'(Warehouse\s+[A-Z])',
-            r'(Dry Dock\s+\d+)',
-            r'(Building\s+\d+)'
-        ]
-
-        for pattern in location_patterns:
+        for pattern in LOCATION_PATTERNS:
             match = re.search(pattern, text, re.IGNORECASE)
             if match:
                 extracted['location'] = match.group(1)
                 break
 
         return extracted
-    
-    def train_ml_components(self, train_texts, train_labels):
-        print("Training ML components for contextual extraction...")
 
+    def extract_with_regex_batch(self, texts, fields=None):
+        # extract_with_regex() over a whole batch: each pattern runs down the column (only
+        # over the rows it can still decide) and the dates are normalized per distinct value.
+        # fields: only run the patterns of these fields
+        column = text_column(texts)
+        results = [{} for _ in texts]
+
+        def patterns(field, field_patterns):
+            return field_patterns if fields is None or field in fields else []
+
+        # A date match that doesn't normalize falls through to the next pattern
+        dates = pd.Series(None, index=column.index, dtype=object)
+        for pattern in patterns('incident_date', self.date_patterns):
+            pending = dates.isna()
+            if not pending.any():
+                break
+            matches = column[pending].str.extract(f'({pattern})', flags=re.IGNORECASE, expand=False)
+            dates[matches.index] = default_normalizer.normalize_batch(matches)
+        times = first_matches(column, [f'({pattern})' for pattern in patterns('incident_time', self.time_patterns)],
+                              re.IGNORECASE)
+        names = first_matches(column, patterns('reporter_name', self.name_patterns), re.IGNORECASE)
+        locations = first_matches(column, patterns('location', LOCATION_PATTERNS), re.IGNORECASE)
+
+        for extracted, date, time, name, location in zip(results, dates, times, names, locations):
+            if isinstance(date, str):
+                extracted['incident_date'] = date
+            if isinstance(time, str):
+                extracted['incident_time'] = time.replace('at ', '')
+            if isinstance(name, str):
+                extracted['reporter_name'] = name
+            if isinstance(location, str):
+                extracted['location'] = location
+        return results
+    
+    def prepare_labels(self, train_labels):
         # Prepare department labels
         dept_labels = []
         injury_labels = []
@@ -170,11 +530,56 @@ class HybridExtractor:
             was_injured = label.get('was_injured', 'No')
             injury_labels.append(was_injured if pd.notna(was_injured) else 'No')
 
+        return dept_labels, injury_labels
+
+    def train_ml_components(self, train_texts, train_labels):
+        from sklearn.naive_bayes import MultinomialNB
+
+        print("Training ML components for contextual extraction...")
+
+        dept_labels, injury_labels = self.prepare_labels(train_labels)
+
         # Train classifiers
-        self.department_classifier.fit(train_texts, dept_labels)
-        self.injury_classifier.fit(train_texts, injury_labels)
+        if self.incremental:
+            self.department_classifier = IncrementalTextClassifier("nb")
+            self.injury_classifier = IncrementalTextClassifier("nb")
+            self.department_classifier.fit(train_texts, dept_labels, self.DEFAULT_CLASSES['department'])
+            self.injury_classifier.fit(train_texts, injury_labels, self.DEFAULT_CLASSES['was_injured'])
+        else:
+            self.department_classifier = make_text_pipeline(MultinomialNB(), max_features=500)
+            self.injury_classifier = make_text_pipeline(MultinomialNB(), max_features=500)
+            self.department_classifier.fit(train_texts, dept_labels)
+            self.injury_classifier.fit(train_texts, injury_labels)
 
         print("ML components trained successfully")
+
+    # Classes the incremental classifiers always know, so the first batch needn't contain them
+    DEFAULT_CLASSES = {'department': ['Unknown'], 'was_injured': ['No', 'Yes']}
+
+    def partial_fit_ml_components(self, texts, labels, classes=None):
+        # Incremental mode only: update the classifiers with a batch of new rows. classes
+        # ({field: values}) fixes the class sets up front when training from a stream.
+        classes = classes or {}
+        dept_labels, injury_labels = self.prepare_labels(labels)
+        if self.department_classifier is None:
+            self.department_classifier = IncrementalTextClassifier("nb")
+            self.injury_classifier = IncrementalTextClassifier("nb")
+        self.department_classifier.partial_fit(
+            texts, dept_labels, self.DEFAULT_CLASSES['department'] + list(classes.get('department', []))
+        )
+        self.injury_classifier.partial_fit(
+            texts, injury_labels, self.DEFAULT_CLASSES['was_injured'] + list(classes.get('was_injured', []))
+        )
+
+    def reset_ml_components(self):
+        self.department_classifier = None
+        self.injury_classifier = None
+
+    def unseen_classes(self):
+        unseen = set()
+        for classifier in [self.department_classifier, self.injury_classifier]:
+            unseen.update(getattr(classifier, 'unseen_classes', set()))
+        return unseen
     
     def extract(self, text):
         # Start with regex extraction
@@ -193,8 +598,69 @@ class HybridExtractor:
 
         return extracted
 
+    def output_fields(self):
+        fields = {'incident_date', 'incident_time', 'reporter_name', 'location'}
+        if self.department_classifier is not None:
+            fields.add('department')
+        if self.injury_classifier is not None:
+            fields.add('was_injured')
+        return fields
+
+    def extract_batch(self, texts, fields=None):
+        # Same as extract() per text, with one classifier call for the whole batch. fields:
+        # only extract these (the other patterns and classifiers don't run)
+        results = self.extract_with_regex_batch(texts, fields)
+        try:
+            if fields is None or 'department' in fields:
+                for extracted, dept_pred in zip(results, self.department_classifier.predict(texts)):
+                    if dept_pred != 'Unknown':
+                        extracted['department'] = dept_pred
+            if fields is None or 'was_injured' in fields:
+                for extracted, injury_pred in zip(results, self.injury_classifier.predict(texts)):
+                    extracted['was_injured'] = injury_pred
+        except:
+            pass
+
+        return results
+
+    def extract_batch_with_confidence(self, texts, fields=None):
+        # extract_batch() plus, per text, the classifiers' probability for each value they
+        # predicted (regex values have none)
+        results = self.extract_with_regex_batch(texts, fields)
+        confidences = [{} for _ in texts]
+        try:
+            for field, classifier in [('department', self.department_classifier),
+                                      ('was_injured', self.injury_classifier)]:
+                if fields is not None and field not in fields:
+                    continue
+                proba = classifier.predict_proba(texts)
+                for extracted, confidence, row in zip(results, confidences, proba):
+                    best = row.argmax()
+                    value = classifier.classes_[best]
+                    if field == 'department' and value == 'Unknown':
+                        continue
+                    extracted[field] = value
+                    confidence[field] = float(row[best])
+        except:
+            pass
+
+        return results, confidences
+
+    def export_fast_predict(self):
+        # Swap the TF-IDF pipelines for their NumPy equivalents; returns how many were swapped
+        from fast_predict import export_pipeline
+
+        exported = 0
+        for name in ['department_classifier', 'injury_classifier']:
+            fast = export_pipeline(getattr(self, name))
+            if fast is not None:
+                setattr(self, name, fast)
+                exported += 1
+        return exported
+
 class TemplateMLExtractor:
-    def __init__(self):
+    def __init__(self, incremental=False):
+        self.incremental = incremental
         self.templates = {
             'incident_description': r'(?:incident|accident|event).*?(?:caused|resulted|leading|involving)\s+(.+?)(?:\.|The|,\s*[A-Z])',
             'injury_description': r'(?:suffered|sustained|injury|injured|hurt|damage)\s+(.+?)(?:\.|from|due to|$)',
@@ -202,12 +668,21 @@ class TemplateMLExtractor:
             'department_mention': r'(?:from the|department of|in the)\s+([A-Z][a-z]+(?:\s+(?:and|&)\s+[A-Z][a-z]+)*)\s+department'
         }
 
+        # Build classifiers for different field types
+        self.field_mappings = {
+            'location': 'location',
+            'label': 'label',
+            'department': 'department'
+        }
+
         self.classifiers = {}
 
-    def extract_with_templates(self, text):
+    def extract_with_templates(self, text, fields=None):
         extracted = {}
 
         for field, pattern in self.templates.items():
+            if fields is not None and field not in fields:
+                continue
             match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
             if match:
                 value = match.group(1).strip()
@@ -217,36 +692,74 @@ class TemplateMLExtractor:
 
         return extracted
 
-    def train_classifiers(self, train_texts, train_labels):
+    def field_labels(self, train_labels, label_key):
+        y = []
+        for label in train_labels:
+            value = label.get(label_key, 'Unknown')
+            if pd.isna(value) or value == 'N/A':
+                value = 'Unknown'
+            y.append(str(value))
+        return y
+
+    def train_classifiers(self, train_texts, train_labels, n_jobs=1):
         print("Training template-based classifiers...")
 
-        # Build classifiers for different field types
-        field_mappings = {
-            'location': 'location',
-            'label': 'label',
-            'department': 'department'
-        }
+        if not self.incremental:
+            self.train_forest_pipelines(train_texts, train_labels, n_jobs)
+            return
 
-        for field_name, label_key in field_mappings.items():
+        for field_name, label_key in self.field_mappings.items():
             try:
-                pipeline = Pipeline([
-                    ('tfidf', TfidfVectorizer(max_features=300, ngram_range=(1, 2))),
-                    ('classifier', RandomForestClassifier(n_estimators=50, random_state=42))
-                ])
-
-                y = []
-                for label in train_labels:
-                    value = label.get(label_key, 'Unknown')
-                    if pd.isna(value) or value == 'N/A':
-                        value = 'Unknown'
-                    y.append(str(value))
-
-                pipeline.fit(train_texts, y)
+                y = self.field_labels(train_labels, label_key)
+                pipeline = IncrementalTextClassifier("sgd")
+                pipeline.fit(train_texts, y, classes=['Unknown'])
                 self.classifiers[field_name] = pipeline
                 print(f"Trained classifier for {field_name}")
             except Exception as e:
                 print(f"Error training {field_name} classifier: {e}")
 
+    def train_forest_pipelines(self, train_texts, train_labels, n_jobs=1):
+        # Every field's pipeline has the same TF-IDF step fitted on the same texts, so it's
+        # fitted (and the texts transformed) once and shared by all of them
+        from sklearn.pipeline import Pipeline
+
+        try:
+            vectorizer = make_tfidf(max_features=300, ngram_range=(1, 2))
+            X = vectorizer.fit_transform(train_texts)
+        except Exception as e:
+            print(f"Error training template classifiers: {e}")
+            return
+
+        targets = {}
+        for field_name, label_key in self.field_mappings.items():
+            try:
+                targets[field_name] = self.field_labels(train_labels, label_key)
+            except Exception as e:
+                print(f"Error training {field_name} classifier: {e}")
+
+        for field_name, classifier, error in fit_forests(X, targets, {'n_estimators': 50, 'random_state': 42}, n_jobs):
+            if error is not None:
+                print(f"Error training {field_name} classifier: {error}")
+                continue
+            self.classifiers[field_name] = Pipeline([('tfidf', vectorizer), ('classifier', classifier)])
+            print(f"Trained classifier for {field_name}")
+
+    def partial_fit_classifiers(self, texts, labels, classes=None):
+        # Incremental mode only: update the classifiers with a batch of new rows. classes
+        # ({label key: values}) fixes the class sets up front when training from a stream.
+        classes = classes or {}
+        for field_name, label_key in self.field_mappings.items():
+            if field_name not in self.classifiers:
+                self.classifiers[field_name] = IncrementalTextClassifier("sgd")
+            self.classifiers[field_name].partial_fit(texts, self.field_labels(labels, label_key),
+                                                     classes=['Unknown'] + list(classes.get(label_key, [])))
+
+    def unseen_classes(self):
+        unseen = set()
+        for classifier in self.classifiers.values():
+            unseen.update(getattr(classifier, 'unseen_classes', set()))
+        return unseen
+
     def extract(self, text):
         # Get template-based extractions
         extracted = self.extract_with_templates(text)
@@ -262,18 +775,62 @@ class TemplateMLExtractor:
 
         return extracted
 
+    def predict_fields(self, texts, fields=None):
+        # The classifiers' predictions only, optionally for just some fields
+        results = [{} for _ in texts]
+        for field_name, classifier in self.classifiers.items():
+            if fields is not None and field_name not in fields:
+                continue
+            try:
+                predictions = classifier.predict(texts)
+            except:
+                continue
+            for extracted, prediction in zip(results, predictions):
+                if prediction != 'Unknown':
+                    extracted[field_name] = prediction
+
+        return results
+
+    def output_fields(self):
+        return set(self.templates) | set(self.classifiers)
+
+    def extract_batch(self, texts, fields=None):
+        results = [self.extract_with_templates(text, fields) for text in texts]
+        for extracted, predicted in zip(results, self.predict_fields(texts, fields)):
+            extracted.update(predicted)
+
+        return results
+
+    def export_fast_predict(self):
+        from fast_predict import export_pipeline
+
+        exported = 0
+        for field_name, classifier in self.classifiers.items():
+            fast = export_pipeline(classifier)
+            if fast is not None:
+                self.classifiers[field_name] = fast
+                exported += 1
+        return exported
+
 class AdvancedEnsembleExtractor:
+    # Columns of the statistical block, in the order the forests were trained on (the keys
+    # of extract_features())
+    STAT_FEATURES = ['text_length', 'word_count', 'sentence_count', 'has_date', 'has_time',
+                     'has_names', 'has_injury_words', 'dept_mentions']
+    DEPT_WORDS = ['facilities', 'health', 'safety', 'operations', 'maintenance', 'security']
+
     def __init__(self):
-        self.vectorizer = TfidfVectorizer(max_features=100, ngram_range=(1, 2))
+        self.vectorizer = None
         self.field_classifiers = {}
 
     def extract_features(self, text):
+        text = analyze(text)
         features = {}
 
         # Text statistics
         features['text_length'] = len(text)
-        features['word_count'] = len(text.split())
-        features['sentence_count'] = len(re.split(r'[.!?]+', text))
+        features['word_count'] = len(text.words)
+        features['sentence_count'] = len(text.sentences)
 
         # Pattern features
         features['has_date'] = int(bool(re.search(r'\d{1,2}[/-]\d{1,2}[/-]\d{4}', text)))
@@ -282,31 +839,49 @@ class AdvancedEnsembleExtractor:
         features['has_injury_words'] = int(bool(re.search(r'\b(?:injury|injured|hurt|damage|burn|cut|fall|fell)\b', text, re.IGNORECASE)))
 
         # Department indicators
-        dept_words = ['facilities', 'health', 'safety', 'operations', 'maintenance', 'security']
-        features['dept_mentions'] = sum(1 for word in dept_words if word in text.lower())
+        lower = text.lower()
+        features['dept_mentions'] = sum(1 for word in self.DEPT_WORDS if word in lower)
 
         return features
 
-    def train(self, train_texts, train_labels):
+    def stat_features(self, texts):
+        # extract_features() for a whole batch, one vectorized string operation per column:
+        # an (n_texts, len(STAT_FEATURES)) C-contiguous int64 array
+        column = text_column(texts)
+        lower = column.str.lower()
+        columns = {
+            'text_length': column.str.len(),
+            'word_count': column.str.split().str.len(),
+            # re.split() pieces, counted without building them
+            'sentence_count': column.str.count(SENTENCE_BOUNDARY.pattern) + 1,
+            'has_date': column.str.contains(r'\d{1,2}[/-]\d{1,2}[/-]\d{4}'),
+            'has_time': column.str.contains(r'\d{1,2}:\d{2}'),
+            'has_names': column.str.contains(r'\b[A-Z][a-z]+\s+[A-Z][a-z]+\b'),
+            'has_injury_words': column.str.contains(r'\b(?:injury|injured|hurt|damage|burn|cut|fall|fell)\b', flags=re.IGNORECASE),
+            'dept_mentions': sum(lower.str.contains(word, regex=False).to_numpy(np.int64) for word in self.DEPT_WORDS),
+        }
+        features = np.empty((len(column), len(self.STAT_FEATURES)), dtype=np.int64)
+        for i, name in enumerate(self.STAT_FEATURES):
+            features[:, i] = columns[name]
+        return features
+
+    def train(self, train_texts, train_labels, n_jobs=1):
         print("Training advanced ensemble extractor...")
 
         # First, fit the TF-IDF vectorizer on all training texts
+        self.vectorizer = make_tfidf(max_features=100, ngram_range=(1, 2))
         tfidf_features = self.vectorizer.fit_transform(train_texts).toarray()
 
         # Extract statistical features for all texts
-        stat_features = []
-        for text in train_texts:
-            text_features = self.extract_features(text)
-            stat_features.append(list(text_features.values()))
+        stat_features = self.stat_features(train_texts)
 
-        stat_features = np.array(stat_features)
-
-        # Combine statistical and TF-IDF features
-        X = np.hstack([stat_features, tfidf_features])
+        # Combine statistical and TF-IDF features (float32, which is what the forests use)
+        X = np.hstack([stat_features, tfidf_features]).astype(np.float32)
 
         # Train classifiers for each field
         target_fields = ['department', 'location', 'was_injured', 'label']
 
+        targets = {}
         for field in target_fields:
             try:
                 y = []
@@ -315,15 +890,35 @@ class AdvancedEnsembleExtractor:
                     if pd.isna(value) or value == 'N/A':
                         value = 'Unknown'
                     y.append(str(value))
-
-                classifier = RandomForestClassifier(n_estimators=100, random_state=42)
-                classifier.fit(X, y)
-                self.field_classifiers[field] = classifier
-
-                print(f"Trained ensemble classifier for {field}")
+                targets[field] = y
             except Exception as e:
                 print(f"Error training ensemble classifier for {field}: {e}")
 
+        for field, classifier, error in fit_forests(X, targets, {'n_estimators': 100, 'random_state': 42}, n_jobs):
+            if error is not None:
+                print(f"Error training ensemble classifier for {field}: {error}")
+                continue
+            self.field_classifiers[field] = classifier
+            print(f"Trained ensemble classifier for {field}")
+
+    def tfidf_features(self, texts):
+        features = self.vectorizer.transform(texts)
+        # Dense already once exported by export_fast_predict()
+        return features.toarray() if hasattr(features, 'toarray') else features
+
+    def export_fast_predict(self):
+        from fast_predict import FastForest, FastTfidf
+
+        if self.vectorizer is None:
+            return 0
+        fast_vectorizer = FastTfidf.from_sklearn(self.vectorizer)
+        if fast_vectorizer is None:
+            return 0
+        self.vectorizer = fast_vectorizer
+        for field, classifier in self.field_classifiers.items():
+            self.field_classifiers[field] = FastForest.from_sklearn(classifier)
+        return len(self.field_classifiers)
+
     def extract(self, text):
         extracted = {}
 
@@ -332,7 +927,7 @@ class AdvancedEnsembleExtractor:
         stat_features = np.array(list(text_features.values())).reshape(1, -1)
 
         # Extract TF-IDF features
-        tfidf_features = self.vectorizer.transform([text]).toarray()
+        tfidf_features = self.tfidf_features([text])
 
         # Combine features
         combined_features = np.hstack([stat_features, tfidf_features])
@@ -348,63 +943,484 @@ class AdvancedEnsembleExtractor:
 
         return extracted
 
+    def output_fields(self):
+        return set(self.field_classifiers)
+
+    def extract_batch(self, texts, fields=None):
+        if fields is not None and not self.output_fields() & set(fields):
+            # None of its classifiers asked for: skip building the features too
+            return [{} for _ in texts]
+        stat_features = self.stat_features(texts)
+        tfidf_features = self.tfidf_features(texts)
+        combined_features = np.hstack([stat_features, tfidf_features])
+
+        results = [{} for _ in texts]
+        for field, classifier in self.field_classifiers.items():
+            if fields is not None and field not in fields:
+                continue
+            try:
+                predictions = classifier.predict(combined_features)
+            except Exception as e:
+                continue
+            for extracted, prediction in zip(results, predictions):
+                if prediction != 'Unknown':
+                    extracted[field] = prediction
+
+        return results
+
+def vote(predictions):
+    # Majority vote per field over the extractors' non-empty values; ties go to the
+    # value seen first
+    final_result = {}
+    all_fields = set()
+    for model_preds in predictions.values():
+        all_fields.update(model_preds.keys())
+
+    for field in all_fields:
+        votes = {}
+        for model_name, model_preds in predictions.items():
+            if field in model_preds and model_preds[field]:
+                value = model_preds[field]
+                votes[value] = votes.get(value, 0) + 1
+
+        if votes:
+            final_result[field] = max(votes.keys(), key=votes.get)
+
+    return final_result
+
+# Cascade mode settings. A field is settled by the cheap stage (Hybrid regexes + NB, the
+# Template regexes) when its value's confidence reaches the field's threshold; only fields
+# left unsettled go to the expensive extractors (spaCy/transformer NER, the Template and
+# Advanced forests). NB values are scored by their predicted probability, regex matches by
+# rule_confidences (rule_confidence for other fields). A threshold above 1 always asks the
+# expensive extractors. The defaults come from 'benchmark.py cascade' on generated corpora:
+# the date/time regexes are exact, the description/person templates rarely are, and the
+# department NB is right ~97% of the time once its (flat) top probability passes 0.1.
+CASCADE_DEFAULTS = {
+    'threshold': 0.9,
+    'field_thresholds': {'department': 0.1},
+    'rule_confidences': {'incident_date': 0.99, 'incident_time': 0.99, 'reporter_name': 0.9},
+    'rule_confidence': 0.5,
+    # Exact dictionary matches (gazetteer.py), when the ensemble has a gazetteer
+    'gazetteer_confidence': 0.95,
+}
+
 class EnsembleVotingExtractor:
-    def __init__(self):
-        self.spacy_extractor = SpacyNERExtractor()
-        self.hybrid_extractor = HybridExtractor()
-        self.template_extractor = TemplateMLExtractor()
+    def __init__(self, spacy_kwargs=None, incremental=False, rebuild_every=None, transformer_kwargs=None,
+                 cascade=None, gazetteer_kwargs=None):
+        # incremental=True gives the Hybrid and Template classifiers a hashing featurizer and
+        # partial_fit estimators so update_models() can fold in new labelled rows; rebuild_every
+        # is how many updates to allow before needs_rebuild() asks for a full retrain.
+        # transformer_kwargs (at least model_dir) adds a fine-tuned transformer NER model as a
+        # fifth voter; it is used as is and never trained here. gazetteer_kwargs ({} for the
+        # bundled gazetteer.json) adds dictionary matching for the closed vocabularies.
+        self.spacy_extractor = SpacyNERExtractor(**(spacy_kwargs or {}))
+        self.hybrid_extractor = HybridExtractor(incremental=incremental)
+        self.template_extractor = TemplateMLExtractor(incremental=incremental)
         self.advanced_extractor = AdvancedEnsembleExtractor()
-
-    def train_all_models(self, train_texts, train_labels):
+        # cascade: True for CASCADE_DEFAULTS or a dict overriding some of them
+        self.cascade = cascade
+        self.cascade_stats = {}
+        # Per-extractor cost estimates and budget overruns, for latency budgets
+        self.costs = ExtractorCosts()
+        self.transformer_extractor = None
+        if transformer_kwargs:
+            from transformer_extractor import TransformerNERExtractor
+            self.transformer_extractor = TransformerNERExtractor(**transformer_kwargs)
+        self.gazetteer_extractor = None
+        if gazetteer_kwargs is not None:
+            from gazetteer import GazetteerExtractor
+            self.gazetteer_extractor = GazetteerExtractor(**gazetteer_kwargs)
+        self.incremental = incremental
+        self.rebuild_every = rebuild_every
+        self.updates_since_rebuild = 0
+
+    def warm_up(self):
+        # Pay the import and spaCy load costs now rather than on the first extraction
+        warm_up(spacy_model=None)
+        self.spacy_extractor.nlp
+        if getattr(self, 'transformer_extractor', None) is not None:
+            self.transformer_extractor.model
+        self.measure_costs()
+
+    def measure_costs(self, texts=None):
+        # Seeds the latency budgets' cost estimates for the extractors that have none, by
+        # running them (unbudgeted) on a small batch of sample reports. Measured on so few
+        # texts the estimates come out high, which errs on the side of meeting budgets.
+        costs = self.extractor_costs()
+        texts = analyze_batch(texts or [CALIBRATION_TEXT] * 8)
+        for name, extractor in self.extractors().items():
+            if not costs.measured(name):
+                run_within(name, lambda chunk: self._extract_batch(extractor, chunk), texts, None, costs)
+
+    def train_all_models(self, train_texts, train_labels, spacy_cache_dir=None, spacy_annotations=None,
+                         spacy_n_iter=30, n_jobs=1):
+        # n_jobs: processes for fitting the per-field forests (see fit_forests)
         print("Training all ensemble models...")
         print("1. Training spaCy NER...")
-        self.spacy_extractor.train(train_texts, train_labels)
+        self.spacy_extractor.train(train_texts, train_labels, n_iter=spacy_n_iter, cache_dir=spacy_cache_dir,
+                                   annotations=spacy_annotations)
         print("2. Training Hybrid extractor...")
         self.hybrid_extractor.train_ml_components(train_texts, train_labels)
         print("3. Training Template extractor...")
-        self.template_extractor.train_classifiers(train_texts, train_labels)
+        self.template_extractor.train_classifiers(train_texts, train_labels, n_jobs=n_jobs)
         print("4. Training Advanced extractor...")
-        self.advanced_extractor.train(train_texts, train_labels)
+        self.advanced_extractor.train(train_texts, train_labels, n_jobs=n_jobs)
+        self.updates_since_rebuild = 0
         print("All models trained successfully!")
 
-    def extract_with_voting(self, text):
-        # Your existing voting logic
-        predictions = {}
-        
-        try:
-            predictions['spacy'] = self.spacy_extractor.extract(text)
-        except:
-            predictions['spacy'] = {}
+    def train_streaming(self, corpus, spacy_n_iter=30, spacy_drop=0.5, spacy_cache_dir=None,
+                        advanced_sample_size=20000, seed=42, n_jobs=1):
+        # Out-of-core training over a corpus.LabelledCorpus (or anything re-iterable that yields
+        # (texts, labels, annotations) chunks); peak memory depends on the chunk size, not the corpus.
+        # The Advanced forests can't learn incrementally, so they train on a fixed-size
+        # uniform reservoir sample of the stream.
+        if not self.incremental:
+            raise ValueError("train_streaming requires an ensemble created with incremental=True")
+
+        print("Training all ensemble models out of core...")
+        classes = corpus.label_classes(['department', 'was_injured', 'location', 'label'])
+        self.hybrid_extractor.reset_ml_components()
+        self.template_extractor.classifiers = {}
+
+        print("1. Streaming Hybrid and Template classifiers...")
+        rng = random.Random(seed)
+        sample_texts, sample_labels = [], []
+        seen = 0
+        for texts, labels, annotations in corpus:
+            self.hybrid_extractor.partial_fit_ml_components(texts, labels, classes)
+            self.template_extractor.partial_fit_classifiers(texts, labels, classes)
+            for text, label in zip(texts, labels):
+                seen += 1
+                if len(sample_texts) < advanced_sample_size:
+                    sample_texts.append(text)
+                    sample_labels.append(label)
+                else:
+                    j = rng.randrange(seen)
+                    if j < advanced_sample_size:
+                        sample_texts[j] = text
+                        sample_labels[j] = label
+        print(f"Streamed {seen} rows")
+
+        print("2. Training spaCy NER from streamed batches...")
+        self.spacy_extractor.train_streaming(corpus, n_iter=spacy_n_iter, drop=spacy_drop, cache_dir=spacy_cache_dir)
+        print(f"3. Training Advanced extractor on a {len(sample_texts)}-row sample...")
+        self.advanced_extractor.train(sample_texts, sample_labels, n_jobs=n_jobs)
+        self.updates_since_rebuild = 0
+        print("All models trained successfully!")
 
+    def update_models(self, texts, labels):
+        # Time proportional to the new rows. spaCy and the Advanced forests keep their last
+        # full training until the next rebuild.
+        if not self.incremental:
+            raise ValueError("update_models requires an ensemble created with incremental=True")
+        self.hybrid_extractor.partial_fit_ml_components(texts, labels)
+        self.template_extractor.partial_fit_classifiers(texts, labels)
+        self.updates_since_rebuild += 1
+
+    def needs_rebuild(self):
+        if self.hybrid_extractor.unseen_classes() or self.template_extractor.unseen_classes():
+            return True
+        return self.rebuild_every is not None and self.updates_since_rebuild >= self.rebuild_every
+
+    def rebuild(self, train_texts, train_labels, **kwargs):
+        # Periodic full retrain over the whole labelled history
+        self.train_all_models(train_texts, train_labels, **kwargs)
+
+    def save(self, path):
+        # spaCy goes through its own serialization, everything else is pickled
+        os.makedirs(path, exist_ok=True)
+        nlp = self.spacy_extractor.nlp
+        nlp.to_disk(os.path.join(path, "spacy"))
+        self.spacy_extractor._nlp = None
         try:
-            predictions['hybrid'] = self.hybrid_extractor.extract(text)
-        except:
-            predictions['hybrid'] = {}
+            with open(os.path.join(path, "ensemble.pkl"), "wb") as f:
+                pickle.dump(self, f)
+        finally:
+            self.spacy_extractor._nlp = nlp
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "ensemble.pkl"), "rb") as f:
+            ensemble = pickle.load(f)
+        # Loaded lazily from the saved pipeline
+        ensemble.spacy_extractor.model = os.path.join(path, "spacy")
+        return ensemble
+
+    def extract_with_voting(self, text, budget=None, fields=None):
+        # budget: seconds this text may take; fields: only extract these (see
+        # extract_batch_with_voting)
+        if budget is not None or fields is not None or getattr(self, 'cascade', None):
+            return self.extract_batch_with_voting([text], budget=budget, fields=fields)[0]
 
-        try:
-            predictions['template'] = self.template_extractor.extract(text)
-        except:
-            predictions['template'] = {}
+        # Your existing voting logic
+        text = analyze(text)
+        predictions = {}
+        for name, extractor in self.extractors().items():
+            try:
+                predictions[name] = extractor.extract(text)
+            except:
+                predictions[name] = {}
 
+        # Combine predictions with voting
+        return vote(predictions), predictions
+
+    def export_fast_predict(self):
+        # Replaces the fitted sklearn classifiers with NumPy predictors giving the same
+        # predictions (see fast_predict.py). The incremental classifiers are left as they
+        # are, and exported models can no longer be retrained or updated.
+        return {
+            'hybrid': self.hybrid_extractor.export_fast_predict(),
+            'template': self.template_extractor.export_fast_predict(),
+            'advanced': self.advanced_extractor.export_fast_predict(),
+        }
+
+    def extractors(self):
+        extractors = {}
+        # First, so a tied vote goes to the exact dictionary match
+        if getattr(self, 'gazetteer_extractor', None) is not None:
+            extractors['gazetteer'] = self.gazetteer_extractor
+        extractors.update({
+            'spacy': self.spacy_extractor,
+            'hybrid': self.hybrid_extractor,
+            'template': self.template_extractor,
+            'advanced': self.advanced_extractor,
+        })
+        # Bundles saved before the transformer member existed don't have the attribute
+        if getattr(self, 'transformer_extractor', None) is not None:
+            extractors['transformer'] = self.transformer_extractor
+        return extractors
+
+    def field_sources(self, fields=None):
+        # {extractor name: the requested fields it can produce} for the extractors that can
+        # produce any of them, in extractors() order. With fields=None every extractor, each
+        # mapped to None (all of its fields).
+        sources = {}
+        for name, extractor in self.extractors().items():
+            if fields is None:
+                sources[name] = None
+                continue
+            try:
+                wanted = extractor.output_fields() & set(fields)
+            except Exception as e:
+                # Can't tell (e.g. its model won't load): run it for all of them, as before
+                print(f"Could not list the fields of the {name} extractor: {e}")
+                wanted = set(fields)
+            if wanted:
+                sources[name] = wanted
+        return sources
+
+    def available_fields(self):
+        # Every field some extractor can produce, for field pickers
+        fields = set()
+        for extractor in self.extractors().values():
+            try:
+                fields |= extractor.output_fields()
+            except Exception:
+                continue
+        return sorted(fields)
+
+    def extract_batch_with_voting(self, texts, budget=None, row_budget=None, deadline=None, fields=None):
+        # Same results as extract_with_voting() on each text, but every extractor sees the
+        # whole batch at once. If an extractor fails on the batch, it's rerun one text at a
+        # time so only the texts it actually fails on lose its vote.
+        # With a budget (seconds for the batch) or a Deadline, the extractors run cheapest
+        # first and each one only gets the texts it is expected to finish in time. A
+        # row_budget (seconds per text) is enforced per text: an extractor is skipped for a
+        # text when its estimated cost exceeds what that text has left, so one long text
+        # doesn't cost the others their voters. Texts an extractor skips are voted on
+        # without it and marked 'degraded': True. See deadlines.py.
+        # fields (e.g. ['was_injured', 'department']) limits extraction to those fields: only
+        # the extractors, patterns and classifiers that can produce them run (field_sources),
+        # and each field's vote is the same as without the limit.
+        if deadline is None and budget is not None:
+            deadline = Deadline(budget)
+        if getattr(self, 'cascade', None):
+            return self.extract_batch_cascade(texts, deadline, fields, row_budget)
+
+        # Tokenized once here, shared by every extractor
+        texts = analyze_batch(texts)
+        costs = self.extractor_costs()
+        extractors = self.extractors()
+        sources = self.field_sources(fields)
+        row_budgets = RowBudgets(row_budget, len(texts)) if row_budget is not None else None
+        order = list(sources)
+        if deadline is not None or row_budgets is not None:
+            order.sort(key=lambda name: costs.estimate(name, 1))
+        batch_predictions = {}
+        for name in order:
+            extractor = extractors[name]
+            batch_predictions[name] = run_within(name, lambda chunk: self._extract_batch(extractor, chunk, sources[name]),
+                                                 texts, deadline, costs, row_budgets=row_budgets)
+
+        results = []
+        for i in range(len(texts)):
+            # Voted in extractors() order whatever order they ran in, since ties go to the first seen
+            predictions = {name: batch_predictions[name][i] for name in sources
+                           if batch_predictions[name][i] is not None}
+            final_result = vote(predictions)
+            if len(predictions) < len(sources):
+                final_result['degraded'] = True
+            results.append((final_result, predictions))
+        return results
+
+    def _extract_batch(self, extractor, texts, fields=None):
         try:
-            predictions['advanced'] = self.advanced_extractor.extract(text)
+            if fields is None:
+                return extractor.extract_batch(texts)
+            return extractor.extract_batch(texts, fields=fields)
         except:
-            predictions['advanced'] = {}
+            results = []
+            for text in texts:
+                try:
+                    extracted = extractor.extract(text)
+                except:
+                    extracted = {}
+                results.append({field: value for field, value in extracted.items()
+                                if fields is None or field in fields})
+            return results
+
+    def extractor_costs(self):
+        # Bundles saved before latency budgets existed don't have the attribute
+        if 'costs' not in self.__dict__:
+            self.costs = ExtractorCosts()
+        return self.costs
+
+    def deadline_stats(self):
+        return self.extractor_costs().stats()
+
+    def cascade_settings(self):
+        settings = {key: dict(value) if isinstance(value, dict) else value for key, value in CASCADE_DEFAULTS.items()}
+        if isinstance(self.cascade, dict):
+            for key, value in self.cascade.items():
+                # Per-field settings are merged into the defaults rather than replacing them
+                if isinstance(value, dict):
+                    settings[key].update(value)
+                else:
+                    settings[key] = value
+        return settings
+
+    def count_cascade(self, **counts):
+        stats = self.__dict__.setdefault('cascade_stats', {})
+        for key, value in counts.items():
+            stats[key] = stats.get(key, 0) + value
+
+    def extract_batch_cascade(self, texts, deadline=None, fields=None, row_budget=None):
+        # Cascade mode: the cheap extractors run on every text, the expensive ones only on
+        # the texts (and fields) the cheap ones didn't settle. Settled fields keep the cheap
+        # value; unsettled ones are voted on exactly as in full mode. A deadline or a
+        # row_budget (seconds per text) limits the expensive stage only. fields limits both
+        # stages to those fields.
+        settings = self.cascade_settings()
+        texts = analyze_batch(texts)
+        costs = self.extractor_costs()
+        row_budgets = RowBudgets(row_budget, len(texts)) if row_budget is not None else None
+        degraded = [False] * len(texts)
+        sources = self.field_sources(fields)
+        extractors = self.extractors()
+
+        hybrid, confidences = [{} for _ in texts], [{} for _ in texts]
+        if 'hybrid' in sources:
+            try:
+                hybrid, confidences = self.hybrid_extractor.extract_batch_with_confidence(texts, sources['hybrid'])
+            except:
+                pass
+        templates = []
+        for text in texts:
+            try:
+                templates.append(self.template_extractor.extract_with_templates(text, sources['template'])
+                                 if 'template' in sources else {})
+            except:
+                templates.append({})
+        gazetteer = extractors.get('gazetteer') if 'gazetteer' in sources else None
+        matches = self._extract_batch(gazetteer, texts, sources['gazetteer']) if gazetteer is not None else [{} for _ in texts]
+
+        # Fields the expensive extractors can answer, by extractor
+        ner_extractors = {name: extractors[name] for name in ['spacy', 'transformer'] if name in sources}
+        model_fields = {
+            'template': set(self.template_extractor.classifiers),
+            'advanced': set(self.advanced_extractor.field_classifiers),
+        }
+        expensive_fields = set(NER_FIELDS).union(*model_fields.values())
+        if fields is not None:
+            model_fields = {name: model_fields[name] & set(fields) for name in model_fields}
+            expensive_fields &= set(fields)
+
+        settled, needed = [], []
+        for cheap, confidence, template, match in zip(hybrid, confidences, templates, matches):
+            values = {**template, **cheap, **match}
+            confidence = {**confidence, **{field: settings['gazetteer_confidence'] for field in match}}
+            done = {}
+            for field, value in values.items():
+                threshold = settings['field_thresholds'].get(field, settings['threshold'])
+                rule_confidence = settings['rule_confidences'].get(field, settings['rule_confidence'])
+                if value and confidence.get(field, rule_confidence) >= threshold:
+                    done[field] = value
+            settled.append(done)
+            needed.append(expensive_fields - set(done))
+
+        predictions = [{name: values for name, values in [('hybrid', cheap), ('template', dict(template))]
+                        if name in sources}
+                       for cheap, template in zip(hybrid, templates)]
+        if gazetteer is not None:
+            for text_predictions, match in zip(predictions, matches):
+                text_predictions['gazetteer'] = match
+
+        # NER extractors, for texts with an unsettled NER field
+        rows = [i for i, row_fields in enumerate(needed) if row_fields & set(NER_FIELDS)]
+        for name, extractor in ner_extractors.items():
+            results = run_within(name, lambda chunk: self._extract_batch(extractor, chunk, sources[name]),
+                                 [texts[i] for i in rows], deadline, costs, row_budgets=row_budgets,
+                                 rows=rows) if rows else []
+            for i, result in zip(rows, results):
+                if result is None:
+                    degraded[i] = True
+                else:
+                    predictions[i][name] = result
+
+        # Forest classifiers, for texts with one of their fields unsettled
+        for name, classifier_fields in model_fields.items():
+            rows = [i for i, row_fields in enumerate(needed) if row_fields & classifier_fields]
+            if not rows:
+                continue
+            wanted = set().union(*(needed[i] & classifier_fields for i in rows))
 
-        # Combine predictions with voting
-        final_result = {}
-        all_fields = set()
-        for model_preds in predictions.values():
-            all_fields.update(model_preds.keys())
-
-        for field in all_fields:
-            votes = {}
-            for model_name, model_preds in predictions.items():
-                if field in model_preds and model_preds[field]:
-                    value = model_preds[field]
-                    votes[value] = votes.get(value, 0) + 1
-
-            if votes:
-                final_result[field] = max(votes.keys(), key=votes.get)
-
-        return final_result, predictions
\ No newline at end of file
+            def predict(chunk, name=name, wanted=wanted):
+                try:
+                    if name == 'template':
+                        return self.template_extractor.predict_fields(chunk, wanted)
+                    return self.advanced_extractor.extract_batch(chunk, wanted)
+                except:
+                    return [{} for _ in chunk]
+
+            results = run_within(name, predict, [texts[i] for i in rows], deadline, costs, row_budgets=row_budgets,
+                                 rows=rows)
+            for i, result in zip(rows, results):
+                if result is None:
+                    degraded[i] = True
+                else:
+                    predictions[i].setdefault(name, {}).update(result)
+            self.count_cascade(**{f"{name}_rows": len(rows)})
+
+        self.count_cascade(texts=len(texts), ner_rows=sum(1 for row_fields in needed if row_fields & set(NER_FIELDS)))
+
+        results = []
+        order = list(extractors)
+        for done, text_predictions, skipped in zip(settled, predictions, degraded):
+            # Same extractor order as full mode, since vote() breaks ties by first seen
+            text_predictions = {name: text_predictions[name] for name in order if name in text_predictions}
+            final_result = vote(text_predictions)
+            final_result.update(done)
+            if skipped:
+                final_result['degraded'] = True
+            results.append((final_result, text_predictions))
+        return results
+
+def load_bundle(path):
+    # A model bundle directory: a distilled student (see distill.py) if it holds one,
+    # otherwise a full ensemble. Both have the extract_batch_with_voting interface.
+    if os.path.exists(os.path.join(path, "student.pkl")):
+        from distill import StudentExtractor
+
+        return StudentExtractor.load(path)
+    return EnsembleVotingExtractor.load(path)
@@ -0,0 +1,182 @@
+# fast_predict.py
+# Exports the fitted TF-IDF + MultinomialNB / RandomForest classifiers into plain NumPy
+# predictors. They skip sklearn's validation, Pipeline dispatch and sparse matrices, which
+# is most of the cost of predicting one short text, and give the same predictions:
+# features are computed in the same order as sklearn and trees compare float32 features
+# against the same thresholds.
+import numpy as np
+
+from text_analysis import NgramAnalyzer
+
+class FastTfidf:
+    # Same features as a fitted TfidfVectorizer with the default word analyzer or an
+    # NgramAnalyzer; TextAnalysis inputs reuse their cached n-grams
+    SUPPORTED = {"strip_accents": None, "preprocessor": None, "tokenizer": None, "stop_words": None,
+                 "binary": False, "use_idf": True}
+
+    def __init__(self, vocabulary, idf, analyzer, norm, sublinear_tf):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.analyzer = analyzer
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+        self.n_features = len(idf)
+
+    @classmethod
+    def from_sklearn(cls, vectorizer):
+        params = vectorizer.get_params()
+        if any(params[name] != value for name, value in cls.SUPPORTED.items()) or params["norm"] not in ("l2", None):
+            return None
+        if isinstance(params["analyzer"], NgramAnalyzer):
+            analyzer = params["analyzer"]
+        elif params["analyzer"] == "word" and params["lowercase"]:
+            analyzer = NgramAnalyzer(params["ngram_range"], params["token_pattern"])
+        else:
+            return None
+        return cls(dict(vectorizer.vocabulary_), np.asarray(vectorizer.idf_, dtype=np.float64),
+                   analyzer, params["norm"], params["sublinear_tf"])
+
+    def transform_one(self, text):
+        # (feature indices ascending, tf-idf values) of one text
+        counts = {}
+        for term in self.analyzer(text):
+            index = self.vocabulary.get(term)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        indices = np.array(sorted(counts), dtype=np.intp)
+        values = np.array([counts[i] for i in indices], dtype=np.float64)
+        if self.sublinear_tf:
+            values = np.log(values) + 1
+        values = values * self.idf[indices]
+        if self.norm == "l2" and len(values):
+            # Summed in index order, like sklearn's row normalization
+            squares = 0.0
+            for value in values.tolist():
+                squares += value * value
+            if squares != 0:
+                values = values / np.sqrt(squares)
+        return indices, values
+
+    def transform(self, texts, dtype=np.float64):
+        X = np.zeros((len(texts), self.n_features), dtype=dtype)
+        for row, text in enumerate(texts):
+            indices, values = self.transform_one(text)
+            X[row, indices] = values
+        return X
+
+class FastNB:
+    # MultinomialNB: joint log likelihood = tf-idf . feature log probs + class log prior
+    def __init__(self, tfidf, classes, feature_log_prob, class_log_prior):
+        self.tfidf = tfidf
+        self.classes_ = classes
+        self.feature_log_prob = np.ascontiguousarray(feature_log_prob.T)
+        self.class_log_prior = class_log_prior
+
+    def joint_log_likelihood(self, texts):
+        jll = np.empty((len(texts), len(self.classes_)))
+        for row, text in enumerate(texts):
+            indices, values = self.tfidf.transform_one(text)
+            if len(indices):
+                # Accumulated feature by feature, as the sparse product sums them
+                products = values[:, np.newaxis] * self.feature_log_prob[indices]
+                jll[row] = np.add.accumulate(products, axis=0)[-1] + self.class_log_prior
+            else:
+                jll[row] = np.zeros(len(self.classes_)) + self.class_log_prior
+        return jll
+
+    def predict(self, texts):
+        return self.classes_[np.argmax(self.joint_log_likelihood(texts), axis=1)]
+
+    def predict_proba(self, texts):
+        # Normalized like MultinomialNB.predict_proba (exp of jll - logsumexp)
+        jll = self.joint_log_likelihood(texts)
+        highest = jll.max(axis=1, keepdims=True)
+        log_prob_x = highest + np.log(np.exp(jll - highest).sum(axis=1, keepdims=True))
+        return np.exp(jll - log_prob_x)
+
+class FastForest:
+    # Every tree's nodes flattened into shared arrays; all trees are walked together, one
+    # level per step. Leaf values are stored as the per-tree class probabilities.
+    def __init__(self, classes, roots, left, right, feature, threshold, leaf_proba):
+        self.classes_ = classes
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.leaf_proba = leaf_proba
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        roots, left, right, feature, threshold, leaf_proba = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            roots.append(offset)
+            # Leaves point at themselves so finished walks stay put
+            nodes = np.arange(tree.node_count) + offset
+            left.append(np.where(is_leaf, nodes, tree.children_left + offset))
+            right.append(np.where(is_leaf, nodes, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+            # What DecisionTreeClassifier.predict_proba returns at each node
+            proba = tree.value[:, 0, :forest.n_classes_].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            leaf_proba.append(proba / normalizer)
+            offset += tree.node_count
+        return cls(forest.classes_, np.array(roots, dtype=np.intp), np.concatenate(left).astype(np.intp),
+                   np.concatenate(right).astype(np.intp), np.concatenate(feature).astype(np.intp),
+                   np.concatenate(threshold), np.concatenate(leaf_proba))
+
+    def predict_proba_matrix(self, X):
+        # Trees compare float32 features, as sklearn casts its input
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        while True:
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            next_nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            if np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+
+        # Accumulated tree by tree, like the forest's own averaging
+        proba = np.zeros((len(X), len(self.classes_)))
+        for tree in range(len(self.roots)):
+            proba += self.leaf_proba[nodes[:, tree]]
+        return proba / len(self.roots)
+
+    def predict(self, X):
+        # Takes a feature matrix, like RandomForestClassifier.predict
+        return self.classes_[np.argmax(self.predict_proba_matrix(X), axis=1)]
+
+class FastForestPipeline:
+    def __init__(self, tfidf, forest):
+        self.tfidf = tfidf
+        self.forest = forest
+        self.classes_ = forest.classes_
+
+    def predict(self, texts):
+        return self.forest.predict(self.tfidf.transform(texts))
+
+def export_pipeline(pipeline):
+    # The fast equivalent of a fitted TF-IDF Pipeline, or None if it can't be exported
+    # (e.g. the incremental classifiers, which use a hashing featurizer)
+    steps = getattr(pipeline, "named_steps", None)
+    if not steps or "tfidf" not in steps or "classifier" not in steps:
+        return None
+    tfidf = FastTfidf.from_sklearn(steps["tfidf"])
+    classifier = steps["classifier"]
+    if tfidf is None:
+        return None
+
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.naive_bayes import MultinomialNB
+
+    if type(classifier) is MultinomialNB:
+        return FastNB(tfidf, classifier.classes_, classifier.feature_log_prob_, classifier.class_log_prior_)
+    if type(classifier) is RandomForestClassifier and classifier.n_outputs_ == 1:
+        return FastForestPipeline(tfidf, FastForest.from_sklearn(classifier))
+    return None
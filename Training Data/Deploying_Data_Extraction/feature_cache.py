@@ -0,0 +1,72 @@
+# feature_cache.py
+# Feature matrices written once as .npy files and attached memory-mapped (read-only) by any
+# number of worker processes: sparse matrices as their data/indices/indptr arrays, dense
+# blocks as one array. Workers get the directory and a name instead of a pickled matrix,
+# and the OS page cache holds a single copy however many of them there are.
+# Matrices are stored in the dtype and layout their consumer wants (float32, CSC for the
+# forests' sparse input) so attaching never triggers a conversion copy.
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+SPARSE_PARTS = ("data", "indices", "indptr")
+
+class FeatureCache:
+    def __init__(self, directory=None):
+        # No directory: a temporary one, removed by cleanup()
+        self.temporary = directory is None
+        self.directory = tempfile.mkdtemp(prefix="features-") if directory is None else directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
+
+    def cleanup(self):
+        if self.temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name, part):
+        return os.path.join(self.directory, f"{name}.{part}.npy")
+
+    def meta_path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def put(self, name, matrix, dtype=None):
+        # Returns the attached (memory-mapped) matrix, so the writer can drop its own copy
+        if hasattr(matrix, "tocsr"):
+            matrix = matrix.copy() if matrix.format in ("csr", "csc") else matrix.tocsr()
+            matrix.sort_indices()
+            if dtype is not None:
+                matrix = matrix.astype(dtype)
+            for part in SPARSE_PARTS:
+                np.save(self.path(name, part), getattr(matrix, part))
+            meta = {"format": matrix.format, "shape": list(matrix.shape)}
+        else:
+            matrix = np.ascontiguousarray(matrix, dtype=dtype)
+            np.save(self.path(name, "dense"), matrix)
+            meta = {"format": "dense", "shape": list(matrix.shape)}
+        with open(self.meta_path(name), "w") as f:
+            json.dump(meta, f)
+        return self.get(name)
+
+    def get(self, name):
+        with open(self.meta_path(name)) as f:
+            meta = json.load(f)
+        if meta["format"] == "dense":
+            return np.load(self.path(name, "dense"), mmap_mode="r")
+
+        from scipy.sparse import csc_matrix, csr_matrix
+
+        parts = tuple(np.load(self.path(name, part), mmap_mode="r") for part in SPARSE_PARTS)
+        matrix_type = csc_matrix if meta["format"] == "csc" else csr_matrix
+        return matrix_type(parts, shape=tuple(meta["shape"]), copy=False)
+
+def attach(directory, name):
+    # For worker processes: the named matrix of an existing cache directory
+    return FeatureCache(directory).get(name)
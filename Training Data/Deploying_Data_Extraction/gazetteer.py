@@ -0,0 +1,235 @@
+# gazetteer.py
+# Dictionary matching for the closed vocabularies (locations, departments, staff names).
+# Every term of every category is compiled into an Aho-Corasick automaton (a second one for
+# ignore_case categories), so all mentions are found in one pass over the text whatever the
+# dictionary size. Matches must sit on
+# word boundaries, overlapping matches resolve leftmost-longest ("Warehouse A" the location
+# beats "Warehouse" the department), and runs of whitespace match a single space.
+#
+# Dictionaries are JSON, one entry per category:
+#   {"location": {"field": "location", "terms": ["Dry Dock 1", ...]},
+#    "person": {"field": "person_involved", "cues": {"reporter_name": ["reported by"]},
+#               "terms": [...], "aliases": {"Alex S.": "Alex Smith"}, "ignore_case": false}}
+# "cues" assign a different field to mentions preceded by one of the phrases. The file is
+# re-read when it changes on disk (checked at most every check_interval seconds).
+import json
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULT_DICTIONARY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.json")
+
+def is_word_char(char):
+    return char.isalnum() or char == "_"
+
+def normalize_term(term):
+    return " ".join(term.split())
+
+def fold_case(text):
+    # Lowercase with offsets preserved: the few characters that lowercase to several are kept
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+class AhoCorasick:
+    # patterns: {term: payload}. Whitespace in terms is normalized to single spaces.
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for term, payload in patterns.items():
+            term = normalize_term(term)
+            if not term:
+                continue
+            state = 0
+            for char in term:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = next_state
+            self.out[state].append((len(term), payload))
+
+        # Failure links breadth first; each state also reports the matches of its suffixes
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self.goto[state].items():
+                pending.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.out[next_state] = self.out[next_state] + self.out[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        # (start, end, payload) of every occurrence, as offsets into text
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        # Original offset of each character fed to the automaton (whitespace runs fed once)
+        positions = []
+        previous_space = False
+        for index, char in enumerate(text):
+            if char.isspace():
+                if previous_space:
+                    continue
+                char = " "
+                previous_space = True
+            else:
+                previous_space = False
+            positions.append(index)
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in out[state]:
+                yield positions[len(positions) - length], index + 1, payload
+
+class Gazetteer:
+    def __init__(self, path=None, dictionaries=None, check_interval=1.0):
+        # path: a JSON dictionary file (hot-reloaded); dictionaries: the same structure
+        # given directly, used when there's no path
+        if path is None and dictionaries is None:
+            path = DEFAULT_DICTIONARY
+        self.path = path
+        self.dictionaries = dictionaries
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._signature = None
+        self._checked_at = 0.0
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # The automata are rebuilt on first use; the dictionaries travel with the bundle in
+        # case the file isn't there when it's loaded
+        state = self.__dict__.copy()
+        state['_compiled'] = None
+        state['_signature'] = None
+        state['_checked_at'] = 0.0
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def compile(self, dictionaries):
+        # One automaton for the case-sensitive categories, one (over lowercased text) for the rest
+        patterns = {False: {}, True: {}}
+        for category, spec in dictionaries.items():
+            ignore_case = bool(spec.get("ignore_case", False))
+            entries = {term: term for term in spec.get("terms", [])}
+            entries.update(spec.get("aliases", {}))
+            for term, canonical in entries.items():
+                key = normalize_term(fold_case(term) if ignore_case else term)
+                # The first category listing a term keeps it
+                patterns[ignore_case].setdefault(key, (category, canonical))
+        fields = {category: spec.get("field", category) for category, spec in dictionaries.items()}
+        cues = {category: [(field, [normalize_term(fold_case(cue)) for cue in phrases])
+                           for field, phrases in spec.get("cues", {}).items()]
+                for category, spec in dictionaries.items()}
+        automata = {ignore_case: AhoCorasick(terms) for ignore_case, terms in patterns.items() if terms}
+        return automata, fields, cues
+
+    def compiled(self):
+        now = time.monotonic()
+        if self._compiled is not None and (self.path is None or now - self._checked_at < self.check_interval):
+            return self._compiled
+        with self._lock:
+            if self._compiled is None or (self.path is not None and now - self._checked_at >= self.check_interval):
+                self._checked_at = now
+                signature = self.file_signature() if self.path is not None else None
+                if self._compiled is None or (signature is not None and signature != self._signature):
+                    self.reload(signature)
+        return self._compiled
+
+    def reload(self, signature):
+        dictionaries = self.dictionaries
+        if signature is not None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    dictionaries = json.load(f)
+            except (OSError, ValueError) as e:
+                # e.g. caught mid-write: keep what we have and retry on the next check
+                print(f"Could not load gazetteer {self.path}: {e}")
+                if self._compiled is None:
+                    self._compiled = self.compile(dictionaries or {})
+                return
+        # Swapped in as one object, so concurrent readers see the old or the new dictionaries
+        self._compiled = self.compile(dictionaries or {})
+        self.dictionaries = dictionaries
+        self._signature = signature
+        self.reloads += 1
+
+    def find(self, text):
+        # Every mention as (start, end, category, canonical term), leftmost-longest and
+        # non-overlapping
+        if not isinstance(text, str) or not text:
+            return []
+        automata, _, _ = self.compiled()
+        candidates = []
+        for ignore_case, automaton in automata.items():
+            haystack = fold_case(text) if ignore_case else text
+            for start, end, (category, canonical) in automaton.iter_matches(haystack):
+                if start > 0 and is_word_char(text[start - 1]) and is_word_char(text[start]):
+                    continue
+                if end < len(text) and is_word_char(text[end]) and is_word_char(text[end - 1]):
+                    continue
+                candidates.append((start, end, category, canonical))
+
+        candidates.sort(key=lambda match: (match[0], match[0] - match[1]))
+        mentions = []
+        last_end = 0
+        for match in candidates:
+            if match[0] >= last_end:
+                mentions.append(match)
+                last_end = match[1]
+        return mentions
+
+class GazetteerExtractor:
+    # The first mention of each field, like the NER extractors; usable on its own or as an
+    # ensemble voter
+    def __init__(self, path=None, dictionaries=None, check_interval=1.0):
+        self.gazetteer = Gazetteer(path, dictionaries, check_interval)
+
+    def extract(self, text):
+        mentions = self.gazetteer.find(text)
+        if not mentions:
+            return {}
+        _, fields, cues = self.gazetteer.compiled()
+        lowered = None
+        extracted = {}
+        for start, end, category, canonical in mentions:
+            field = fields.get(category, category)
+            for cue_field, phrases in cues.get(category, []):
+                if lowered is None:
+                    lowered = fold_case(text)
+                preceding = " ".join(lowered[max(0, start - 40):start].split())
+                if any(preceding.endswith(phrase) for phrase in phrases):
+                    field = cue_field
+                    break
+            extracted.setdefault(field, canonical)
+        return extracted
+
+    def extract_batch(self, texts, fields=None):
+        results = [self.extract(text) for text in texts]
+        if fields is not None:
+            results = [{field: value for field, value in extracted.items() if field in fields} for extracted in results]
+        return results
+
+    def output_fields(self):
+        # Every category's field, plus the fields its cues can assign
+        _, fields, cues = self.gazetteer.compiled()
+        return set(fields.values()) | {field for category_cues in cues.values() for field, _ in category_cues}
@@ -0,0 +1,201 @@
+# jobs.py
+# Runs extraction outside the Streamlit script so that reruns (any widget interaction)
+# don't abandon it. The manager lives for the whole server process; pages poll it.
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+class Job:
+    def __init__(self, job_id, total, description=""):
+        self.job_id = job_id
+        # The results store's run this job writes to; a resumed job continues its earlier run
+        self.run_id = job_id
+        self.description = description
+        self.total = total
+        self.processed = 0
+        self.resumed_from = 0
+        self.results = []
+        self.errors = 0
+        self.status = PENDING
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def add_results(self, rows, processed):
+        with self._lock:
+            self.results.extend(rows)
+            self.errors += sum(1 for row in rows if 'error' in row)
+            self.processed = processed
+
+    def resume(self, results, processed):
+        with self._lock:
+            self.results = list(results)
+            self.errors = sum(1 for row in results if 'error' in row)
+            self.processed = self.resumed_from = processed
+
+    def snapshot(self, tail=0):
+        # Consistent copy of the progress for rendering; tail limits how many results are copied
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            # Rows restored from a checkpoint took no time in this run
+            rate = (self.processed - self.resumed_from) / elapsed if elapsed > 0 else 0.0
+            remaining = self.total - self.processed
+            return {
+                'job_id': self.job_id,
+                'run_id': self.run_id,
+                'description': self.description,
+                'status': self.status,
+                'error': self.error,
+                'total': self.total,
+                'processed': self.processed,
+                'resumed_from': self.resumed_from,
+                'remaining': remaining,
+                'errors': self.errors,
+                'progress': self.processed / self.total if self.total else 1.0,
+                'elapsed': elapsed,
+                'rate': rate,
+                'eta': remaining / rate if rate > 0 else None,
+                'results_tail': list(self.results[-tail:]) if tail else []
+            }
+
+class JobManager:
+    def __init__(self, max_workers=1, keep_finished=20):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extraction-job")
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, work, total, description=""):
+        # work(job) does the processing, reporting through job.add_results and
+        # returning early once job.cancel_requested is set
+        job = Job(uuid.uuid4().hex[:12], total, description)
+        with self._lock:
+            self.jobs[job.job_id] = job
+            self._prune()
+        self.executor.submit(self._run, job, work)
+        return job.job_id
+
+    def _run(self, job, work):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            work(job)
+            job.status = CANCELLED if job.cancel_requested else COMPLETED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        finished = sorted((job for job in self.jobs.values() if job.status in FINISHED_STATES),
+                          key=lambda job: job.created_at)
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job.job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+def text_preview(text):
+    return text[:100] + '...' if len(text) > 100 else text
+
+def extract_rows(ensemble, batch_df, include_breakdown=False, text_column='text', fields=None):
+    # One result row per input row, as shown in the app and written by the exports.
+    # fields: only extract these (None for all)
+    texts = batch_df[text_column].tolist()
+    try:
+        extractions = ensemble.extract_batch_with_voting(texts, fields=fields)
+    except Exception as e:
+        extractions = [e] * len(texts)
+
+    rows = []
+    for idx, text, extraction in zip(batch_df.index, texts, extractions):
+        if isinstance(extraction, Exception):
+            rows.append({
+                'original_index': idx,
+                'text_preview': str(text)[:100] + '...',
+                'error': str(extraction)
+            })
+            continue
+        final_result, model_predictions = extraction
+        result_row = {
+            'original_index': idx,
+            'text_preview': text_preview(text),
+            **final_result
+        }
+        if include_breakdown:
+            result_row['model_breakdown'] = json.dumps(model_predictions)
+        rows.append(result_row)
+    return rows
+
+def extraction_work(ensemble, df, batch_size, include_breakdown=False, checkpoint=None, fields=None, store=None,
+                    model_version=None, source=None):
+    # Job body for extracting every row of df, batch by batch. With a checkpoint.Checkpoint,
+    # committed batches are skipped and each new batch is committed before it's reported;
+    # the checkpoint is cleared once the last batch is done, so running the same file again
+    # extracts it again instead of replaying the finished run.
+    # With a results_store.ResultsStore, every batch is also inserted there, as a run whose
+    # ID is the job's. A resumed job continues the run its checkpoint was written by: the
+    # restored rows are already stored (all but any batch committed just before the
+    # interruption, which is stored now), so they aren't inserted again.
+    def work(job):
+        start, results = checkpoint.load() if checkpoint is not None else (0, [])
+        if start:
+            job.resume(results, start)
+        if store is not None:
+            input_key = checkpoint.key if checkpoint is not None else None
+            unfinished = store.unfinished_run(input_key) if start else None
+            stored = 0
+            if unfinished is not None:
+                job.run_id, stored = unfinished
+            store.start_run(job.run_id, model_version, source, fields, input_key)
+            store.add(job.run_id, results[stored:], source)
+        try:
+            process(job, start)
+        except Exception:
+            if store is not None:
+                store.finish_run(job.run_id, FAILED)
+            raise
+        if store is not None:
+            store.finish_run(job.run_id, CANCELLED if job.cancel_requested else COMPLETED)
+
+    def process(job, start):
+        for start in range(start, len(df), batch_size):
+            if job.cancel_requested:
+                return
+            end = min(start + batch_size, len(df))
+            rows = extract_rows(ensemble, df.iloc[start:end], include_breakdown, fields=fields)
+            if checkpoint is not None:
+                checkpoint.commit(end, rows)
+            if store is not None:
+                store.add(job.run_id, rows, source)
+            job.add_results(rows, end)
+        if checkpoint is not None:
+            checkpoint.clear()
+    return work
@@ -0,0 +1,299 @@
+# results_store.py
+# Extraction results of every run in one local SQLite database, so past runs can be
+# filtered and aggregated without loading them. The database is in WAL mode: the app's
+# job thread (or extract.py) inserts while pages query. Each batch is one transaction
+# and every row is tagged with its run; runs record the model version that produced them.
+# A run started from a checkpoint keeps the checkpoint's key, so resuming it continues the
+# same run instead of storing the restored rows again.
+# The filterable columns are indexed, and incident dates are also stored as ISO
+# (YYYY-MM-DD) so date ranges are index range scans.
+#   python results_store.py runs
+#   python results_store.py query --department Logistics --group-by location
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dates import DateNormalizer
+from extract import RESULT_FIELDS
+
+RESULTS_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.db")
+
+# Columns filtered by value; incident_day (the ISO form of incident_date) is filtered by
+# range. Each of the indexed columns leads one index.
+FILTER_COLUMNS = ['department', 'location', 'label', 'was_injured']
+INDEXED_COLUMNS = FILTER_COLUMNS + ['incident_day', 'run_id']
+GROUP_COLUMNS = {
+    'department': "department",
+    'location': "location",
+    'label': "label",
+    'was_injured': "was_injured",
+    'incident_month': "substr(incident_day, 1, 7)",
+    'incident_day': "incident_day",
+    'run_id': "run_id",
+}
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS runs (
+        run_id TEXT PRIMARY KEY,
+        model_version TEXT,
+        source TEXT,
+        fields TEXT,
+        input_key TEXT,
+        status TEXT,
+        started_at REAL,
+        finished_at REAL,
+        rows INTEGER NOT NULL DEFAULT 0,
+        errors INTEGER NOT NULL DEFAULT 0,
+        field_counts TEXT NOT NULL DEFAULT '{}'
+    )""",
+    f"""CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY,
+        run_id TEXT NOT NULL,
+        source TEXT,
+        original_index INTEGER,
+        text_preview TEXT,
+        {', '.join(f'{field} TEXT' for field in RESULT_FIELDS)},
+        incident_day TEXT,
+        error TEXT
+    )""",
+] + [
+    # One index led by each filterable column, holding all of them: a filtered count or
+    # group-by is then a range search of one index, never reading the table
+    f"CREATE INDEX IF NOT EXISTS results_{column} ON results "
+    f"({', '.join([column] + [other for other in INDEXED_COLUMNS if other != column])})"
+    for column in INDEXED_COLUMNS
+]
+
+RESULT_COLUMNS = ['run_id', 'source', 'original_index', 'text_preview'] + RESULT_FIELDS + ['incident_day', 'error']
+
+def bundle_version(path):
+    # A saved bundle's model version: its directory name and when it was saved
+    for name in ("student.pkl", "ensemble.pkl"):
+        model_file = os.path.join(path, name)
+        if os.path.exists(model_file):
+            saved = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(os.path.getmtime(model_file)))
+            return f"{os.path.basename(os.path.normpath(path))} ({saved})"
+    return os.path.basename(os.path.normpath(path))
+
+def cell(value):
+    # Result values as stored: text, or NULL for missing ones (NaN included)
+    if value is None or value != value:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    return value if isinstance(value, (str, int)) else str(value)
+
+class ResultsStore:
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        # The dates are day-first ("03/04/2024" is 3 April), as in the reports
+        self.normalizer = DateNormalizer(output_format="%Y-%m-%d", dayfirst=True)
+        self._writer = self.connect()
+        self._reader = self.connect()
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        with self._write_lock, self._writer:
+            for statement in SCHEMA:
+                self._writer.execute(statement)
+            # Databases created before runs had input_key
+            columns = [row[1] for row in self._writer.execute("PRAGMA table_info(runs)")]
+            if 'input_key' not in columns:
+                self._writer.execute("ALTER TABLE runs ADD COLUMN input_key TEXT")
+
+    def connect(self):
+        # Long-lived connections, one for writes and one for queries, each used by one thread
+        # at a time: in WAL mode queries don't wait for a batch being written, and both keep
+        # their page caches warm across app reruns
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Durable at every checkpoint; a crash can lose at most the last transactions
+        connection.execute("PRAGMA synchronous=NORMAL")
+        # Inserts touch every index at random places; keep their pages cached (64 MB)
+        connection.execute("PRAGMA cache_size=-65536")
+        return connection
+
+    def read(self, sql, params=()):
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def read_frame(self, sql, params=()):
+        import pandas as pd
+
+        with self._read_lock:
+            return pd.read_sql_query(sql, self._reader, params=params)
+
+    # Writing
+
+    def start_run(self, run_id, model_version=None, source=None, fields=None, input_key=None):
+        # Starting a run that exists (a resumed one) marks it running again and keeps its
+        # rows and totals
+        with self._write_lock, self._writer as connection:
+            connection.execute(
+                "INSERT INTO runs (run_id, model_version, source, fields, input_key, status, started_at) "
+                "VALUES (?, ?, ?, ?, ?, 'running', ?) "
+                "ON CONFLICT (run_id) DO UPDATE SET model_version = excluded.model_version, "
+                "source = excluded.source, fields = excluded.fields, input_key = excluded.input_key, "
+                "status = 'running', finished_at = NULL",
+                (run_id, model_version, source, json.dumps(sorted(fields)) if fields is not None else None,
+                 input_key, time.time()))
+
+    def unfinished_run(self, input_key):
+        # (run_id, rows stored) of the latest run with this input_key that didn't complete,
+        # or None
+        found = self.read("SELECT run_id, rows FROM runs WHERE input_key = ? AND status != 'completed' "
+                          "ORDER BY started_at DESC LIMIT 1", (input_key,))
+        return tuple(found[0]) if found else None
+
+    def add(self, run_id, rows, source=None):
+        # rows: result rows as built by jobs.extract_rows. One transaction per call, and the
+        # run's totals are updated in the same one.
+        if not rows:
+            return
+        days = self.normalizer.normalize_batch([row.get('incident_date') for row in rows])
+        values = []
+        field_counts = {}
+        for row, day in zip(rows, days):
+            record = dict(row, run_id=run_id, incident_day=day)
+            record.setdefault('source', source)
+            values.append(tuple(cell(record.get(column)) for column in RESULT_COLUMNS))
+            for field in RESULT_FIELDS:
+                if cell(row.get(field)) is not None:
+                    field_counts[field] = field_counts.get(field, 0) + 1
+        errors = sum(1 for row in rows if cell(row.get('error')) is not None)
+
+        with self._write_lock, self._writer as connection:
+            connection.executemany(
+                f"INSERT INTO results ({', '.join(RESULT_COLUMNS)}) VALUES ({', '.join('?' * len(RESULT_COLUMNS))})",
+                values)
+            stored = connection.execute("SELECT field_counts FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            totals = json.loads(stored[0]) if stored else {}
+            for field, count in field_counts.items():
+                totals[field] = totals.get(field, 0) + count
+            connection.execute(
+                "INSERT INTO runs (run_id, rows, errors, field_counts) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (run_id) DO UPDATE SET rows = rows + excluded.rows, "
+                "errors = errors + excluded.errors, field_counts = excluded.field_counts",
+                (run_id, len(rows), errors, json.dumps(totals)))
+
+    def finish_run(self, run_id, status):
+        with self._write_lock, self._writer as connection:
+            connection.execute("UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?",
+                               (status, time.time(), run_id))
+            # Refreshes the planner's statistics if the run changed them enough to matter
+            connection.execute("PRAGMA optimize")
+
+    def delete_run(self, run_id):
+        with self._write_lock, self._writer as connection:
+            connection.execute("DELETE FROM results WHERE run_id = ?", (run_id,))
+            connection.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    # Reading
+
+    def runs(self):
+        return self.read_frame("SELECT run_id, model_version, source, status, rows, errors, started_at, "
+                               "finished_at FROM runs ORDER BY started_at DESC")
+
+    def run_stats(self, run_id):
+        # A run's row/error totals and non-empty count per field, kept up to date by add()
+        found = self.read("SELECT rows, errors, field_counts FROM runs WHERE run_id = ?", (run_id,))
+        if not found:
+            return None
+        rows, errors, field_counts = found[0]
+        return {'rows': rows, 'errors': errors, 'field_counts': json.loads(field_counts)}
+
+    def values(self, column):
+        # Distinct values of an indexed column, one index seek each (a plain DISTINCT would
+        # read the whole index)
+        if column not in FILTER_COLUMNS + ['run_id']:
+            raise ValueError(f"Not an indexed column: {column}")
+        values = []
+        value = self.read(f"SELECT MIN({column}) FROM results")[0][0]
+        while value is not None:
+            values.append(value)
+            value = self.read(f"SELECT MIN({column}) FROM results WHERE {column} > ?", (value,))[0][0]
+        return values
+
+    def where(self, filters=None, run_ids=None, date_from=None, date_to=None):
+        # filters: {column: [allowed values]}; dates are ISO strings or datetime.date
+        clauses, params = [], []
+        for column, allowed in (filters or {}).items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Not a filterable column: {column}")
+            if allowed:
+                clauses.append(f"{column} IN ({', '.join('?' * len(allowed))})")
+                params.extend(allowed)
+        if run_ids:
+            clauses.append(f"run_id IN ({', '.join('?' * len(run_ids))})")
+            params.extend(run_ids)
+        if date_from is not None:
+            clauses.append("incident_day >= ?")
+            params.append(str(date_from))
+        if date_to is not None:
+            clauses.append("incident_day <= ?")
+            params.append(str(date_to))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, filters=None, run_ids=None, date_from=None, date_to=None):
+        if not any((filters or {}).values()) and date_from is None and date_to is None:
+            # Whole runs: their totals, instead of counting through an index
+            where, params = self.where(run_ids=run_ids)
+            return self.read(f"SELECT SUM(rows) FROM runs{where}", params)[0][0] or 0
+        where, params = self.where(filters, run_ids, date_from, date_to)
+        return self.read(f"SELECT COUNT(*) FROM results{where}", params)[0][0]
+
+    def aggregate(self, group_by, **conditions):
+        # Matching rows per value of group_by (a GROUP_COLUMNS key), most first
+        expression = GROUP_COLUMNS[group_by]
+        where, params = self.where(**conditions)
+        return self.read_frame(f"SELECT {expression} AS {group_by}, COUNT(*) AS rows FROM results{where} "
+                               f"GROUP BY {expression} ORDER BY rows DESC", params)
+
+    def query(self, limit=1000, **conditions):
+        # The matching rows themselves, newest first
+        where, params = self.where(**conditions)
+        return self.read_frame(f"SELECT {', '.join(RESULT_COLUMNS)} FROM results{where} ORDER BY id DESC LIMIT ?",
+                               params + [limit])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the extraction results database")
+    parser.add_argument("--db", default=RESULTS_DB)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("runs", help="List the stored runs")
+    query_parser = subparsers.add_parser("query", help="Count (or group) the stored results matching filters")
+    for column in FILTER_COLUMNS:
+        query_parser.add_argument(f"--{column.replace('_', '-')}", nargs="+")
+    query_parser.add_argument("--run", nargs="+", help="Run IDs (default: all runs)")
+    query_parser.add_argument("--date-from", help="Earliest incident date (YYYY-MM-DD)")
+    query_parser.add_argument("--date-to", help="Latest incident date (YYYY-MM-DD)")
+    query_parser.add_argument("--group-by", choices=list(GROUP_COLUMNS))
+    query_parser.add_argument("--rows", type=int, default=0, help="Also show this many matching rows")
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.db)
+    if args.command == "runs":
+        print(store.runs().to_string(index=False))
+        return
+
+    conditions = {
+        'filters': {column: getattr(args, column) for column in FILTER_COLUMNS if getattr(args, column)},
+        'run_ids': args.run,
+        'date_from': args.date_from,
+        'date_to': args.date_to,
+    }
+    start = time.perf_counter()
+    if args.group_by:
+        print(store.aggregate(args.group_by, **conditions).to_string(index=False))
+    else:
+        print(f"{store.count(**conditions):,} matching rows")
+    print(f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+    if args.rows:
+        print(store.query(limit=args.rows, **conditions).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
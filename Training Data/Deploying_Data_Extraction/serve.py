@@ -0,0 +1,194 @@
+# serve.py
+# Local HTTP extraction service around a saved model bundle:
+#   python serve.py --model models/ensemble --port 8765
+#   curl -d '{"text": "..."}' localhost:8765/extract
+# Concurrent requests are gathered into micro-batches so each one gets the batched
+# extraction path rather than its own extract_with_voting call.
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from checkpoint import to_json
+from deadlines import Deadline
+
+class MicroBatcher:
+    # Requests wait up to max_wait_ms for others to join their batch; a batch is run as
+    # soon as it has max_batch texts. One thread runs the batches, in arrival order.
+    # budget_ms is a latency budget counted from when the batch's oldest request arrived:
+    # extractors that wouldn't finish in time are skipped and the results marked degraded.
+    # Requests for a subset of the fields are extracted together with the others asking
+    # for the same fields.
+    def __init__(self, ensemble, max_batch=32, max_wait_ms=10, budget_ms=None):
+        self.ensemble = ensemble
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.budget = budget_ms / 1000 if budget_ms else None
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._stats_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, text, fields=None):
+        future = Future()
+        self.queue.put((text, future, time.perf_counter(), tuple(sorted(fields)) if fields is not None else None))
+        return future
+
+    def extract(self, texts, timeout=None, fields=None):
+        futures = [self.submit(text, fields) for text in texts]
+        return [future.result(timeout) for future in futures]
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            deadline = Deadline(self.budget, start=batch[0][2]) if self.budget else None
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[3], []).append(item)
+            for fields, group in groups.items():
+                self._run_group(group, deadline, fields)
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+
+    def _run_group(self, group, deadline, fields):
+        texts = [text for text, _, _, _ in group]
+        try:
+            results = self.ensemble.extract_batch_with_voting(texts, deadline=deadline, fields=fields)
+        except Exception as e:
+            for _, future, _, _ in group:
+                future.set_exception(e)
+            return
+        for (_, future, _, _), result in zip(group, results):
+            future.set_result(result)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+                'queued': self.queue.qsize(),
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000,
+                'budget_ms': self.budget * 1000 if self.budget else None,
+                'extractors': self.ensemble.deadline_stats(),
+            }
+
+class ExtractionHandler(BaseHTTPRequestHandler):
+    # POST /extract with {"text": ...} or {"texts": [...]}; add "include_breakdown": true
+    # for each model's predictions, "fields": [...] to extract only those. GET /health and /stats.
+    batcher = None
+    timeout = 60
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, default=to_json).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self.send_json(200, self.batcher.stats())
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/extract":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            single = "texts" not in request
+            texts = [request["text"]] if single else request["texts"]
+            if not isinstance(texts, list):
+                raise ValueError("texts must be a list")
+            if not all(isinstance(text, str) for text in texts):
+                raise ValueError("texts must be strings")
+            fields = request.get("fields")
+            if fields is not None and not (isinstance(fields, list) and all(isinstance(f, str) for f in fields)):
+                raise ValueError("fields must be a list of strings")
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": f"bad request: {e}"})
+            return
+
+        try:
+            extractions = self.batcher.extract(texts, timeout=self.timeout, fields=fields)
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+
+        results = []
+        for final_result, predictions in extractions:
+            result = {"result": final_result}
+            if request.get("include_breakdown"):
+                result["model_breakdown"] = predictions
+            results.append(result)
+        self.send_json(200, results[0] if single else {"results": results})
+
+    def log_message(self, format, *args):
+        # Per-request access logging would dominate the cost of a small extraction
+        pass
+
+class ExtractionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 drops connections (1s+ client retries) under bursts
+    request_queue_size = 256
+
+def make_server(ensemble, host="127.0.0.1", port=8765, max_batch=32, max_wait_ms=10, budget_ms=None):
+    batcher = MicroBatcher(ensemble, max_batch, max_wait_ms, budget_ms)
+    handler = type("Handler", (ExtractionHandler,), {"batcher": batcher})
+    return ExtractionServer((host, port), handler)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the extraction ensemble over HTTP with micro-batching")
+    parser.add_argument("--model", required=True, help="Model bundle directory saved by train.py or distill.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=32, help="Most texts per extraction batch")
+    parser.add_argument("--max-wait-ms", type=float, default=10,
+                        help="How long a request waits for others to share its batch")
+    parser.add_argument("--budget-ms", type=float,
+                        help="Latency budget per request; slow extractors are skipped to meet it")
+    args = parser.parse_args(argv)
+
+    from extractors import load_bundle
+
+    ensemble = load_bundle(args.model)
+    ensemble.warm_up()
+    server = make_server(ensemble, args.host, args.port, args.max_batch, args.max_wait_ms, args.budget_ms)
+    budget = f", budget {args.budget_ms} ms" if args.budget_ms else ""
+    print(f"Serving {args.model} on http://{args.host}:{server.server_port} "
+          f"(max batch {args.max_batch}, max wait {args.max_wait_ms} ms{budget})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
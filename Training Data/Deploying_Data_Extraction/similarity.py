@@ -0,0 +1,277 @@
+# similarity.py
+# Persistent "most similar past incidents" index over processed reports:
+#   python similarity.py add --index similarity_index --input reports.csv
+#   python similarity.py query --index similarity_index --text "Worker fell from ladder" -k 5
+# Reports are featurized like the extractors' incremental classifiers (hashed word n-grams,
+# so inserts never need a refit), weighted by tf-idf and l2-normalized, so a dot product is
+# the cosine similarity. Each insert writes a segment: an inverted index (per feature, the
+# documents containing it and their weights) saved as .npy files and loaded memory-mapped.
+# A query only reads the postings of its own terms, not every stored row.
+# Several processes can share an index directory (the app and the CLI): writers take an
+# exclusive lock on its lock file and re-read meta.json before changing it, and readers
+# pick up segments written by others before each search.
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock
+    fcntl = None
+
+from checkpoint import to_json
+from text_analysis import NgramAnalyzer, analyze_batch
+
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "similarity_index")
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        self.indptr = self.load("indptr.npy")
+        self.docs = self.load("docs.npy")
+        self.values = self.load("values.npy")
+        self.offsets = self.load("offsets.npy")
+        self.size = len(self.offsets) - 1
+
+    def load(self, name):
+        # Still backed by the mapped file, but slices are plain arrays (np.memmap slicing is
+        # slow enough to matter at a few hundred slices per query)
+        return np.load(os.path.join(self.path, name), mmap_mode="r").view(np.ndarray)
+
+    @staticmethod
+    def write(path, matrix, records):
+        # matrix: documents x features (csr); stored by feature (csc) as the postings lists
+        os.makedirs(path)
+        postings = matrix.tocsc()
+        postings.sort_indices()
+        np.save(os.path.join(path, "indptr.npy"), postings.indptr.astype(np.int64))
+        np.save(os.path.join(path, "docs.npy"), postings.indices.astype(np.int32))
+        np.save(os.path.join(path, "values.npy"), postings.data.astype(np.float32))
+        # Records as JSON lines plus their byte offsets, so hits are read without loading the file
+        offsets = [0]
+        with open(os.path.join(path, "records.jsonl"), "wb") as f:
+            for record in records:
+                line = (json.dumps(record, default=to_json) + "\n").encode("utf-8")
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.save(os.path.join(path, "offsets.npy"), np.array(offsets, dtype=np.int64))
+
+    def scores(self, indices, weights, max_df=None):
+        # Cosine similarity of the query to every document of the segment
+        starts, ends = self.indptr[indices], self.indptr[indices + 1]
+        max_postings = max_df * self.size if max_df is not None else self.size
+        docs, values = [], []
+        for start, end, weight in zip(starts.tolist(), ends.tolist(), weights.tolist()):
+            if end == start or end - start > max_postings:
+                continue
+            docs.append(self.docs[start:end])
+            values.append(self.values[start:end] * weight)
+        if not docs:
+            return np.zeros(self.size, dtype=np.float32)
+        return np.bincount(np.concatenate(docs), np.concatenate(values), minlength=self.size)
+
+    def matrix(self):
+        from scipy.sparse import csc_matrix
+
+        return csc_matrix((self.values, self.docs, self.indptr), shape=(self.size, len(self.indptr) - 1)).tocsr()
+
+    def records(self, positions):
+        with open(os.path.join(self.path, "records.jsonl"), "rb") as f:
+            result = []
+            for position in positions:
+                f.seek(self.offsets[position])
+                result.append(json.loads(f.read(self.offsets[position + 1] - self.offsets[position])))
+        return result
+
+    def all_records(self):
+        with open(os.path.join(self.path, "records.jsonl"), encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+class SimilarityIndex:
+    # Appends are durable once add() returns; segments are merged into one when there are
+    # more than max_segments, so queries don't slow down as small inserts pile up.
+    def __init__(self, path=INDEX_DIR, n_features=2 ** 18, ngram_range=(1, 2), max_segments=8):
+        self.path = path
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self.meta = {"n_features": n_features, "ngram_range": list(ngram_range), "segments": [], "next_segment": 0}
+        self.idf = None
+        self.segments = []
+        self._signature = None
+        self.refresh()
+        self.vectorizer = self.make_vectorizer()
+
+    def meta_signature(self):
+        try:
+            stat = os.stat(os.path.join(self.path, "meta.json"))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def refresh(self):
+        # Picks up what other processes have written since meta.json was last read (a stat
+        # when nothing has changed). Segments already open are kept.
+        signature = self.meta_signature()
+        if signature is None or signature == self._signature:
+            return
+        with open(os.path.join(self.path, "meta.json")) as f:
+            meta = json.load(f)
+        if self.idf is None:
+            self.idf = np.load(os.path.join(self.path, "idf.npy"))
+        opened = {os.path.basename(segment.path): segment for segment in self.segments}
+        self.segments = [opened.get(name) or Segment(os.path.join(self.path, name)) for name in meta["segments"]]
+        self.meta = meta
+        self._signature = signature
+
+    @contextmanager
+    def writing(self):
+        # Exclusive across threads and processes, with meta up to date inside
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, "lock"), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self.refresh()
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def make_vectorizer(self):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        return HashingVectorizer(n_features=self.meta["n_features"], analyzer=NgramAnalyzer(self.meta["ngram_range"]),
+                                 alternate_sign=False, norm=None)
+
+    def __len__(self):
+        return sum(segment.size for segment in self.segments)
+
+    def features(self, texts):
+        from sklearn.preprocessing import normalize
+
+        counts = self.vectorizer.transform(analyze_batch(texts)).tocsr()
+        counts.data = np.log(counts.data) + 1
+        return normalize(counts.multiply(self.idf).tocsr(), copy=False).astype(np.float32)
+
+    def fit_idf(self, texts):
+        # Fixed by the first insert so stored weights never go stale; terms first seen later
+        # get the highest weight
+        counts = self.vectorizer.transform(analyze_batch(texts))
+        df = np.bincount(counts.indices, minlength=self.meta["n_features"])
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+        np.save(os.path.join(self.path, "idf.npy"), self.idf)
+
+    def save_meta(self):
+        temp = os.path.join(self.path, "meta.json.tmp")
+        with open(temp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(temp, os.path.join(self.path, "meta.json"))
+        self._signature = self.meta_signature()
+
+    def new_segment_path(self):
+        name = f"segment-{self.meta['next_segment']:06d}"
+        self.meta["next_segment"] += 1
+        return name, os.path.join(self.path, name)
+
+    def add(self, texts, records=None):
+        # records: one JSON-serializable dict per text, returned with query hits (default:
+        # the text itself)
+        texts = ["" if text is None else str(text) for text in texts]
+        records = [{"text": text} for text in texts] if records is None else list(records)
+        if not texts:
+            return
+        with self.writing():
+            if self.idf is None:
+                self.fit_idf(texts)
+            name, path = self.new_segment_path()
+            Segment.write(path, self.features(texts), records)
+            self.meta["segments"].append(name)
+            self.segments.append(Segment(path))
+            self.save_meta()
+            if len(self.segments) > self.max_segments:
+                self._compact()
+
+    def compact(self):
+        with self.writing():
+            self._compact()
+
+    def _compact(self):
+        from scipy.sparse import vstack
+
+        if len(self.segments) < 2:
+            return
+        old = self.segments
+        name, path = self.new_segment_path()
+        Segment.write(path, vstack([segment.matrix() for segment in old]).tocsr(),
+                      [record for segment in old for record in segment.all_records()])
+        self.segments = [Segment(path)]
+        self.meta["segments"] = [name]
+        self.save_meta()
+        for segment in old:
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    def search(self, text, k=10, max_df=None):
+        # The k most similar indexed reports as (cosine similarity, record), best first.
+        # max_df (a fraction) skips terms found in more of the reports than that: faster on
+        # huge indexes, at the cost of exactness.
+        self.refresh()
+        if self.idf is None:
+            return []
+        query = self.features([text])
+        indices, weights = query.indices.astype(np.int64), query.data
+        candidates = []
+        for segment in list(self.segments):
+            scores = segment.scores(indices, weights, max_df)
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k] if len(scores) > k else np.arange(len(scores))
+            candidates.extend((float(scores[i]), segment, int(i)) for i in top if scores[i] > 0)
+        candidates.sort(key=lambda candidate: -candidate[0])
+        hits = []
+        for score, segment, position in candidates[:k]:
+            hits.append((score, segment.records([position])[0]))
+        return hits
+
+def main(argv=None):
+    from corpus import part_files, read_chunks
+
+    parser = argparse.ArgumentParser(description="Similar-incident search over processed reports")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser("add", help="Index the reports of csv/jsonl/parquet files")
+    add_parser.add_argument("--index", default=INDEX_DIR)
+    add_parser.add_argument("--input", nargs="+", required=True)
+    add_parser.add_argument("--text-column", default="text")
+    add_parser.add_argument("--chunksize", type=int, default=100000, help="Reports per inserted segment")
+    query_parser = subparsers.add_parser("query", help="Most similar indexed reports to a text")
+    query_parser.add_argument("--index", default=INDEX_DIR)
+    query_parser.add_argument("--text", required=True)
+    query_parser.add_argument("-k", type=int, default=5)
+    query_parser.add_argument("--max-df", type=float, help="Skip terms in more than this fraction of reports")
+    args = parser.parse_args(argv)
+
+    index = SimilarityIndex(args.index)
+    if args.command == "add":
+        for path in args.input:
+            offset = 0
+            for part in part_files(path):
+                for chunk in read_chunks(part, args.chunksize, columns=[args.text_column]):
+                    texts = chunk[args.text_column].fillna("").astype(str).tolist()
+                    records = [{"source": os.path.basename(path), "original_index": offset + i, "text": text}
+                               for i, text in enumerate(texts)]
+                    index.add(texts, records)
+                    offset += len(texts)
+                    print(f"{path}: indexed {offset} reports ({len(index)} in the index)")
+    else:
+        start = time.perf_counter()
+        hits = index.search(args.text, args.k, args.max_df)
+        print(f"{len(hits)} hits from {len(index)} reports in {(time.perf_counter() - start) * 1000:.1f} ms")
+        for score, record in hits:
+            print(f"{score:.3f}  {json.dumps(record, default=to_json)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# test_deadlines.py
+# python -m pytest test_deadlines.py
+from deadlines import PROBE_EVERY, Deadline, ExtractorCosts, RowBudgets, run_within
+
+def counting_batch(calls):
+    def run_batch(texts):
+        calls.append(len(texts))
+        return [{}] * len(texts)
+    return run_batch
+
+def test_recovers_after_a_spike_with_a_deadline():
+    # One 1 s call on 100 characters puts the estimate for an 80-character text above the
+    # budget; probes re-measure it and it's admitted again
+    costs = ExtractorCosts()
+    costs.record('x', 1.0, 100)
+    calls = []
+    for _ in range(1000):
+        run_within('x', counting_batch(calls), ['a' * 80], Deadline(0.5), costs)
+    assert sum(calls) > 800
+    assert costs.skipped['x'] < 4 * PROBE_EVERY
+    assert costs.estimate('x', 80) < 0.5
+
+def test_recovers_after_a_spike_with_row_budgets():
+    costs = ExtractorCosts()
+    costs.record('x', 1.0, 100)
+    calls = []
+    for _ in range(1000):
+        run_within('x', counting_batch(calls), ['a' * 80] * 4, None, costs, row_budgets=RowBudgets(0.5, 4))
+    assert sum(calls) > 3500
+    assert costs.estimate('x', 80) < 0.5
+
+def test_row_budgets_are_charged_the_measured_time():
+    # The estimate says 1 s a text, but the run takes next to nothing: the rows keep their time
+    costs = ExtractorCosts()
+    costs.record('x', 2.0, 2)
+    budgets = RowBudgets(1.0, 2)
+    run_within('x', counting_batch([]), ['a', 'b'], None, costs, row_budgets=budgets)
+    assert all(remaining > 0.9 for remaining in budgets.remaining)
+
+def test_probe_doesnt_run_before_it_is_due():
+    costs = ExtractorCosts()
+    costs.record('x', 1.0, 1)
+    calls = []
+    for _ in range(PROBE_EVERY - 1):
+        run_within('x', counting_batch(calls), ['a'], Deadline(0.5), costs)
+    assert calls == []
+    run_within('x', counting_batch(calls), ['a'], Deadline(0.5), costs)
+    assert calls == [1]
@@ -0,0 +1,80 @@
+# text_analysis.py
+# Tokenize once per row: a TextAnalysis is the row's text (it is a str, so anything that
+# takes text still works) that also caches the lowercase form, word tokens, whitespace
+# words, sentence splits and n-grams the first time an extractor asks for them. The
+# ensemble wraps each batch once and every extractor reuses the same work.
+import re
+
+# TfidfVectorizer's default token_pattern
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+SENTENCE_BOUNDARY = re.compile(r'[.!?]+')
+
+class TextAnalysis(str):
+    def lower(self):
+        # Cached, so sklearn's default preprocessing and every extractor share one copy
+        value = self.__dict__.get('_lower')
+        if value is None:
+            value = self.__dict__['_lower'] = str.lower(self)
+        return value
+
+    def tokens(self, token_pattern=TOKEN_PATTERN):
+        # Word tokens of the lowercase text, as TfidfVectorizer's analyzer finds them
+        cache = self.__dict__.setdefault('_tokens', {})
+        if token_pattern not in cache:
+            cache[token_pattern] = re.findall(token_pattern, self.lower())
+        return cache[token_pattern]
+
+    @property
+    def words(self):
+        # Whitespace-separated words (text.split())
+        if '_words' not in self.__dict__:
+            self.__dict__['_words'] = self.split()
+        return self.__dict__['_words']
+
+    @property
+    def sentences(self):
+        # Pieces between sentence punctuation (re.split on [.!?]+)
+        if '_sentences' not in self.__dict__:
+            self.__dict__['_sentences'] = SENTENCE_BOUNDARY.split(self)
+        return self.__dict__['_sentences']
+
+    def ngrams(self, ngram_range=(1, 1), token_pattern=TOKEN_PATTERN):
+        cache = self.__dict__.setdefault('_ngrams', {})
+        key = (tuple(ngram_range), token_pattern)
+        if key not in cache:
+            cache[key] = word_ngrams(self.tokens(token_pattern), ngram_range)
+        return cache[key]
+
+def word_ngrams(tokens, ngram_range):
+    # Same terms, in the same order, as sklearn's word n-gram analyzer
+    min_n, max_n = ngram_range
+    if max_n == 1:
+        return tokens
+    terms = list(tokens) if min_n == 1 else []
+    for n in range(max(min_n, 2), max_n + 1):
+        terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return terms
+
+def analyze(text):
+    # Non-strings (e.g. NaN cells) are passed through for the extractors to reject as before
+    if isinstance(text, TextAnalysis) or not isinstance(text, str):
+        return text
+    return TextAnalysis(text)
+
+def analyze_batch(texts):
+    return [analyze(text) for text in texts]
+
+def plain_text(text):
+    # spaCy's Cython tokenizer only accepts exact str instances
+    return str.__str__(text) if isinstance(text, TextAnalysis) else text
+
+class NgramAnalyzer:
+    # Callable analyzer for the vectorizers: gives the default word analyzer's terms
+    # (lowercase, token_pattern, n-grams) but reuses a TextAnalysis's cached ones.
+    # A class rather than a closure so fitted vectorizers stay picklable.
+    def __init__(self, ngram_range=(1, 1), token_pattern=TOKEN_PATTERN):
+        self.ngram_range = tuple(ngram_range)
+        self.token_pattern = token_pattern
+
+    def __call__(self, text):
+        return analyze(text).ngrams(self.ngram_range, self.token_pattern)
@@ -0,0 +1,96 @@
+# train.py
+import argparse
+import os
+import resource
+import sys
+import time
+
+from corpus import STRUCTURED_FILE, LabelledCorpus, annotation_file, part_files
+from extractors import EnsembleVotingExtractor
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the extraction ensemble and save it as a model bundle")
+    parser.add_argument("--texts", required=True,
+                        help="CSV/Parquet with the report texts, or a directory of generator shards")
+    parser.add_argument("--text-column", default="full_text")
+    parser.add_argument("--labels", default=STRUCTURED_FILE,
+                        help="Row-aligned labels CSV; pass 'none' if the labels are columns of --texts")
+    parser.add_argument("--annotations", help="Entity offsets sidecar of a single-file corpus, or 'auto' for each part's own "
+                             "(default: 'auto' if every part has one)")
+    parser.add_argument("--output", required=True, help="Model bundle directory")
+    parser.add_argument("--mode", choices=["full", "streaming", "update"], default="streaming",
+                        help="full: in-memory train_all_models; streaming: out-of-core training; "
+                             "update: fold new rows into an existing incremental bundle")
+    parser.add_argument("--chunksize", type=int, default=10000)
+    parser.add_argument("--spacy-model", default="en_core_web_sm")
+    parser.add_argument("--spacy-iter", type=int, default=30)
+    parser.add_argument("--spacy-cache-dir", help="Directory for cached DocBin training corpora")
+    parser.add_argument("--advanced-sample-size", type=int, default=20000)
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Processes fitting the per-field forests; they share one memory-mapped feature matrix")
+    parser.add_argument("--rebuild-every", type=int, help="Updates allowed before a full rebuild is due")
+    parser.add_argument("--transformer-model",
+                        help="Fine-tuned token-classification checkpoint to add as a fifth voter (CPU, not trained here)")
+    parser.add_argument("--transformer-quantize", action="store_true", help="int8 dynamic quantization")
+    parser.add_argument("--transformer-threads", type=int, help="torch intra-op threads")
+    parser.add_argument("--gazetteer", nargs="?", const="gazetteer.json",
+                        help="Add dictionary matching as a voter (default dictionary: gazetteer.json); "
+                             "the file is re-read when it changes")
+    parser.add_argument("--fast-predict", action="store_true",
+                        help="Save the TF-IDF classifiers in their NumPy form (same predictions, "
+                             "much cheaper per call, but the bundle can't be updated)")
+    args = parser.parse_args(argv)
+
+    labels_path = None if args.labels == "none" else args.labels
+    annotations_path = args.annotations
+    if annotations_path is None and all(os.path.exists(annotation_file(part)) for part in part_files(args.texts)):
+        annotations_path = "auto"
+    corpus = LabelledCorpus(args.texts, labels_path=labels_path, text_column=args.text_column,
+                            chunksize=args.chunksize, annotations_path=annotations_path)
+
+    start = time.time()
+    if args.mode == "update":
+        ensemble = EnsembleVotingExtractor.load(args.output)
+        for texts, labels, _ in corpus:
+            ensemble.update_models(texts, labels)
+        if ensemble.needs_rebuild():
+            print("A full rebuild is due: rerun with --mode streaming over the full labelled history")
+    else:
+        ensemble = EnsembleVotingExtractor(
+            spacy_kwargs={"model": args.spacy_model, "exclude_unused": True},
+            incremental=args.mode == "streaming",
+            rebuild_every=args.rebuild_every,
+            transformer_kwargs={"model_dir": os.path.abspath(args.transformer_model),
+                                "quantize": args.transformer_quantize,
+                                "num_threads": args.transformer_threads} if args.transformer_model else None,
+            gazetteer_kwargs={"path": os.path.abspath(args.gazetteer)} if args.gazetteer else None,
+        )
+        if args.mode == "streaming":
+            ensemble.train_streaming(corpus, spacy_n_iter=args.spacy_iter, spacy_cache_dir=args.spacy_cache_dir,
+                                     advanced_sample_size=args.advanced_sample_size, n_jobs=args.jobs)
+        else:
+            train_texts, train_labels, train_annotations = [], [], []
+            for texts, labels, annotations in corpus:
+                train_texts.extend(texts)
+                train_labels.extend(labels)
+                if annotations_path:
+                    train_annotations.extend(annotations)
+            if annotations_path and len(train_annotations) != len(train_texts):
+                raise ValueError(f"{len(train_annotations)} annotations for {len(train_texts)} texts")
+            ensemble.train_all_models(train_texts, train_labels, spacy_cache_dir=args.spacy_cache_dir,
+                                      spacy_annotations=train_annotations if annotations_path else None,
+                                      spacy_n_iter=args.spacy_iter, n_jobs=args.jobs)
+
+    if args.fast_predict:
+        exported = ensemble.export_fast_predict()
+        print("Exported fast-predict classifiers: " + ", ".join(f"{name} {count}" for name, count in exported.items()))
+
+    ensemble.save(args.output)
+    print(f"Saved model bundle to {args.output} in {time.time() - start:.1f}s (peak RSS {peak_rss_mb():.0f} MB)")
+
+if __name__ == "__main__":
+    main()
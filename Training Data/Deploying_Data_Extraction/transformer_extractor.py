@@ -0,0 +1,144 @@
+# transformer_extractor.py
+# Optional fifth ensemble member: a token-classification transformer fine-tuned on the
+# NER fields (labels like B-LOCATION / I-LOCATION), loaded from a local checkpoint
+# directory and run on CPU. torch and transformers are only imported when the model loads.
+import threading
+
+class TransformerNERExtractor:
+    # Texts are sorted by token count and batched in that order, each batch padded only to
+    # its own longest text, so short reports don't pay for long ones. max_batch_tokens caps
+    # (texts x padded length) per batch to keep memory flat on long inputs.
+    # num_threads / num_interop_threads set torch's (process-wide) CPU thread pools so the
+    # model can share cores with the other extractors.
+    def __init__(self, model_dir, quantize=False, num_threads=None, num_interop_threads=None,
+                 batch_size=16, max_batch_tokens=8192, max_length=512):
+        self.model_dir = model_dir
+        self.quantize = quantize
+        self.num_threads = num_threads
+        self.num_interop_threads = num_interop_threads
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_length = max_length
+        self._model = None
+        self._tokenizer = None
+        self._load_lock = threading.Lock()
+
+    def __getstate__(self):
+        # Bundles keep only the checkpoint path; the model reloads from it on first use
+        state = self.__dict__.copy()
+        state['_model'] = None
+        state['_tokenizer'] = None
+        del state['_load_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        import torch
+        from transformers import AutoModelForTokenClassification, AutoTokenizer
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        if self.num_interop_threads:
+            try:
+                torch.set_num_interop_threads(self.num_interop_threads)
+            except RuntimeError:
+                # Can only be set before torch's first parallel work
+                print("Could not set torch interop threads; they were already in use")
+
+        # Fast tokenizers are needed for the character offsets of each token
+        tokenizer = AutoTokenizer.from_pretrained(self.model_dir, use_fast=True)
+        model = AutoModelForTokenClassification.from_pretrained(self.model_dir)
+        model.to("cpu")
+        model.eval()
+        if self.quantize:
+            # int8 weights for the Linear layers, activations quantized on the fly
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return tokenizer, model
+
+    @property
+    def model(self):
+        with self._load_lock:
+            if self._model is None:
+                self._tokenizer, self._model = self.load()
+        return self._model
+
+    @property
+    def tokenizer(self):
+        self.model
+        return self._tokenizer
+
+    def batches(self, lengths):
+        # Indexes of the texts, shortest first, grouped into padded batches
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+        batch = []
+        for i in order:
+            # Sorted, so this text sets the batch's padded length
+            if batch and (len(batch) >= self.batch_size or
+                          (len(batch) + 1) * lengths[i] > self.max_batch_tokens):
+                yield batch
+                batch = []
+            batch.append(i)
+        if batch:
+            yield batch
+
+    def entities(self, text, label_ids, offsets):
+        # Merges B-/I- tagged tokens into (field, start, end) character spans
+        id2label = self.model.config.id2label
+        spans = []
+        for label_id, (start, end) in zip(label_ids, offsets):
+            if start == end:  # special and padding tokens
+                continue
+            tag = id2label[int(label_id)]
+            if tag == "O":
+                continue
+            prefix, _, field = tag.partition("-")
+            if not field:
+                prefix, field = "B", tag
+            field = field.lower()
+            if spans and prefix == "I" and spans[-1][0] == field and start - spans[-1][2] <= 1:
+                spans[-1][2] = end
+            else:
+                spans.append([field, start, end])
+        return spans
+
+    def extract_batch(self, texts, fields=None):
+        # fields: only report these (the model tags every label either way)
+        import torch
+
+        from text_analysis import plain_text
+
+        texts = [plain_text(text) for text in texts]
+        model, tokenizer = self.model, self.tokenizer
+        encodings = tokenizer(texts, truncation=True, max_length=self.max_length,
+                              return_offsets_mapping=True)
+        lengths = [len(ids) for ids in encodings["input_ids"]]
+
+        results = [None] * len(texts)
+        with torch.inference_mode():
+            for batch in self.batches(lengths):
+                features = [{key: encodings[key][i] for key in encodings.keys() if key != "offset_mapping"}
+                            for i in batch]
+                inputs = tokenizer.pad(features, padding="longest", return_tensors="pt")
+                label_ids = model(**inputs).logits.argmax(dim=-1).tolist()
+                for row, i in enumerate(batch):
+                    extracted = {}
+                    for field, start, end in self.entities(texts[i], label_ids[row][:lengths[i]],
+                                                           encodings["offset_mapping"][i]):
+                        if fields is None or field in fields:
+                            extracted.setdefault(field, texts[i][start:end])
+                    results[i] = extracted
+        return results
+
+    def extract(self, text):
+        return self.extract_batch([text])[0]
+
+    def output_fields(self):
+        fields = set()
+        for tag in self.model.config.id2label.values():
+            if tag != "O":
+                prefix, _, field = tag.partition("-")
+                fields.add((field or prefix).lower())
+        return fields
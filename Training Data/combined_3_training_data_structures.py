@@ -1,7 +1,15 @@
+import argparse
 import csv
+import gzip
+import itertools
+import json
 import random
 import os
+import string
 from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+import numpy as np
 
 # Categories and their proportions
 labels = {
@@ -143,88 +151,449 @@ def generate_entry(label):
     entry = template.format(**{k: random.choice(v) for k, v in fillers.items() if k in template})
     return entry
 
+# Join literal strings and (field, value) pieces, recording each value's character offsets
+def build_text(pieces):
+    chunks = []
+    entities = []
+    offset = 0
+    for piece in pieces:
+        if isinstance(piece, tuple):
+            field, piece = piece
+            entities.append([offset, offset + len(piece), field])
+        chunks.append(piece)
+        offset += len(piece)
+    return "".join(chunks), entities
+
 # Generate natural-sounding incident text with no explicit labels
-def generate_natural_text(fields):
-    # Use the actual row's fields to build the narrative
+def generate_natural_text(fields, order=None):
+    # Use the actual row's fields to build the narrative; order is a permutation of
+    # the five parts (shuffled with random when not given)
     text_parts = [
-        f"On {fields['incident_date']} at {fields['incident_time']}, an incident occurred at {fields['location']}.",
-        f"{fields['person_involved']} from the {fields['department']} department was involved.",
-        fields['incident_description'],
-        fields['injury_description'] if fields['was_injured'] == "Yes" else "",
-        f"The incident was reported by {fields['reporter_name']}."
+        ["On ", ('incident_date', fields['incident_date']), " at ", ('incident_time', fields['incident_time']),
+         ", an incident occurred at ", ('location', fields['location']), "."],
+        [('person_involved', fields['person_involved']), " from the ", ('department', fields['department']),
+         " department was involved."],
+        [('incident_description', fields['incident_description'])],
+        [('injury_description', fields['injury_description'])] if fields['was_injured'] == "Yes" else [],
+        ["The incident was reported by ", ('reporter_name', fields['reporter_name']), "."]
     ]
-    random.shuffle(text_parts)
-    return " ".join([part for part in text_parts if part.strip()])
+    if order is None:
+        random.shuffle(text_parts)
+    else:
+        text_parts = [text_parts[i] for i in order]
+    pieces = []
+    for part in text_parts:
+        if part:
+            pieces.extend(([" "] if pieces else []) + part)
+    return build_text(pieces)
 
 # Generate merged unstructured text
-def generate_full_text(fields):
+def generate_full_text(fields, order=None):
     keys = list(fields.keys())
-    random.shuffle(keys)
-    text = " ".join([f"{k.replace('_', ' ').title()}: {fields[k]}" for k in keys])
+    if order is None:
+        random.shuffle(keys)
+    else:
+        keys = [keys[i] for i in order]
+    pieces = []
+    for k in keys:
+        if pieces:
+            pieces.append(" ")
+        pieces.append(f"{k.replace('_', ' ').title()}: ")
+        # "N/A" placeholders are written out but aren't entity values
+        pieces.append((k, fields[k]) if fields[k] != "N/A" else fields[k])
+
+    return build_text(pieces)
+
+# Sidecar with one {"entities": [[start, end, field], ...]} line per CSV data row
+def annotation_file(csv_file):
+    return os.path.splitext(csv_file)[0] + '_annotations.jsonl'
+
+STRUCTURED_COLUMNS = [
+    'reporter_name', 'person_involved', 'incident_date', 'incident_time',
+    'department', 'incident_description', 'location', 'label',
+    'was_injured', 'injury_description'
+]
+
+# Original mode: 5,000 rows in label order, unseeded, dates up to today
+def write_legacy_dataset(output_folder):
+    os.makedirs(output_folder, exist_ok=True)
+
+    structured_file = os.path.join(output_folder, 'shipyard_structured_dataset.csv')
+    unstructured_file = os.path.join(output_folder, 'shipyard_unstructured_without_structure_dataset.csv')
+    slight_structure_file = os.path.join(output_folder, 'shipyard_unstructure_with_structure_dataset.csv')
+
+    with open(structured_file, 'w', newline='') as structured_csv, \
+         open(unstructured_file, 'w', newline='') as unstructured_csv, \
+         open(slight_structure_file, 'w', newline='') as slight_structure_csv, \
+         open(annotation_file(unstructured_file), 'w') as unstructured_annotations, \
+         open(annotation_file(slight_structure_file), 'w') as slight_structure_annotations:
+
+        structured_writer = csv.writer(structured_csv)
+        unstructured_writer = csv.writer(unstructured_csv)
+        slight_structure_writer = csv.writer(slight_structure_csv)
+
+        # Write headers
+        structured_writer.writerow(STRUCTURED_COLUMNS)
+        unstructured_writer.writerow(['full_text'])
+        slight_structure_writer.writerow(['full_text'])
+
+        for label, count in labels.items():
+            for _ in range(count):
+                reporter_name = f"{random.choice(first_names)} {random.choice(surnames)}"
+                person_involved = f"{random.choice(first_names)} {random.choice(surnames)}"
+                incident_date = random_date()
+                incident_time = random_time()
+                location = random.choice(locations)
+                department = random.choice(departments)
+                description = generate_entry(label)
+                was_injured = "Yes" if label in ["Accident", "Incident"] else "No"
+                injury_desc = random.choice(injury_descriptions) if was_injured == "Yes" else "N/A"
+
+                # Structured row
+                structured_writer.writerow([
+                    reporter_name, person_involved, incident_date, incident_time,
+                    department, description, location, label,
+                    was_injured, injury_desc
+                ])
+
+                # Prepare fields dict for unstructured and slight structure
+                fields = {
+                    'reporter_name': reporter_name,
+                    'person_involved': person_involved,
+                    'incident_date': incident_date,
+                    'incident_time': incident_time,
+                    'department': department,
+                    'incident_description': description,
+                    'location': location,
+                    'label': label,
+                    'was_injured': was_injured,
+                    'injury_description': injury_desc
+                }
+
+                # Unstructured text
+                unstructured_text, unstructured_entities = generate_natural_text(fields)
+                unstructured_writer.writerow([unstructured_text])
+                unstructured_annotations.write(json.dumps({'entities': unstructured_entities}) + '\n')
+
+                # Slightly structured text
+                slight_structure_text, slight_structure_entities = generate_full_text(fields)
+                slight_structure_writer.writerow([slight_structure_text])
+                slight_structure_annotations.write(json.dumps({'entities': slight_structure_entities}) + '\n')
+
+# --- Sharded mode: seeded, vectorized sampling, compressed CSV or Parquet shards ---
+
+# Load profiles for performance testing. Ratios are per-row probabilities; lengths are in
+# characters, drawn log-normally around length_median and capped at max_chars (texts
+# shorter than the draw are padded, so entity offsets stay valid).
+# A duplicate copies an earlier row of its shard verbatim, from any distance back: the
+# shard keeps a seeded reservoir sample of duplicate_pool of its earlier rows to copy
+# from. The shard's first row can't be one, so the per-row probability is scaled up to
+# make the shard's duplicate rate duplicate_ratio.
+DEFAULT_PROFILE = {
+    'length_median': 0,             # 0 keeps the natural report length
+    'length_sigma': 1.0,
+    'max_chars': 2_000_000,
+    'duplicate_ratio': 0.0,         # rows that repeat an earlier row of their shard verbatim
+    'duplicate_pool': 1_000,        # earlier rows kept as duplicate sources (bounds memory)
+    'noise_ratio': 0.0,             # unusual Unicode, zero-width/odd whitespace, mixed case
+    'log_ratio': 0.0,               # pasted multi-line application logs
+    'pathological_ratio': 0.0,      # strings aimed at the extractor regexes
+    'department_skew': 0.0          # Zipf exponent for departments (0 = uniform)
+}
+
+LOAD_PROFILES = {
+    'baseline': {},
+    'long_reports': {'length_median': 20_000, 'length_sigma': 1.5},
+    'pasted_logs': {'log_ratio': 0.5, 'length_median': 5_000},
+    'unicode_noise': {'noise_ratio': 0.8},
+    'skewed_departments': {'department_skew': 2.0},
+    'duplicates': {'duplicate_ratio': 0.6},
+    'regex_pathological': {'pathological_ratio': 0.3},
+    'stress': {
+        'length_median': 4_000, 'length_sigma': 2.0, 'duplicate_ratio': 0.3, 'noise_ratio': 0.3,
+        'log_ratio': 0.2, 'pathological_ratio': 0.1, 'department_skew': 1.5
+    }
+}
+
+def resolve_profile(profile):
+    # A LOAD_PROFILES name, a JSON file of overrides, or a dict of overrides
+    if isinstance(profile, str):
+        if profile in LOAD_PROFILES:
+            profile = LOAD_PROFILES[profile]
+        else:
+            with open(profile) as f:
+                profile = json.load(f)
+    unknown = set(profile) - set(DEFAULT_PROFILE)
+    if unknown:
+        raise ValueError(f"Unknown load profile settings: {sorted(unknown)}")
+    return {**DEFAULT_PROFILE, **profile}
+
+NOISE_CHARS = ["\u200b", "\u200d", "\ufeff", "\u202e", "\u00a0", "\u3000", "\u2028", "\u0301",
+               "\U0001F6A7", "\U0001F525", "\u00df", "\u0130", "\ufb01", "\u2163", "\uff21"]
+WHITESPACE_VARIANTS = ["\u00a0", "\u2009", "\u2003", "\u3000", "\t"]
+LOG_LEVELS = ["DEBUG", "INFO", "WARN", "ERROR"]
+LOG_SOURCES = ["crane-ctl", "plc-gateway", "badge-reader", "hvac", "forklift-telemetry"]
+
+# Each targets a regex in HybridExtractor/TemplateMLExtractor: repeated trigger words with no
+# terminator make the lazy incident/injury templates rescan the rest of the text from every
+# trigger, long capitalised runs and "in the X and Y ..." chains feed the name, location and
+# department patterns, and near-miss digit runs feed the date/time patterns.
+PATHOLOGICAL_GENERATORS = [
+    lambda rng, size: "event caused delay " * max(1, size // 19),
+    lambda rng, size: "incident noted " * max(1, size // 15),
+    lambda rng, size: "injured " * max(1, size // 8),
+    lambda rng, size: "in the " + " and ".join(["Alpha", "Beta"] * max(1, size // 12)),
+    lambda rng, size: "at " + "A" + "a" * max(1, size),
+    lambda rng, size: " ".join(["Xx"] * max(1, size // 3)) + " involved",
+    lambda rng, size: "12/12/12/" * max(1, size // 9) + " 1:2:3:4:" * max(1, size // 18)
+]
+
+def log_block(rng, n_lines):
+    lines = []
+    for _ in range(n_lines):
+        lines.append(
+            f"2024-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}T{rng.integers(0, 24):02d}:"
+            f"{rng.integers(0, 60):02d}:{rng.integers(0, 60):02d}.{rng.integers(0, 1000):03d}Z "
+            f"{LOG_LEVELS[rng.integers(len(LOG_LEVELS))]} [{LOG_SOURCES[rng.integers(len(LOG_SOURCES))]}] "
+            f"timeout after {rng.integers(100, 10000)}ms (code=0x{rng.integers(0, 65536):04X}) "
+            f"at com.shipyard.Controller.run(Controller.java:{rng.integers(1, 999)})"
+        )
+    return "\n" + "\n".join(lines)
+
+def noise_block(rng, size):
+    chars = [NOISE_CHARS[i] for i in rng.integers(len(NOISE_CHARS), size=max(1, size // 4))]
+    words = [injury_descriptions[i] for i in rng.integers(len(injury_descriptions), size=2)]
+    words = [word.upper() if rng.random() < 0.5 else word for word in words]
+    return " " + "".join(chars) + " " + " ".join(words)
 
+def add_whitespace_noise(rng, text, entities):
+    # Swap single spaces outside entity spans for other Unicode whitespace; lengths don't change
+    protected = np.zeros(len(text), dtype=bool)
+    for start, end, _ in entities:
+        protected[start:end] = True
+    chars = list(text)
+    for i, char in enumerate(chars):
+        if char == " " and not protected[i] and rng.random() < 0.3:
+            chars[i] = WHITESPACE_VARIANTS[rng.integers(len(WHITESPACE_VARIANTS))]
+    return "".join(chars)
+
+def apply_load_profile(rng, text, entities, profile):
+    # Everything is appended after the report, so the entity offsets still hold
+    if profile['noise_ratio'] and rng.random() < profile['noise_ratio']:
+        text = add_whitespace_noise(rng, text, entities) + noise_block(rng, 40)
+    if profile['log_ratio'] and rng.random() < profile['log_ratio']:
+        text += log_block(rng, int(rng.integers(5, 50)))
+    if profile['pathological_ratio'] and rng.random() < profile['pathological_ratio']:
+        generator = PATHOLOGICAL_GENERATORS[rng.integers(len(PATHOLOGICAL_GENERATORS))]
+        text += " " + generator(rng, int(rng.integers(500, 8000)))
+
+    if profile['length_median']:
+        target = min(profile['max_chars'],
+                     int(rng.lognormal(np.log(profile['length_median']), profile['length_sigma'])))
+        padding = []
+        padded = len(text)
+        while padded < target:
+            if profile['log_ratio'] and rng.random() < profile['log_ratio']:
+                piece = log_block(rng, 20)
+            else:
+                piece = " " + incident_descriptions[rng.integers(len(incident_descriptions))]
+            if profile['noise_ratio'] and rng.random() < profile['noise_ratio']:
+                piece += noise_block(rng, 20)
+            padding.append(piece)
+            padded += len(piece)
+        text += "".join(padding)[:max(0, target - len(text))]
     return text
 
-output_folder = "Training Data"
-os.makedirs(output_folder, exist_ok=True)
-
-structured_file = os.path.join(output_folder, 'shipyard_structured_dataset.csv')
-unstructured_file = os.path.join(output_folder, 'shipyard_unstructured_without_structure_dataset.csv')
-slight_structure_file = os.path.join(output_folder, 'shipyard_unstructure_with_structure_dataset.csv')
-
-with open(structured_file, 'w', newline='') as structured_csv, \
-     open(unstructured_file, 'w', newline='') as unstructured_csv, \
-     open(slight_structure_file, 'w', newline='') as slight_structure_csv:
-
-    structured_writer = csv.writer(structured_csv)
-    unstructured_writer = csv.writer(unstructured_csv)
-    slight_structure_writer = csv.writer(slight_structure_csv)
-
-    # Write headers
-    structured_writer.writerow([
-        'reporter_name', 'person_involved', 'incident_date', 'incident_time',
-        'department', 'incident_description', 'location', 'label',
-        'was_injured', 'injury_description'
-    ])
-    unstructured_writer.writerow(['full_text'])
-    slight_structure_writer.writerow(['full_text'])
-    
-    for label, count in labels.items():
-        for _ in range(count):
-            reporter_name = f"{random.choice(first_names)} {random.choice(surnames)}"
-            person_involved = f"{random.choice(first_names)} {random.choice(surnames)}"
-            incident_date = random_date()
-            incident_time = random_time()
-            location = random.choice(locations)
-            department = random.choice(departments)
-            description = generate_entry(label)
-            was_injured = "Yes" if label in ["Accident", "Incident"] else "No"
-            injury_desc = random.choice(injury_descriptions) if was_injured == "Yes" else "N/A"
-
-            # Structured row
-            structured_writer.writerow([
-                reporter_name, person_involved, incident_date, incident_time,
-                department, description, location, label,
-                was_injured, injury_desc
-            ])
-
-            # Prepare fields dict for unstructured and slight structure
-            fields = {
-                'reporter_name': reporter_name,
-                'person_involved': person_involved,
-                'incident_date': incident_date,
-                'incident_time': incident_time,
-                'department': department,
-                'incident_description': description,
-                'location': location,
-                'label': label,
-                'was_injured': was_injured,
-                'injury_description': injury_desc
+# One directory of row-aligned part files per view
+VIEWS = {
+    'structured': 'shipyard_structured_dataset',
+    'unstructured': 'shipyard_unstructured_without_structure_dataset',
+    'slight_structure': 'shipyard_unstructure_with_structure_dataset'
+}
+
+# Every description generate_entry can produce for a label, with the probability it has there
+# (template uniform, then each filler uniform), so whole columns can be sampled at once
+def expand_entries(label):
+    entries, probabilities = [], []
+    for template in templates[label]:
+        keys = [name for _, name, _, _ in string.Formatter().parse(template) if name]
+        combos = list(itertools.product(*[fillers[k] for k in keys]))
+        for combo in combos:
+            entries.append(template.format(**dict(zip(keys, combo))))
+            probabilities.append(1 / len(templates[label]) / len(combos))
+    return entries, probabilities
+
+def sample_block(rng, n, end_date, profile=DEFAULT_PROFILE):
+    pick = lambda pool, size=n: np.array(pool, dtype=object)[rng.integers(len(pool), size=size)]
+
+    # Label mix follows the legacy counts
+    label_names = list(labels)
+    weights = np.array(list(labels.values()), dtype=float)
+    label_idx = rng.choice(len(label_names), size=n, p=weights / weights.sum())
+
+    start_date = datetime(2024, 1, 1)
+    day_table = [(start_date + timedelta(days=d)).strftime("%d %B %Y") for d in range((end_date - start_date).days + 1)]
+    time_table = [f"{hour:02d}:{minute:02d}" for hour in range(24) for minute in range(60)]
+
+    descriptions = np.empty(n, dtype=object)
+    for i, label in enumerate(label_names):
+        mask = label_idx == i
+        entries, probabilities = expand_entries(label)
+        descriptions[mask] = np.array(entries, dtype=object)[rng.choice(len(entries), size=mask.sum(), p=probabilities)]
+
+    injured = np.isin(label_idx, [label_names.index("Accident"), label_names.index("Incident")])
+    columns = {
+        'reporter_name': pick(first_names) + " " + pick(surnames),
+        'person_involved': pick(first_names) + " " + pick(surnames),
+        'incident_date': pick(day_table),
+        'incident_time': pick(time_table),
+        'department': pick_departments(rng, n, profile['department_skew']),
+        'incident_description': descriptions,
+        'location': pick(locations),
+        'label': np.array(label_names, dtype=object)[label_idx],
+        'was_injured': np.where(injured, "Yes", "No").astype(object),
+        'injury_description': np.where(injured, pick(injury_descriptions), "N/A").astype(object)
+    }
+    # Part order for each narrative and key order for each key:value text
+    natural_orders = rng.permuted(np.tile(np.arange(5), (n, 1)), axis=1)
+    full_orders = rng.permuted(np.tile(np.arange(len(STRUCTURED_COLUMNS)), (n, 1)), axis=1)
+    return columns, natural_orders, full_orders
+
+def pick_departments(rng, n, skew):
+    if not skew:
+        return np.array(departments, dtype=object)[rng.integers(len(departments), size=n)]
+    weights = 1 / np.arange(1, len(departments) + 1) ** skew
+    return np.array(departments, dtype=object)[rng.choice(len(departments), size=n, p=weights / weights.sum())]
+
+def view_path(output_dir, view, shard, fmt):
+    extension = 'parquet' if fmt == 'parquet' else 'csv.gz'
+    return os.path.join(output_dir, VIEWS[view], f"part-{shard:05d}.{extension}")
+
+def write_shard(task):
+    import pandas as pd
+
+    shard, n_rows, seed_sequence, output_dir, fmt, end_date, block_size, profile = task
+    rng = np.random.default_rng(seed_sequence)
+
+    paths = {view: view_path(output_dir, view, shard, fmt) for view in VIEWS}
+    annotation_paths = {view: os.path.join(output_dir, VIEWS[view], f"part-{shard:05d}_annotations.jsonl.gz")
+                        for view in ['unstructured', 'slight_structure']}
+    parquet_writers = {}
+    # gzip's default level 9 costs more than generating the rows; 5 is close in size
+    csv_files = {view: gzip.open(path, 'wt', newline='', compresslevel=5)
+                 for view, path in paths.items()} if fmt == 'csv' else {}
+    annotation_files = {view: gzip.open(path, 'wt', compresslevel=5) for view, path in annotation_paths.items()}
+
+    # Duplicate sources: a uniform reservoir sample of the shard's original rows so far, each
+    # (structured values, natural text, its annotations, full text, its annotations)
+    duplicate_probability = profile['duplicate_ratio'] * n_rows / (n_rows - 1) if n_rows > 1 else 0.0
+    pool, originals = [], 0
+
+    try:
+        for block_start in range(0, n_rows, block_size):
+            n = min(block_size, n_rows - block_start)
+            columns, natural_orders, full_orders = sample_block(rng, n, end_date, profile)
+            duplicated = rng.random(n) < duplicate_probability if duplicate_probability else np.zeros(n, dtype=bool)
+
+            natural_texts, full_texts = [], []
+            for i in range(n):
+                if duplicated[i] and pool:
+                    # Copied across all three views
+                    values, natural_text, natural_annotation, full_text, full_annotation = pool[rng.integers(len(pool))]
+                    for column, value in zip(STRUCTURED_COLUMNS, values):
+                        columns[column][i] = value
+                    natural_texts.append(natural_text)
+                    full_texts.append(full_text)
+                    annotation_files['unstructured'].write(natural_annotation)
+                    annotation_files['slight_structure'].write(full_annotation)
+                    continue
+                fields = {column: columns[column][i] for column in STRUCTURED_COLUMNS}
+                text, entities = generate_natural_text(fields, natural_orders[i])
+                natural_texts.append(apply_load_profile(rng, text, entities, profile))
+                natural_annotation = json.dumps({'entities': entities}) + '\n'
+                annotation_files['unstructured'].write(natural_annotation)
+                text, entities = generate_full_text(fields, full_orders[i])
+                full_texts.append(apply_load_profile(rng, text, entities, profile))
+                full_annotation = json.dumps({'entities': entities}) + '\n'
+                annotation_files['slight_structure'].write(full_annotation)
+
+                if duplicate_probability:
+                    entry = (tuple(fields[column] for column in STRUCTURED_COLUMNS), natural_texts[-1],
+                             natural_annotation, full_texts[-1], full_annotation)
+                    originals += 1
+                    if len(pool) < profile['duplicate_pool']:
+                        pool.append(entry)
+                    else:
+                        j = rng.integers(originals)
+                        if j < len(pool):
+                            pool[j] = entry
+
+            frames = {
+                'structured': pd.DataFrame(columns, columns=STRUCTURED_COLUMNS),
+                'unstructured': pd.DataFrame({'full_text': natural_texts}),
+                'slight_structure': pd.DataFrame({'full_text': full_texts})
             }
+            for view, frame in frames.items():
+                if fmt == 'csv':
+                    frame.to_csv(csv_files[view], header=block_start == 0, index=False)
+                else:
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+
+                    table = pa.Table.from_pandas(frame, preserve_index=False)
+                    if view not in parquet_writers:
+                        parquet_writers[view] = pq.ParquetWriter(paths[view], table.schema, compression='zstd')
+                    parquet_writers[view].write_table(table)
+    finally:
+        for handle in list(csv_files.values()) + list(annotation_files.values()) + list(parquet_writers.values()):
+            handle.close()
+
+    return shard, n_rows
+
+def write_sharded_dataset(output_dir, rows, shards, seed, fmt='csv', workers=None,
+                          end_date=datetime(2025, 12, 31), block_size=100000, profile='baseline'):
+    profile = resolve_profile(profile)
+    if fmt == 'parquet':
+        import pyarrow  # fail before starting the workers if it's missing
+
+    for view in VIEWS.values():
+        os.makedirs(os.path.join(output_dir, view), exist_ok=True)
+
+    # Independent child seeds per shard: output depends only on (seed, rows, shards), not on workers
+    seed_sequences = np.random.SeedSequence(seed).spawn(shards)
+    tasks = [
+        (shard, rows // shards + (1 if shard < rows % shards else 0), seed_sequences[shard],
+         output_dir, fmt, end_date, block_size, profile)
+        for shard in range(shards)
+    ]
+    with Pool(workers) as pool:
+        for shard, n_rows in pool.imap_unordered(write_shard, tasks):
+            print(f"Wrote shard {shard} ({n_rows} rows)")
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump({
+            'seed': seed, 'rows': rows, 'shards': shards, 'format': fmt,
+            'end_date': end_date.strftime('%Y-%m-%d'), 'profile': profile, 'views': VIEWS,
+            'shard_rows': [task[1] for task in tasks]
+        }, f, indent=2)
 
-            # Unstructured text
-            unstructured_text = generate_natural_text(fields)
-            unstructured_writer.writerow([unstructured_text])
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the synthetic shipyard incident datasets")
+    parser.add_argument("--output", default="Training Data")
+    parser.add_argument("--rows", type=int, help="Row count; enables the seeded, sharded mode")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="gzip-compressed CSV or zstd Parquet parts")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--end-date", default="2025-12-31", help="Latest incident date (YYYY-MM-DD)")
+    parser.add_argument("--profile", default="baseline",
+                        help=f"Load profile for the sharded mode: {', '.join(LOAD_PROFILES)} or a JSON file of settings")
+    args = parser.parse_args()
 
-            # Slightly structured text
-            slight_structure_text = generate_full_text(fields)
-            slight_structure_writer.writerow([slight_structure_text])
+    if args.rows is None:
+        write_legacy_dataset(args.output)
+    else:
+        write_sharded_dataset(args.output, args.rows, args.shards, args.seed, fmt=args.format,
+                              workers=args.workers, end_date=datetime.strptime(args.end_date, "%Y-%m-%d"),
+                              profile=args.profile)